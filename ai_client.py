@@ -0,0 +1,71 @@
+# ai_client.py
+# Klien Gemini bersama: cache jawaban per sidik jari input (pair, timeframe, candle, indikator terdiskretisasi),
+# permintaan identik yang bersamaan digabung menjadi satu panggilan, dan batas panggilan per jam.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+import requests
+from ttl_cache import TTLCache
+import metrics
+
+# --- KONFIGURASI ---
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 45))
+AI_CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", 4 * 3600))
+# Maksimum panggilan Gemini per jam (per proses); lewat dari itu dipakai ringkasan cadangan
+GEMINI_HOURLY_BUDGET = int(os.environ.get("GEMINI_HOURLY_BUDGET", 60))
+# Kosongkan (AI_CACHE_PATH="") untuk cache di memori saja
+AI_CACHE_PATH = os.environ.get("AI_CACHE_PATH", os.path.join("candle_store", "ai_cache.json"))
+
+AI_CACHE = TTLCache(AI_CACHE_PATH or None, max_stale=0)
+_calls = deque()
+_budget_lock = threading.Lock()
+_stats = {"budget_exhausted": 0}
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+def fingerprint(*parts):
+    # Input dinormalisasi (JSON terurut) lalu di-hash; urutan key dict tidak berpengaruh
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def _take_budget():
+    with _budget_lock:
+        now = time.time()
+        while _calls and now - _calls[0] >= 3600: _calls.popleft()
+        if len(_calls) >= GEMINI_HOURLY_BUDGET:
+            _stats["budget_exhausted"] += 1
+            raise BudgetExhausted(f"Batas {GEMINI_HOURLY_BUDGET} panggilan Gemini per jam tercapai.")
+        _calls.append(now)
+
+def call_gemini(prompt: str):
+    _take_budget()
+    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    try:
+        with metrics.stage("gemini"):
+            response = requests.post(api_url, json=payload, timeout=GEMINI_TIMEOUT)
+            response.raise_for_status()
+            return response.json()['candidates'][0]['content']['parts'][0]['text']
+    except Exception:
+        metrics.error("gemini")
+        raise
+
+def generate(prompt: str, key: str, fallback=None, ttl: float = AI_CACHE_TTL):
+    # Jawaban dari cache bila sidik jarinya sama; kuota habis -> fallback. Error lain diteruskan ke pemanggil
+    # (dan tidak di-cache) agar pemanggil tetap memakai pesan gagalnya sendiri.
+    try:
+        return AI_CACHE.get(key, lambda: call_gemini(prompt), ttl)
+    except BudgetExhausted as e:
+        print(f"{e} Memakai ringkasan cadangan.")
+        return fallback() if callable(fallback) else fallback
+
+def stats():
+    with _budget_lock:
+        return dict(AI_CACHE.stats(), **_stats, calls_last_hour=len(_calls), hourly_budget=GEMINI_HOURLY_BUDGET)
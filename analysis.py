@@ -0,0 +1,283 @@
+# analysis.py
+# Snapshot analisis sekali hitung per (pair, timeframe, candle close terakhir): nilai indikator chart, dict analisis
+# (MA/RSI/MACD/Bollinger/volume), skor indikator dan jendela plot. Dipakai bersama /chart (main.py), laporan
+# terjadwal (scheduled_run.py) dan notifikasi pemindai (signal_finder.py). Disimpan ringkas di SQLite per proses;
+# cron job (GitHub Actions) tidak berbagi disk dengan bot (Railway), jadi snapshot yang sudah dihitung bot diambil
+# lewat /api/analysis (ANALYSIS_API_URL) sebelum menghitung sendiri, selama candle-nya sama.
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+import requests
+import market_data
+import indicators
+import metrics
+from candle_buffer import CandleBuffer
+from chart_renderer import COLUMNS, plot_window
+
+# --- KONFIGURASI ---
+# Kosongkan (ANALYSIS_STORE_PATH="") untuk hanya menyimpan di memori proses ini
+ANALYSIS_STORE_PATH = os.environ.get("ANALYSIS_STORE_PATH", os.path.join("candle_store", "analysis.sqlite3"))
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", 256))
+# Snapshot yang lebih tua dari ini (detik) dihapus dari SQLite
+ANALYSIS_RETENTION = float(os.environ.get("ANALYSIS_RETENTION", 7 * 86400))
+ANALYSIS_BARS = 200
+PLOT_BARS = 30
+PLOT_FIELDS = COLUMNS + ("timestamp",)
+# URL bot yang menyajikan /api/analysis (sama dengan RAILWAY_URL); kosong = selalu hitung sendiri. Bot sendiri
+# tidak pernah mengambil dari dirinya (main.py mengosongkan remote_url)
+ANALYSIS_API_URL = os.environ.get("ANALYSIS_API_URL", "")
+ANALYSIS_API_TIMEOUT = float(os.environ.get("ANALYSIS_API_TIMEOUT", 10))
+API_SECRET_KEY = os.environ.get("API_SECRET_KEY")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    pair TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    candle_ts INTEGER NOT NULL,
+    computed_at REAL NOT NULL,
+    meta BLOB NOT NULL,
+    plot BLOB NOT NULL,
+    PRIMARY KEY (pair, timeframe, candle_ts)
+) WITHOUT ROWID;
+"""
+
+
+# --- ANALISIS ---
+def analyze_indicators(series: dict, symbol: str):
+    # series: kolom array dari indicators.chart_series (minimal 2 bar)
+    last = {name: values[-1] for name, values in series.items()}
+    prev = {name: values[-2] for name, values in series.items()}
+    analysis = {}
+    if last['close'] > last['ma9'] and last['ma9'] > last['ma26']: analysis['ma'] = f"🟢 Bullish ({last['ma9']:.2f} > {last['ma26']:.2f})"
+    elif last['close'] < last['ma9'] and last['ma9'] < last['ma26']: analysis['ma'] = f"🔴 Bearish ({last['ma9']:.2f} < {last['ma26']:.2f})"
+    else: analysis['ma'] = "⚪ Netral"
+    if last['rsi'] > 70: analysis['rsi'] = f"🔴 Overbought ({last['rsi']:.2f})"
+    elif last['rsi'] < 30: analysis['rsi'] = f"🟢 Oversold ({last['rsi']:.2f})"
+    else: analysis['rsi'] = f"⚪ Netral ({last['rsi']:.2f})"
+    if prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']: analysis['macd'] = "🟢 Golden Cross"
+    elif prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']: analysis['macd'] = "🔴 Death Cross"
+    else: analysis['macd'] = "⚪ Netral"
+    analysis['bb_score'] = 0
+    if last['close'] < last['bb_low']:
+        analysis['bb'] = f"🟢 Di bawah Lower Band ({last['bb_low']:.2f})"
+        analysis['bb_score'] = 1
+    elif last['close'] > last['bb_high']:
+        analysis['bb'] = f"🔴 Di atas Upper Band ({last['bb_high']:.2f})"
+        analysis['bb_score'] = -1
+    else: analysis['bb'] = "⚪ Di dalam Bands"
+    avg_volume = indicators.rolling_last_mean(series['volume'], 20)
+    if last['volume'] > avg_volume * 1.75: analysis['volume'] = f"🔥 Tinggi ({last['volume']:,.0f} {symbol})"
+    else: analysis['volume'] = f"⚪ Normal ({last['volume']:,.0f} {symbol})"
+    return analysis
+
+def indicator_score(analysis: dict):
+    # Skor dari indikator saja; sentimen (berubah terpisah dari candle) ditambahkan di final_signal
+    score = 0
+    if "Bullish" in analysis['ma']: score += 1
+    if "Bearish" in analysis['ma']: score -= 1
+    if "Golden Cross" in analysis['macd']: score += 2
+    if "Death Cross" in analysis['macd']: score -= 2
+    if "Oversold" in analysis['rsi']: score += 1
+    if "Overbought" in analysis['rsi']: score -= 1
+    return score + analysis.get('bb_score', 0)
+
+def final_signal(score: int, sentiment: dict):
+    if sentiment.get('status') == 'ok': score += sentiment.get('score', 0)
+    if score >= 2: return "🚨 SINYAL AKSI: BELI (BUY) 🚨"
+    elif score <= -2: return "🚨 SINYAL AKSI: JUAL (SELL) 🚨"
+    else: return "⚠️ SINYAL AKSI: TAHAN (HOLD) ⚠️"
+
+def short_summary(snapshot: dict):
+    # Satu baris ringkas (tanpa emoji) untuk notifikasi pemindai
+    label = lambda text: text.split(' ', 1)[1] if ' ' in text else text
+    analysis = snapshot["analysis"]
+    return (f"MA {label(analysis['ma'])}, RSI {label(analysis['rsi'])}, MACD {label(analysis['macd'])}, "
+            f"Bollinger {label(analysis['bb'])} (skor {snapshot['score']:+d})")
+
+def closed_candle_ts(timeframe: str, now_ms: int = None):
+    # Timestamp (awal) candle close terakhir, dihitung dari jam tanpa request ke bursa
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return market_data.next_close_ms(now_ms, timeframe) - 2 * market_data.timeframe_ms(timeframe)
+
+def close_time_ms(snapshot: dict):
+    # Waktu close candle yang harganya ada di snapshot["price"] (candle_ts = waktu mulai bar)
+    return snapshot["candle_ts"] + market_data.timeframe_ms(snapshot["timeframe"])
+
+def compute(pair: str, timeframe: str, candle_ts: int):
+    with metrics.stage("chart_fetch"):
+        candles = market_data.fetch_buffer(pair, timeframe, limit=ANALYSIS_BARS + 1)
+    with metrics.stage("chart_indicators"):
+        # Bar yang masih terbentuk tidak ikut: isi snapshot sama siapa pun (dan kapan pun) yang menghitungnya
+        n = int(np.searchsorted(candles.timestamps(), candle_ts, side="right"))
+        closed = CandleBuffer.from_arrays(candles.timestamps()[:n], candles.values()[:, :n])
+        series = indicators.chart_series(closed)
+    if len(series['close']) < 2: return None
+    analysis = analyze_indicators(series, pair.split('/')[0])
+    plot = {name: np.array(values) for name, values in plot_window(series, PLOT_BARS).items()}
+    return {
+        "pair": pair, "timeframe": timeframe, "candle_ts": int(series['timestamp'][-1]), "computed_at": time.time(),
+        "price": float(plot['close'][-1]), "change_pct": float((plot['close'][-1] - plot['close'][0]) / plot['close'][0] * 100),
+        "values": {name: float(values[-1]) for name, values in series.items() if name != 'timestamp'},
+        "analysis": analysis, "score": indicator_score(analysis), "plot": plot,
+    }
+
+
+# --- SERIALISASI ---
+def encode(snapshot: dict):
+    # (meta JSON terkompresi, jendela plot sebagai matriks float64 mentah)
+    meta = {key: value for key, value in snapshot.items() if key != "plot"}
+    plot = np.vstack([snapshot["plot"][name].astype(np.float64) for name in PLOT_FIELDS])
+    return zlib.compress(json.dumps(meta, separators=(',', ':'), ensure_ascii=False).encode()), plot.astype('<f8').tobytes()
+
+def decode(meta: bytes, plot: bytes):
+    snapshot = json.loads(zlib.decompress(meta))
+    matrix = np.frombuffer(plot, dtype='<f8').reshape(len(PLOT_FIELDS), -1)
+    snapshot["plot"] = {name: matrix[i] for i, name in enumerate(PLOT_FIELDS)}
+    snapshot["plot"]["timestamp"] = matrix[-1].astype(np.int64)
+    return snapshot
+
+def pack(snapshot: dict):
+    # Satu body HTTP untuk /api/analysis: panjang meta (4 byte) + meta + plot
+    meta, plot = encode(snapshot)
+    return struct.pack('<I', len(meta)) + meta + plot
+
+def unpack(body: bytes):
+    size = struct.unpack_from('<I', body)[0]
+    return decode(body[4:4 + size], body[4 + size:])
+
+
+class SnapshotStore:
+    # LRU di memori + SQLite bersama antar proses di mesin yang sama + snapshot bot lewat HTTP (remote_url).
+    # Permintaan bersamaan untuk key yang sama cukup satu perhitungan.
+    def __init__(self, path: str = None, maxsize: int = ANALYSIS_CACHE_SIZE, retention: float = ANALYSIS_RETENTION,
+                 remote_url: str = ANALYSIS_API_URL):
+        self.path = path
+        self.maxsize = maxsize
+        self.retention = retention
+        self.remote_url = remote_url
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._stats = {"hits": 0, "disk_hits": 0, "remote_hits": 0, "remote_misses": 0, "computed": 0, "incomplete": 0}
+
+    def _conn(self):
+        # Satu koneksi per thread; WAL agar bot & cron bisa membaca/menulis bersamaan
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory: os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key, snapshot: dict):
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize: self._entries.popitem(last=False)
+
+    def _cached(self, key):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+            return snapshot
+
+    def _read(self, key):
+        if not self.path: return None
+        try:
+            row = self._conn().execute("SELECT meta, plot FROM snapshots WHERE pair=? AND timeframe=? AND candle_ts=?", key).fetchone()
+        except sqlite3.Error as e:
+            print(f"Gagal membaca snapshot analisis {key}: {e}")
+            return None
+        return decode(*row) if row else None
+
+    def _write(self, key, snapshot: dict):
+        if not self.path: return
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)", key + (snapshot["computed_at"],) + encode(snapshot))
+                if self.retention: conn.execute("DELETE FROM snapshots WHERE computed_at < ?", (time.time() - self.retention,))
+        except sqlite3.Error as e:
+            print(f"Gagal menyimpan snapshot analisis {key}: {e}")
+
+    def _fetch_remote(self, key):
+        # Snapshot yang sudah dihitung bot; None (lalu hitung sendiri) jika bot belum punya candle ini atau tidak terjangkau
+        if not self.remote_url: return None
+        base_url = self.remote_url if self.remote_url.startswith(('http://', 'https://')) else 'https://' + self.remote_url
+        params = {"secret": API_SECRET_KEY, "pair": key[0], "timeframe": key[1], "candle_ts": key[2]}
+        try:
+            with metrics.stage("analysis_remote"):
+                response = requests.get(f"{base_url.rstrip('/')}/api/analysis", params=params, timeout=ANALYSIS_API_TIMEOUT)
+            if response.status_code == 404: return None
+            response.raise_for_status()
+            snapshot = unpack(response.content)
+        except Exception as e:
+            metrics.error("analysis_api")
+            print(f"Gagal mengambil snapshot analisis {key} dari bot: {e}")
+            return None
+        return snapshot if snapshot.get("candle_ts") == key[2] else None
+
+    def get(self, pair: str, timeframe: str, now_ms: int = None):
+        # Snapshot candle close terakhir: memori -> SQLite -> bot (HTTP) -> hitung. None jika data tidak cukup.
+        key = (pair, timeframe, closed_candle_ts(timeframe, now_ms))
+        snapshot = self._cached(key)
+        if snapshot is not None: return snapshot
+        with self._key_lock(key):
+            snapshot = self._cached(key)
+            if snapshot is not None: return snapshot
+            snapshot = self._read(key)
+            if snapshot is not None:
+                self._count("disk_hits")
+                self._remember(key, snapshot)
+                return snapshot
+            snapshot = self._fetch_remote(key)
+            if snapshot is not None:
+                self._count("remote_hits")
+                self._remember(key, snapshot)
+                self._write(key, snapshot)
+                return snapshot
+            if self.remote_url: self._count("remote_misses")
+            snapshot = compute(pair, timeframe, key[2])
+            if snapshot is None: return None
+            self._count("computed")
+            # Bursa belum punya candle close terakhir (terlambat/tidak ada transaksi): dipakai sekali, tidak disimpan
+            if snapshot["candle_ts"] != key[2]:
+                self._count("incomplete")
+                return snapshot
+            self._remember(key, snapshot)
+            self._write(key, snapshot)
+            return snapshot
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+SNAPSHOTS = SnapshotStore(ANALYSIS_STORE_PATH or None)
+
+def get_snapshot(pair: str, timeframe: str, now_ms: int = None):
+    return SNAPSHOTS.get(pair, timeframe, now_ms)
+
+def stats():
+    return SNAPSHOTS.stats()
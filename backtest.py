@@ -0,0 +1,236 @@
+# backtest.py
+# Backtest tervektorisasi untuk strategi yang sudah ada: pullback_buy / breakdown_sell (signal_rule),
+# peringatan dini (alert_rule) dan skor chart (determine_final_signal). Kondisi masuk dihitung sebagai mask
+# boolean untuk seluruh riwayat sekaligus; hanya simulasi posisi (entry, TP/SL, biaya) yang berjalan per trade.
+# Data dibaca dari penyimpanan candle lokal (SQLite) atau folder CSV, jadi berjalan sepenuhnya offline.
+# Indikator dihitung dari awal riwayat dan hanya pada bar yang sudah close (seperti mode daemon);
+# pemindai sekali jalan memakai 100 bar terakhir sehingga nilai EMA-nya bisa sedikit berbeda.
+#
+# Pemakaian: python backtest.py [KOIN ...] [--timeframes 4h,1d] [--data candle_store/candles.sqlite3]
+#                               [--workers N] [--json hasil.json]
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import indicators
+import market_data
+from candle_store import CandleStore
+from market_data import CANDLE_STORE_PATH
+
+# --- KONFIGURASI ---
+# Biaya per sisi transaksi (0.1% = biaya taker KuCoin)
+BACKTEST_FEE = float(os.environ.get("BACKTEST_FEE", 0.001))
+# Keluar saat take profit / stop loss tersentuh, atau ditutup di close setelah max_bars bar
+EXIT_RULES = {
+    "take_profit": float(os.environ.get("BACKTEST_TAKE_PROFIT", 0.04)),
+    "stop_loss": float(os.environ.get("BACKTEST_STOP_LOSS", 0.02)),
+    "max_bars": int(os.environ.get("BACKTEST_MAX_BARS", 12)),
+}
+# Riwayat sentimen F&G tidak tersedia offline; skor chart dihitung dengan sentimen netral
+CHART_SENTIMENT_SCORE = 0
+
+
+# --- DATA ---
+def _read_history(source: str, coin: str, timeframe: str, exchange: str):
+    # Folder CSV: {KOIN}_{timeframe}.csv berkolom timestamp,open,high,low,close,volume. Selain itu: file SQLite CandleStore.
+    if os.path.isdir(source):
+        path = os.path.join(source, f"{coin}_{timeframe}.csv")
+        if not os.path.exists(path): return []
+        with open(path, newline='') as f:
+            return [[int(float(row['timestamp']))] + [float(row[k]) for k in ('open', 'high', 'low', 'close', 'volume')] for row in csv.DictReader(f)]
+    return CandleStore(source).read(exchange, f"{coin}/USDT", timeframe)
+
+def load_history(source: str, coin: str, timeframe: str, exchange: str = "kucoin", now_ms: int = None):
+    # Bot hanya menyimpan BASE_TIMEFRAME; timeframe kelipatannya dirangkum persis seperti market_data.
+    # Data lama/rekaman yang hanya berisi timeframe itu sendiri tetap bisa dipakai.
+    # Bar terakhir di store biasanya masih terbentuk: dibuang seperti market_data.closed_bars di mode daemon.
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    base = market_data.base_timeframe_for(timeframe)
+    ohlcv = _read_history(source, coin, base, exchange) if base is not None else []
+    ohlcv = market_data.resample(ohlcv, timeframe) if ohlcv else _read_history(source, coin, timeframe, exchange)
+    return market_data.closed_bars(ohlcv, timeframe, now_ms)
+
+def available_coins(source: str, timeframe: str, exchange: str = "kucoin"):
+    timeframes = {timeframe, market_data.base_timeframe_for(timeframe)} - {None}
+    if os.path.isdir(source):
+        coins = set()
+        for tf in timeframes:
+            suffix = f"_{tf}.csv"
+            coins |= {os.path.basename(path)[:-len(suffix)] for path in glob.glob(os.path.join(source, f"*{suffix}"))}
+        return sorted(coins)
+    return sorted({pair.split('/')[0] for _, pair, tf, _ in CandleStore(source).series(exchange) if tf in timeframes and pair.endswith('/USDT')})
+
+
+# --- MASK KONDISI MASUK ---
+def previous(values):
+    return np.concatenate(([np.nan], values[:-1]))
+
+def _ready(*arrays, bars: int = 3):
+    # Setara syarat len(df.dropna()) >= 3 di check_signal/check_alert
+    valid = np.ones(len(arrays[0]), dtype=bool)
+    for values in arrays: valid &= ~np.isnan(values)
+    return np.cumsum(valid) >= bars
+
+def cross_up(line, signal):
+    return (previous(line) < previous(signal)) & (line > signal)
+
+def cross_down(line, signal):
+    return (previous(line) > previous(signal)) & (line < signal)
+
+def signal_masks(close, settings: dict):
+    # Mask (BUY, SELL) per bar dengan kondisi persis seperti signal_finder.signal_rule
+    batch = {name: values[0] for name, values in indicators.compute_batch(close, [settings]).items()}
+    ema_fast, ema_slow, rsi, macd, macd_signal = (batch[k] for k in ("ema_fast", "ema_slow", "rsi", "macd", "macd_signal"))
+    ready = _ready(ema_fast, ema_slow, rsi, macd, macd_signal)
+    buy = ready & (close > ema_slow) & (ema_fast > ema_slow) \
+        & (previous(rsi) < settings['rsi_os']) & (rsi > settings['rsi_os']) & cross_up(macd, macd_signal)
+    sell = ready & ~buy & (close < ema_slow) & (ema_fast < ema_slow) \
+        & (previous(rsi) > settings['rsi_ob']) & (rsi < settings['rsi_ob']) & cross_down(macd, macd_signal)
+    return buy, sell
+
+def alert_masks(close, settings: dict):
+    # Mask (BUY_ALERT, SELL_ALERT) seperti signal_finder.alert_rule (RSI 14 + MACD sensitif)
+    batch = {name: values[0] for name, values in indicators.compute_batch(close, [settings], sensitive=True).items()}
+    rsi, macd, macd_signal = batch["rsi"], batch["macd"], batch["macd_signal"]
+    ready = _ready(rsi, macd, macd_signal)
+    buy = ready & (rsi < settings['rsi_os']) & cross_up(macd, macd_signal)
+    sell = ready & ~buy & (rsi > settings['rsi_ob']) & cross_down(macd, macd_signal)
+    return buy, sell
+
+def chart_masks(close, sentiment_score: int = CHART_SENTIMENT_SCORE):
+    # Skor determine_final_signal (main.py) untuk semua bar: >= 2 BELI, <= -2 JUAL
+    ma9, ma26 = indicators.sma(close, 9)[0], indicators.sma(close, 26)[0]
+    rsi = indicators.rsi(close, 14)[0]
+    macd, macd_signal, _ = (values[0] for values in indicators.macd(close, 12, 26, 9))
+    _, bb_high, bb_low = (values[0] for values in indicators.bollinger(close, 20, 2))
+    ready = _ready(ma9, ma26, rsi, macd, macd_signal, bb_high, bb_low, bars=2)
+    score = np.zeros(len(close))
+    score += ((close > ma9) & (ma9 > ma26)).astype(float) - ((close < ma9) & (ma9 < ma26)).astype(float)
+    score += 2 * cross_up(macd, macd_signal).astype(float) - 2 * cross_down(macd, macd_signal).astype(float)
+    score += (rsi < 30).astype(float) - (rsi > 70).astype(float)
+    score += (close < bb_low).astype(float) - (close > bb_high).astype(float)
+    score += sentiment_score
+    return ready & (score >= 2), ready & (score <= -2)
+
+
+# --- SIMULASI ---
+def simulate(ohlcv, longs, shorts, exit_rules: dict = EXIT_RULES, fee: float = BACKTEST_FEE):
+    # Sinyal di close bar i -> masuk di open bar i+1; satu posisi sekaligus.
+    # TP & SL tersentuh di bar yang sama dianggap kena SL (konservatif).
+    open_, high, low, close = ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], ohlcv[:, 4]
+    n, tp, sl, max_bars = len(close), exit_rules["take_profit"], exit_rules["stop_loss"], exit_rules["max_bars"]
+    trades, free_from = [], 0
+    for bar in np.flatnonzero(longs | shorts):
+        entry = bar + 1
+        if bar < free_from or entry >= n: continue
+        direction = 1 if longs[bar] else -1
+        price = open_[entry]
+        end = min(n, entry + max_bars)
+        favorable, adverse = (high[entry:end], low[entry:end]) if direction == 1 else (low[entry:end], high[entry:end])
+        tp_price, sl_price = price * (1 + direction * tp), price * (1 - direction * sl)
+        tp_hits = np.flatnonzero(direction * (favorable - tp_price) >= 0)
+        sl_hits = np.flatnonzero(direction * (adverse - sl_price) <= 0)
+        first_tp = tp_hits[0] if len(tp_hits) else None
+        first_sl = sl_hits[0] if len(sl_hits) else None
+        if first_sl is not None and (first_tp is None or first_sl <= first_tp):
+            offset, exit_price, reason = first_sl, sl_price, "stop_loss"
+        elif first_tp is not None:
+            offset, exit_price, reason = first_tp, tp_price, "take_profit"
+        else:
+            offset, exit_price, reason = end - entry - 1, close[end - 1], "time"
+        exit_bar = entry + offset
+        trades.append({"signal_ts": int(ohlcv[bar, 0]), "direction": direction, "entry": float(price), "exit": float(exit_price),
+                       "bars": int(offset + 1), "reason": reason,
+                       "return": float(direction * (exit_price / price - 1) - 2 * fee)})
+        free_from = exit_bar
+    return trades
+
+def summarize(trades, longs, shorts):
+    returns = np.array([trade["return"] for trade in trades])
+    equity = np.cumprod(1 + returns) if len(returns) else np.array([1.0])
+    peak = np.maximum.accumulate(np.concatenate(([1.0], equity)))
+    drawdown = 1 - np.concatenate(([1.0], equity)) / peak
+    return {
+        "signals_long": int(longs.sum()),
+        "signals_short": int(shorts.sum()),
+        "trades": len(trades),
+        "hit_rate": float((returns > 0).mean()) if len(returns) else None,
+        "avg_return": float(returns.mean()) if len(returns) else None,
+        "total_return": float(equity[-1] - 1),
+        "max_drawdown": float(drawdown.max()),
+    }
+
+
+# --- JALANKAN ---
+def backtest_series(coin: str, timeframe: str, ohlcv, optimal: dict, sensitive: dict,
+                    exit_rules: dict = EXIT_RULES, fee: float = BACKTEST_FEE, keep_trades: bool = False):
+    ohlcv = np.asarray(ohlcv, dtype=float)
+    close = ohlcv[:, 4]
+    results = []
+    for strategy, (longs, shorts) in (("signal", signal_masks(close, optimal)),
+                                      ("alert", alert_masks(close, sensitive)),
+                                      ("chart", chart_masks(close))):
+        trades = simulate(ohlcv, longs, shorts, exit_rules, fee)
+        result = dict(summarize(trades, longs, shorts), coin=coin, timeframe=timeframe, strategy=strategy, bars=len(close))
+        if keep_trades: result["trades_detail"] = trades
+        results.append(result)
+    return results
+
+def _backtest_job(job):
+    return backtest_series(*job)
+
+def run_backtest(jobs, workers: int = None):
+    # jobs: [(coin, timeframe, ohlcv, optimal, sensitive, exit_rules, fee)]; satu simbol per proses
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [result for job in jobs for result in _backtest_job(job)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return [result for results in pool.map(_backtest_job, jobs) for result in results]
+
+def format_results(results):
+    lines = [f"{'Koin':<8} {'TF':<4} {'Strategi':<7} {'Bar':>6} {'Sinyal L/S':>10} {'Trade':>6} {'Hit':>6} {'P&L':>8} {'MaxDD':>7}"]
+    for r in results:
+        hit = f"{r['hit_rate'] * 100:5.1f}%" if r['hit_rate'] is not None else "    -"
+        lines.append(f"{r['coin']:<8} {r['timeframe']:<4} {r['strategy']:<7} {r['bars']:>6} {r['signals_long']:>5}/{r['signals_short']:<4} "
+                     f"{r['trades']:>6} {hit:>6} {r['total_return'] * 100:+7.1f}% {r['max_drawdown'] * 100:6.1f}%")
+    return "\n".join(lines)
+
+def main(argv=None):
+    import signal_finder
+    parser = argparse.ArgumentParser(description="Backtest strategi sinyal pada data candle lokal.")
+    parser.add_argument("coins", nargs="*", help="Koin (mis. BTC ETH); kosong = semua yang ada di data")
+    parser.add_argument("--timeframes", default="4h")
+    parser.add_argument("--data", default=CANDLE_STORE_PATH, help="File SQLite CandleStore atau folder CSV")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", help="Simpan hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for timeframe in [tf.strip() for tf in args.timeframes.split(",") if tf.strip()]:
+        for coin in args.coins or available_coins(args.data, timeframe):
+            ohlcv = load_history(args.data, coin, timeframe)
+            if len(ohlcv) < 60:
+                print(f"Data {coin} {timeframe} tidak cukup ({len(ohlcv)} bar), dilewati.")
+                continue
+            optimal = signal_finder.OPTIMAL_SETTINGS.get(coin, signal_finder.OPTIMAL_SETTINGS["DEFAULT"])
+            sensitive = signal_finder.SENSITIVE_SETTINGS.get(coin, signal_finder.SENSITIVE_SETTINGS["DEFAULT"])
+            jobs.append((coin, timeframe, ohlcv, optimal, sensitive, EXIT_RULES, BACKTEST_FEE))
+    if not jobs:
+        print("Tidak ada data untuk di-backtest.")
+        return []
+
+    started = time.perf_counter()
+    results = run_backtest(jobs, args.workers)
+    print(format_results(results))
+    print(f"Backtest {len(jobs)} seri selesai dalam {time.perf_counter() - started:.2f} detik.")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# benchmark.py
+# Benchmark offline: bursa (ccxt), Telegram & API HTTP (alternative.me, CryptoCompare, Gemini, /api/data) diganti
+# stand-in dari fakes.py dengan latensi yang bisa diatur, sehingga hasilnya bisa diulang tanpa jaringan.
+# Setiap kasus dijalankan di proses terpisah agar RSS puncak tidak tercampur; waktu dinding, waktu CPU & RSS
+# puncak ditambahkan ke file riwayat JSON lalu dibandingkan dengan run sebelumnya (pengaturan yang sama).
+#
+# Pemakaian: python benchmark.py [--cases scan,chart,api] [--sizes 10,100,1000] [--fixtures DIR]
+#                                [--exchange-latency 0.05] [--http-latency 0.1] [--telegram-latency 0.05]
+#                                [--real-limits] [--history PATH] [--fail-on-regression]
+#            python benchmark.py --record-fixtures DIR [--data candle_store/candles.sqlite3] [--timeframe 4h]
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from fakes import FakeBot, FakeExchange, FakeHTTP, FakeResponse, synthetic_ohlcv, fear_and_greed_route, gemini_route, news_route
+
+# --- KONFIGURASI ---
+BENCHMARK_HISTORY_PATH = os.environ.get("BENCHMARK_HISTORY_PATH", os.path.join("candle_store", "benchmark_history.json"))
+# Kenaikan relatif (waktu dinding, CPU, RSS) di atas batas ini ditandai sebagai regresi
+REGRESSION_THRESHOLD = float(os.environ.get("BENCHMARK_REGRESSION_THRESHOLD", 0.10))
+# Selisih absolut di bawah ini dianggap derau (kasus yang hanya berjalan puluhan milidetik)
+NOISE_FLOOR = {"wall": 0.05, "cpu": 0.05, "peak_rss_mb": 5.0}
+CASES = ["scan", "chart", "api"]
+DEFAULT_SIZES = [10, 100, 1000]
+# Jumlah chart per kasus "chart" (render ~0,3 detik per chart, tidak diskalakan dengan --sizes)
+CHART_COUNT = 10
+# Jumlah request per varian /api/data (penuh, gzip, 304, delta)
+API_REQUESTS = 50
+FIXTURE_BARS = 300
+WATCHLIST_SIZE = 3
+API_SECRET = "benchmark"
+
+
+# --- FIXTURE ---
+def load_fixtures(coins, timeframe: str = '4h', source: str = None, bars: int = FIXTURE_BARS):
+    # Koin ke-i memakai seri rekaman ke-(i mod n) dari folder fixture/CandleStore; tanpa sumber -> candle sintetis ber-seed.
+    # Fixture dibuat di timeframe yang benar-benar diunduh (BASE_TIMEFRAME bila timeframe dirangkum lokal).
+    # Timestamp digeser sehingga bar terakhir adalah bar yang sedang terbentuk sekarang.
+    import backtest
+    import market_data
+    base = market_data.base_timeframe_for(timeframe)
+    if base:
+        bars *= market_data.timeframe_ms(timeframe) // market_data.timeframe_ms(base)
+        timeframe = base
+    tf_ms = market_data.timeframe_ms(timeframe)
+    end_ms = market_data.next_close_ms(int(time.time() * 1000), timeframe)
+    recorded = []
+    if source:
+        recorded = [series[-bars:] for series in (backtest.load_history(source, coin, timeframe) for coin in backtest.available_coins(source, timeframe)) if series]
+        if not recorded: raise SystemExit(f"Tidak ada fixture {timeframe} di {source}.")
+    fixtures = {}
+    for i, coin in enumerate(coins):
+        if recorded:
+            series = recorded[i % len(recorded)]
+            shift = end_ms - tf_ms - series[-1][0]
+            fixtures[f"{coin}/USDT"] = [[candle[0] + shift] + list(candle[1:]) for candle in series]
+        else:
+            fixtures[f"{coin}/USDT"] = synthetic_ohlcv(i, bars, tf_ms, end_ms)
+    return fixtures
+
+def record_fixtures(directory: str, source: str, timeframe: str = None):
+    # Menyalin riwayat CandleStore ke CSV ({KOIN}_{timeframe}.csv, format yang sama dengan backtest.py)
+    import backtest
+    import market_data
+    timeframe = timeframe or market_data.BASE_TIMEFRAME or '4h'
+    if not os.path.exists(source): raise SystemExit(f"Sumber data {source} tidak ditemukan.")
+    os.makedirs(directory, exist_ok=True)
+    coins = backtest.available_coins(source, timeframe)
+    for coin in coins:
+        ohlcv = backtest.load_history(source, coin, timeframe)
+        with open(os.path.join(directory, f"{coin}_{timeframe}.csv"), 'w') as f:
+            f.write("timestamp,open,high,low,close,volume\n")
+            f.writelines(",".join(str(v) for v in candle) + "\n" for candle in ohlcv)
+    print(f"{len(coins)} fixture {timeframe} ditulis ke {directory}.")
+
+def make_users(n_users: int, coins, seed: int = 0):
+    # Pengguna dengan watchlist acak (deterministik) dan semua strategi aktif
+    rng = random.Random(seed)
+    strategies = {name: {"alert_on": True, "signal_on": True} for name in ("pullback_buy", "breakdown_sell")}
+    return {str(100000 + i): {"watchlist": rng.sample(coins, min(WATCHLIST_SIZE, len(coins))), "strategies": json.loads(json.dumps(strategies))}
+            for i in range(n_users)}
+
+
+# --- STAND-IN ---
+def offline_env(workdir: str, real_limits: bool):
+    # Harus dipasang sebelum modul bot diimpor: konfigurasinya dibaca saat impor
+    env = {
+        "CANDLE_STORE_PATH": "", "MARKETS_CACHE_PATH": "", "ANALYSIS_STORE_PATH": "", "AI_CACHE_PATH": "", "NEWS_STATE_PATH": "", "MARKET_CONTEXT_PATH": "", "INDICATOR_STATE_PATH": "", "ANALYSIS_API_URL": "",
+        "API_SNAPSHOT_PATH": os.path.join(workdir, "api_snapshot.json"),
+        "STRATEGY_SETTINGS_PATH": os.path.join(workdir, "strategy_settings.json"),
+        "DATA_DIR": os.path.join(workdir, "data"),
+        "RAILWAY_URL": "benchmark.invalid", "API_SECRET_KEY": API_SECRET, "GEMINI_API_KEY": "benchmark",
+        "TELEGRAM_TOKEN": "benchmark", "CRYPTOCOMPARE_API_KEY": "benchmark",
+    }
+    if not real_limits:
+        # Tanpa batas laju agar yang terukur adalah biaya kode, bukan waktu tunggu rate limiter
+        env.update({"KUCOIN_RATE_LIMIT": "1000000", "TELEGRAM_GLOBAL_RATE": "1000000", "TELEGRAM_CHAT_INTERVAL": "0",
+                    "GEMINI_HOURLY_BUDGET": "1000000"})
+    os.environ.update(env)
+
+def install_fakes(fixtures: dict, args, api_payload: dict = None):
+    import requests
+    import market_data
+    exchange = FakeExchange(fixtures, args.exchange_latency)
+    market_data._exchanges["kucoin"] = exchange
+    market_data._exchanges["indodax"] = FakeExchange(tickers={"USDT/IDR": 16250.0}, latency=args.exchange_latency)
+    routes = {"alternative.me": fear_and_greed_route(), "cryptocompare.com": news_route(), "generativelanguage": gemini_route()}
+    if api_payload is not None:
+        routes["/api/data"] = lambda method, url, kwargs: FakeResponse(200, api_payload, {"ETag": f'"{api_payload["version"]}-benchmark"'})
+    http = FakeHTTP(routes, args.http_latency)
+    http.install(requests)
+    return exchange, http
+
+
+# --- KASUS ---
+def case_scan(size: int, args):
+    # signal_finder.main() penuh: /api/data, pengambilan candle, indikator, validasi berita + AI, fan-out Telegram
+    coins = [f"C{i:04d}" for i in range(size)]
+    core_watchlist = coins[:10]
+    users = make_users(size, coins)
+    exchange, http = install_fakes(load_fixtures(coins, '4h', args.fixtures), args,
+                                   {"users": users, "core_watchlist": core_watchlist, "version": 1, "delta": False})
+    import signal_finder
+    bots = []
+    signal_finder.create_bot = lambda: bots.append(FakeBot(args.telegram_latency)) or bots[-1]
+
+    def run():
+        signal_finder.main()
+        return {"exchange_calls": exchange.calls, "http_calls": len(http.calls), "telegram_calls": sum(len(bot.calls) for bot in bots)}
+    return run
+
+def case_chart(size: int, args):
+    # generate_chart_and_caption() untuk CHART_COUNT pasangan berbeda (tanpa RenderCache, render inline)
+    coins = [f"C{i:04d}" for i in range(CHART_COUNT)]
+    exchange, http = install_fakes(load_fixtures(coins, '4h', args.fixtures), args)
+    import main
+
+    def run():
+        for coin in coins:
+            png, caption, symbol, ai_caption, _, _ = main.generate_chart_and_caption(f"{coin}/USDT", '4h')
+            if png is None: raise RuntimeError(f"Chart {coin} gagal: {caption}")
+            if ai_caption is not None: ai_caption.result()
+        return {"charts": len(coins), "exchange_calls": exchange.calls, "http_calls": len(http.calls)}
+    return run
+
+def case_api(size: int, args):
+    # /api/data lewat test client Flask: body penuh, gzip, 304 (If-None-Match) dan delta (since=versi)
+    import main
+    coins = [f"C{i:04d}" for i in range(max(size, WATCHLIST_SIZE))]
+    for user_id, user in make_users(size, coins).items():
+        for coin in user["watchlist"]: main.USER_STORE.add_symbol(user_id, coin)
+        for name in user["strategies"]:
+            for flag in ("alert_on", "signal_on"): main.USER_STORE.toggle_strategy(user_id, name, flag)
+    client = main.app.test_client()
+    url = f"/api/data?secret={API_SECRET}"
+
+    def timed(func):
+        started = time.perf_counter()
+        for _ in range(API_REQUESTS): func()
+        return (time.perf_counter() - started) / API_REQUESTS * 1000
+
+    def run():
+        full = client.get(url)
+        etag, version = full.headers["ETag"], full.get_json()["version"]
+        timings = {
+            "full_ms": timed(lambda: client.get(url)),
+            "gzip_ms": timed(lambda: client.get(url, headers={"Accept-Encoding": "gzip"})),
+            "not_modified_ms": timed(lambda: client.get(url, headers={"If-None-Match": etag})),
+        }
+        main.USER_STORE.add_symbol("100000", "DELTA")
+        timings["delta_ms"] = timed(lambda: client.get(f"{url}&since={version}", headers={"Accept-Encoding": "gzip"}))
+        return dict(timings, body_bytes=len(full.data))
+    return run
+
+CASE_SETUP = {"scan": case_scan, "chart": case_chart, "api": case_api}
+
+
+# --- PENGUKURAN ---
+def _peak_rss_mb():
+    # ru_maxrss dalam KB di Linux, byte di macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_child(args):
+    # Dijalankan di subprocess: persiapan (impor, fixture, data pengguna) tidak ikut terukur
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        offline_env(workdir, args.real_limits)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            run = CASE_SETUP[args.child](args.size, args)
+            baseline_rss = _peak_rss_mb()
+            started_wall, started_cpu = time.perf_counter(), time.process_time()
+            extra = run()
+            wall, cpu = time.perf_counter() - started_wall, time.process_time() - started_cpu
+        result = {"case": args.child, "size": args.size, "wall": wall, "cpu": cpu,
+                  "peak_rss_mb": _peak_rss_mb(), "baseline_rss_mb": baseline_rss, **extra}
+        with open(args.result, 'w') as f:
+            json.dump(result, f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_case(case: str, size: int, args):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+    command = [sys.executable, os.path.abspath(__file__), "--child", case, "--size", str(size), "--result", result_path,
+               "--exchange-latency", str(args.exchange_latency), "--http-latency", str(args.http_latency),
+               "--telegram-latency", str(args.telegram_latency)]
+    if args.fixtures: command += ["--fixtures", args.fixtures]
+    if args.real_limits: command.append("--real-limits")
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"Kasus {case} ({size}) gagal:\n{completed.stderr[-2000:]}")
+            return None
+        with open(result_path, 'r') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+# --- RIWAYAT & PERBANDINGAN ---
+def load_history(path: str):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"runs": []}
+
+def save_history(history: dict, path: str):
+    directory = os.path.dirname(path)
+    if directory: os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def previous_result(history: dict, settings: dict, case: str, size: int):
+    # Hasil terbaru untuk kasus & ukuran yang sama dengan pengaturan (latensi, fixture, batas laju) identik
+    for run in reversed(history["runs"]):
+        if run["settings"] != settings: continue
+        for result in run["results"]:
+            if result["case"] == case and result["size"] == size: return run, result
+    return None, None
+
+def compare(result: dict, previous: dict, threshold: float = REGRESSION_THRESHOLD):
+    # Perubahan relatif per metrik; regresi jika ada yang naik di atas threshold (dan di atas NOISE_FLOOR)
+    deltas = {metric: (result[metric] - previous[metric]) / previous[metric] if previous[metric] else 0.0
+              for metric in ("wall", "cpu", "peak_rss_mb")}
+    return deltas, [metric for metric, delta in deltas.items() if delta > threshold and result[metric] - previous[metric] > NOISE_FLOOR[metric]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline pemindai, chart & /api/data dengan stand-in bursa/Telegram/HTTP.")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="Jumlah koin & pengguna (scan, api)")
+    parser.add_argument("--fixtures", default=None, help="Folder CSV atau file SQLite CandleStore sebagai sumber candle rekaman")
+    parser.add_argument("--exchange-latency", type=float, default=0.0)
+    parser.add_argument("--http-latency", type=float, default=0.0)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--real-limits", action="store_true", help="Pakai batas laju produksi (KuCoin, Telegram, Gemini)")
+    parser.add_argument("--history", default=BENCHMARK_HISTORY_PATH)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--record-fixtures", metavar="DIR", default=None)
+    parser.add_argument("--data", default=os.path.join("candle_store", "candles.sqlite3"))
+    parser.add_argument("--timeframe", default=None, help="Timeframe fixture (default BASE_TIMEFRAME)")
+    parser.add_argument("--child", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child: return run_child(args)
+    if args.record_fixtures: return record_fixtures(args.record_fixtures, args.data, args.timeframe)
+
+    settings = {"exchange_latency": args.exchange_latency, "http_latency": args.http_latency, "telegram_latency": args.telegram_latency,
+                "fixtures": args.fixtures, "real_limits": args.real_limits}
+    history = load_history(args.history)
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    run = {"started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_commit(), "settings": settings, "results": []}
+    regressions = []
+    print(f"{'kasus':<6} {'ukuran':>6} {'dinding':>9} {'CPU':>9} {'RSS':>9}  perbandingan")
+    for case in cases:
+        for size in ([CHART_COUNT] if case == "chart" else sizes):
+            result = run_case(case, size, args)
+            if result is None: continue
+            run["results"].append(result)
+            line = f"{case:<6} {size:>6} {result['wall']:>8.2f}s {result['cpu']:>8.2f}s {result['peak_rss_mb']:>6.0f} MB"
+            previous_run, previous = previous_result(history, settings, case, size)
+            if previous:
+                deltas, worse = compare(result, previous, args.threshold)
+                line += "  " + ", ".join(f"{metric} {delta * 100:+.1f}%" for metric, delta in deltas.items())
+                line += f" vs {previous_run['commit'] or previous_run['started_at']}"
+                if worse:
+                    line += "  << REGRESI"
+                    regressions.append((case, size, worse))
+            print(line)
+
+    history["runs"].append(run)
+    save_history(history, args.history)
+    print(f"Hasil ditambahkan ke {args.history} ({len(history['runs'])} run).")
+    if regressions:
+        print(f"{len(regressions)} regresi di atas {args.threshold * 100:.0f}%: " + "; ".join(f"{case} {size} ({', '.join(worse)})" for case, size, worse in regressions))
+        if args.fail_on_regression: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# candle_buffer.py
+# Wadah candle berkapasitas tetap per (pair, timeframe): timestamp int64 + OHLCV float64 dalam array NumPy
+# bersebelahan. Ring buffer "tercermin": setiap bar ditulis di posisi i dan i + kapasitas, sehingga N bar
+# terakhir selalu satu irisan bersebelahan -> view tanpa salinan untuk indikator & jendela chart, dan
+# append/ganti bar terakhir O(1) tanpa menggeser isi. Memori tetap: 2 x kapasitas x 6 x 8 byte.
+import numpy as np
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class CandleBuffer:
+    __slots__ = ("capacity", "_ts", "_values", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(int(capacity), 1)
+        self._ts = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._values = np.zeros((len(FIELDS), 2 * self.capacity), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    @classmethod
+    def from_ohlcv(cls, ohlcv, capacity: int = None):
+        buffer = cls(capacity or len(ohlcv))
+        buffer.extend(ohlcv)
+        return buffer
+
+    @classmethod
+    def from_arrays(cls, timestamps, values, capacity: int = None):
+        # values: matriks (5, n) urut FIELDS
+        buffer = cls(capacity or len(timestamps))
+        buffer._fill(timestamps, values)
+        return buffer
+
+    def __len__(self):
+        return self._size
+
+    # --- TULIS ---
+    def _write(self, pos: int, candle):
+        for p in (pos, pos + self.capacity):
+            self._ts[p] = candle[0]
+            self._values[:, p] = candle[1:6]
+
+    def append(self, candle):
+        if self._size < self.capacity:
+            self._write((self._start + self._size) % self.capacity, candle)
+            self._size += 1
+        else:
+            # Penuh: bar tertua ditimpa dan awal jendela maju satu
+            self._write(self._start, candle)
+            self._start = (self._start + 1) % self.capacity
+
+    def replace_last(self, candle):
+        self._write((self._start + self._size - 1) % self.capacity, candle)
+
+    def _fill(self, timestamps, values):
+        # Isi ulang sekaligus (kedua salinan) tanpa loop Python; hanya kapasitas bar terakhir yang disimpan
+        timestamps, values = timestamps[-self.capacity:], values[:, -self.capacity:]
+        n = len(timestamps)
+        for offset in (0, self.capacity):
+            self._ts[offset:offset + n] = timestamps
+            self._values[:, offset:offset + n] = values
+        self._start, self._size = 0, n
+
+    def extend(self, ohlcv):
+        if not len(ohlcv): return
+        if self._size:
+            for candle in ohlcv: self.append(candle)
+            return
+        rows = np.asarray(ohlcv[-self.capacity:], dtype=np.float64)
+        self._fill(rows[:, 0].astype(np.int64), rows[:, 1:6].T)
+
+    def update(self, candle):
+        # Update bar dari stream: bar yang sama diganti, bar baru ditambahkan. Mengembalikan bar yang baru saja
+        # close (list [ms, o, h, l, c, v]) atau None; bar yang lebih lama dari bar terakhir diabaikan.
+        if not self._size:
+            self.append(candle)
+            return None
+        last_ts = self.last_timestamp
+        if candle[0] == last_ts:
+            self.replace_last(candle)
+        elif candle[0] > last_ts:
+            closed = self.tolist(1)[0]
+            self.append(candle)
+            return closed
+        return None
+
+    # --- BACA (VIEW TANPA SALINAN) ---
+    def _window(self, n: int = None):
+        n = self._size if n is None else min(n, self._size)
+        end = self._start + self._size
+        return end - n, end
+
+    def timestamps(self, n: int = None):
+        begin, end = self._window(n)
+        return self._ts[begin:end]
+
+    def column(self, name: str, n: int = None):
+        begin, end = self._window(n)
+        return self._values[FIELDS.index(name), begin:end]
+
+    def values(self, n: int = None):
+        # Matriks (5, n) urut FIELDS
+        begin, end = self._window(n)
+        return self._values[:, begin:end]
+
+    @property
+    def close(self):
+        return self.column("close")
+
+    @property
+    def volume(self):
+        return self.column("volume")
+
+    @property
+    def last_timestamp(self):
+        return int(self._ts[self._start + self._size - 1]) if self._size else None
+
+    def arrays(self, n: int = None):
+        # {"timestamp", "open", ..., "volume"} untuk n bar terakhir, semuanya view
+        arrays = {name: self.column(name, n) for name in FIELDS}
+        arrays["timestamp"] = self.timestamps(n)
+        return arrays
+
+    # --- SALINAN ---
+    def copy(self, n: int = None):
+        # Snapshot ringkas n bar terakhir (kapasitas = n) yang aman dibaca saat buffer asal terus di-update
+        begin, end = self._window(n)
+        return CandleBuffer.from_arrays(self._ts[begin:end], self._values[:, begin:end])
+
+    def tolist(self, n: int = None):
+        # Format ccxt [[ms, o, h, l, c, v], ...] untuk pemanggil lama
+        begin, end = self._window(n)
+        return [[ts] + row for ts, row in zip(self._ts[begin:end].tolist(), self._values[:, begin:end].T.tolist())]
+
+    @property
+    def nbytes(self):
+        return self._ts.nbytes + self._values.nbytes
+
+
+def to_frame(arrays: dict, columns=FIELDS):
+    # Adaptor tipis ke DataFrame berindeks waktu, hanya untuk mplfinance (satu-satunya pemakai yang butuh pandas)
+    import pandas as pd
+    df = pd.DataFrame({name: arrays[name] for name in columns}, index=pd.to_datetime(arrays["timestamp"], unit='ms'))
+    df.index.name = 'timestamp'
+    return df
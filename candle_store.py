@@ -0,0 +1,83 @@
+# candle_store.py
+# Penyimpanan candle lokal (SQLite) agar setiap run hanya mengunduh bar baru
+import os
+import sqlite3
+import threading
+
+# Jumlah bar maksimum yang disimpan per (exchange, pair, timeframe)
+CANDLE_STORE_RETENTION = int(os.environ.get("CANDLE_STORE_RETENTION", 5000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    exchange TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (exchange, pair, timeframe, ts)
+) WITHOUT ROWID;
+"""
+
+class CandleStore:
+    def __init__(self, path: str, retention: int = CANDLE_STORE_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # Satu koneksi per thread; WAL agar pembaca tidak diblok penulis
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def last_timestamp(self, exchange: str, pair: str, timeframe: str):
+        row = self._conn().execute(
+            "SELECT MAX(ts) FROM candles WHERE exchange=? AND pair=? AND timeframe=?",
+            (exchange, pair, timeframe)).fetchone()
+        return row[0]
+
+    def count(self, exchange: str, pair: str, timeframe: str):
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM candles WHERE exchange=? AND pair=? AND timeframe=?",
+            (exchange, pair, timeframe)).fetchone()
+        return row[0]
+
+    def upsert(self, exchange: str, pair: str, timeframe: str, ohlcv):
+        # INSERT OR REPLACE: bar terakhir yang masih terbentuk selalu ditimpa versi terbaru
+        if not ohlcv: return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(exchange, pair, timeframe, int(c[0]), c[1], c[2], c[3], c[4], c[5]) for c in ohlcv])
+            if self.retention:
+                conn.execute(
+                    "DELETE FROM candles WHERE exchange=? AND pair=? AND timeframe=? AND ts < "
+                    "(SELECT ts FROM candles WHERE exchange=? AND pair=? AND timeframe=? ORDER BY ts DESC LIMIT 1 OFFSET ?)",
+                    (exchange, pair, timeframe, exchange, pair, timeframe, self.retention - 1))
+
+    def read(self, exchange: str, pair: str, timeframe: str, limit: int = None):
+        sql = "SELECT ts, open, high, low, close, volume FROM candles WHERE exchange=? AND pair=? AND timeframe=? ORDER BY ts DESC"
+        params = [exchange, pair, timeframe]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self._conn().execute(sql, params).fetchall()
+        return [list(r) for r in reversed(rows)]
+
+    def series(self, exchange: str = None):
+        # Daftar (exchange, pair, timeframe) yang tersimpan beserta jumlah bar-nya
+        sql = "SELECT exchange, pair, timeframe, COUNT(*) FROM candles"
+        params = []
+        if exchange:
+            sql += " WHERE exchange=?"
+            params.append(exchange)
+        sql += " GROUP BY exchange, pair, timeframe ORDER BY exchange, pair, timeframe"
+        return [tuple(r) for r in self._conn().execute(sql, params).fetchall()]
@@ -0,0 +1,134 @@
+# chart_renderer.py
+# Render chart mplfinance di pool proses terpisah agar tidak memegang GIL thread dispatcher Telegram.
+# Worker di-fork sekali saat start (backend Agg & style nightclouds dibuat sekali per worker),
+# menerima array NumPy biasa dan mengembalikan bytes PNG. DataFrame hanya dibuat di worker, untuk mplfinance.
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# --- KONFIGURASI ---
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+# Jumlah render yang boleh mengantri di luar yang sedang dikerjakan worker; lebih dari itu ditolak (sibuk)
+RENDER_QUEUE_LIMIT = int(os.environ.get("RENDER_QUEUE_LIMIT", 8))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 60))
+
+COLUMNS = ("open", "high", "low", "close", "volume", "bb_high", "bb_low", "rsi", "macd", "macd_signal", "macd_hist")
+
+_STYLE = None
+
+
+class RendererBusy(Exception):
+    pass
+
+
+# --- SISI WORKER ---
+def _init_worker():
+    global _STYLE
+    import matplotlib
+    matplotlib.use("Agg")
+    import mplfinance as mpf
+    mc = mpf.make_marketcolors(up='#41a35a', down='#d74a43', wick={'up':'#41a35a','down':'#d74a43'}, volume={'up':'#41a35a','down':'#d74a43'})
+    _STYLE = mpf.make_mpf_style(marketcolors=mc, base_mpf_style='nightclouds', gridstyle='-')
+
+def _warmup():
+    return os.getpid()
+
+def _render(arrays: dict, title: str):
+    # Dijalankan di worker: array -> DataFrame -> PNG. Mengembalikan (png, detik render)
+    import mplfinance as mpf
+    from candle_buffer import to_frame
+    if _STYLE is None: _init_worker()
+    started = time.perf_counter()
+    df = to_frame(arrays, COLUMNS)
+    addplots = [
+        mpf.make_addplot(df[['bb_high', 'bb_low']], color='gray', alpha=0.3),
+        mpf.make_addplot(df['rsi'], panel=1, color='purple', ylabel='RSI'),
+        mpf.make_addplot(df['macd'], panel=2, color='blue', ylabel='MACD'),
+        mpf.make_addplot(df['macd_signal'], panel=2, color='orange'),
+        mpf.make_addplot(df['macd_hist'].where(df['macd_hist'] >= 0, 0), type='bar', panel=2, color='#41a35a'),
+        mpf.make_addplot(df['macd_hist'].where(df['macd_hist'] < 0, 0), type='bar', panel=2, color='#d74a43')
+    ]
+    buffer = io.BytesIO()
+    mpf.plot(df, type='candle', style=_STYLE, title=title, ylabel='Harga (USDT)', volume=True, mav=(9, 26), addplot=addplots, panel_ratios=(8, 3, 3), figscale=1.5, savefig=dict(fname=buffer, format='png'))
+    return buffer.getvalue(), time.perf_counter() - started
+
+
+# --- SISI PROSES UTAMA ---
+def plot_window(series: dict, bars: int = 30):
+    # n bar terakhir dari indicators.chart_series (view, tanpa salinan) -> dict array yang murah di-pickle
+    return {name: series[name][-bars:] for name in COLUMNS + ("timestamp",)}
+
+
+class ChartRenderer:
+    # workers=0: render langsung di thread pemanggil (mis. skrip sekali jalan)
+    def __init__(self, workers: int = RENDER_WORKERS, queue_limit: int = RENDER_QUEUE_LIMIT, timeout: float = RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._render_times = deque(maxlen=500)
+        self._wait_times = deque(maxlen=500)
+        self._counters = {"rendered": 0, "rejected": 0, "failed": 0}
+        self._pool = None
+        if workers > 0:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+            # Paksa semua worker dibuat sekarang, sebelum thread web/Telegram berjalan
+            for future in [self._pool.submit(_warmup) for _ in range(workers)]: future.result()
+
+    def render(self, arrays: dict, title: str):
+        with self._lock:
+            if self._pool is not None and self._pending >= self.workers + self.queue_limit:
+                self._counters["rejected"] += 1
+                raise RendererBusy(f"Antrian render penuh ({self._pending} chart sedang diproses).")
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            if self._pool is None:
+                try:
+                    png, render_time = _render(arrays, title)
+                finally:
+                    self._release()
+            else:
+                try:
+                    future = self._pool.submit(_render, arrays, title)
+                except Exception:
+                    self._release()
+                    raise
+                # Slot dilepas saat worker benar-benar selesai, bukan saat pemanggil berhenti menunggu: render yang
+                # melewati timeout tetap memakai worker dan tetap dihitung untuk batas antrian
+                future.add_done_callback(lambda _: self._release())
+                png, render_time = future.result(timeout=self.timeout)
+        except Exception:
+            with self._lock: self._counters["failed"] += 1
+            raise
+        total = time.perf_counter() - started
+        with self._lock:
+            self._counters["rendered"] += 1
+            self._render_times.append(render_time)
+            self._wait_times.append(total - render_time)
+        print(f"Render '{title}' selesai: {render_time:.2f}s render, {total - render_time:.2f}s antri/transfer.")
+        return png
+
+    def _release(self):
+        with self._lock: self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            render_times, wait_times = sorted(self._render_times), sorted(self._wait_times)
+            result = dict(self._counters, pending=self._pending, workers=self.workers)
+        if render_times:
+            result["render_avg"] = sum(render_times) / len(render_times)
+            result["render_p95"] = render_times[min(len(render_times) - 1, int(len(render_times) * 0.95))]
+            result["render_max"] = render_times[-1]
+            result["wait_avg"] = sum(wait_times) / len(wait_times)
+        return result
+
+    def close(self):
+        if self._pool is not None: self._pool.shutdown(wait=True)
@@ -0,0 +1,240 @@
+# delivery.py
+# Antrian pengiriman Telegram: worker pool, batas laju global & per-chat, RetryAfter, retry dengan backoff,
+# dan unggah foto sekali lalu pakai ulang file_id-nya untuk penerima berikutnya.
+import heapq
+import io
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from telegram.error import RetryAfter, TimedOut, NetworkError, BadRequest
+from rate_limiter import TokenBucket
+import metrics
+
+# --- KONFIGURASI ---
+DELIVERY_WORKERS = int(os.environ.get("DELIVERY_WORKERS", 4))
+# Batas Telegram: ~30 pesan/detik global dan ~1 pesan/detik per chat
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 25))
+TELEGRAM_CHAT_INTERVAL = float(os.environ.get("TELEGRAM_CHAT_INTERVAL", 1.0))
+DELIVERY_MAX_RETRIES = int(os.environ.get("DELIVERY_MAX_RETRIES", 3))
+# photo_key -> file_id yang diingat (LRU); satu entri per (pair, timeframe, candle) di bot yang berjalan lama
+DELIVERY_PHOTO_CACHE_SIZE = int(os.environ.get("DELIVERY_PHOTO_CACHE_SIZE", 512))
+
+
+class DeliveryJob:
+    def __init__(self, method: str, chat_id, kwargs: dict, photo_key=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.photo_key = photo_key
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.sent_at = self.enqueued_at
+        self.attempts = 0
+
+
+class DeliveryQueue:
+    def __init__(self, bot, workers: int = DELIVERY_WORKERS, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_interval: float = TELEGRAM_CHAT_INTERVAL, max_retries: int = DELIVERY_MAX_RETRIES,
+                 backoff: float = 1.0, photo_cache_size: int = DELIVERY_PHOTO_CACHE_SIZE):
+        self.bot = bot
+        self.photo_cache_size = photo_cache_size
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._limiter = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        # Per chat hanya satu job (kepala antrian chat) yang ada di heap atau sedang dikirim; sisanya menunggu di
+        # FIFO chat sehingga retry tidak membuat pesan berikutnya menyalip. _chat_next: jadwal paling awal chat
+        # yang sedang kosong, dibuang begitu lewat.
+        self._chat_queues = {}
+        self._chat_next = {}
+        self._paused_until = 0.0
+        self._closed = False
+        self._pending = 0
+        self._photo_ids = OrderedDict()
+        self._photo_uploading = set()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {"sent": 0, "failed": 0, "retried": 0, "retry_after": 0, "photo_reused": 0}
+        self._threads = [threading.Thread(target=self._worker, name=f"delivery-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads: thread.start()
+
+    # --- API PUBLIK ---
+    def submit(self, method: str, chat_id, photo_key=None, **kwargs):
+        job = DeliveryJob(method, chat_id, kwargs, photo_key)
+        with self._cond:
+            if self._closed: raise RuntimeError("DeliveryQueue sudah ditutup.")
+            self._pending += 1
+            self._enqueue(job)
+        return job.future
+
+    def send_message(self, chat_id, text: str, **kwargs):
+        return self.submit("send_message", chat_id, text=text, **kwargs)
+
+    def send_photo(self, chat_id, photo, photo_key=None, **kwargs):
+        # photo boleh bytes atau file-like; dibaca sekali agar bisa dikirim ulang saat retry.
+        # Foto dengan photo_key yang sama hanya diunggah sekali, sisanya memakai file_id.
+        if hasattr(photo, "read"): photo = photo.read()
+        return self.submit("send_photo", chat_id, photo_key=photo_key, photo=photo, **kwargs)
+
+    def join(self, timeout: float = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0: return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, wait: bool = True):
+        if wait: self.join()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads: thread.join()
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            result = dict(self._counters, queue_depth=len(self._heap), pending=self._pending)
+        if latencies:
+            result["latency_avg"] = sum(latencies) / len(latencies)
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            result["latency_max"] = latencies[-1]
+        return result
+
+    def summary(self):
+        stats = self.stats()
+        text = f"Pengiriman: {stats['sent']} terkirim, {stats['failed']} gagal, {stats['retried']} retry ({stats['retry_after']} RetryAfter), antrian {stats['queue_depth']}."
+        if "latency_avg" in stats:
+            text += f" Latensi rata-rata {stats['latency_avg']:.2f}s, p95 {stats['latency_p95']:.2f}s."
+        return text
+
+    # --- INTERNAL ---
+    def _push(self, job, ready_at: float):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), job))
+        self._cond.notify()
+
+    def _enqueue(self, job):
+        # Chat yang masih punya job berjalan/menunggu retry: antre di belakangnya
+        waiting = self._chat_queues.get(job.chat_id)
+        if waiting is not None:
+            waiting.append(job)
+            return
+        self._chat_queues[job.chat_id] = deque()
+        self._push(job, max(time.monotonic(), self._chat_next.pop(job.chat_id, 0.0)))
+
+    def _next_in_chat(self, job):
+        # Job kepala chat selesai (terkirim/gagal final): job berikutnya di chat ini paling cepat chat_interval
+        # setelah job ini mulai dikirim
+        now = time.monotonic()
+        next_at = job.sent_at + self.chat_interval
+        waiting = self._chat_queues.get(job.chat_id)
+        if waiting:
+            self._push(waiting.popleft(), max(now, next_at))
+            return
+        self._chat_queues.pop(job.chat_id, None)
+        self._chat_next = {chat_id: at for chat_id, at in self._chat_next.items() if at > now}
+        if next_at > now: self._chat_next[job.chat_id] = next_at
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._closed: return None
+                now = time.monotonic()
+                if self._heap:
+                    ready_at = max(self._heap[0][0], self._paused_until)
+                    if ready_at <= now:
+                        job = heapq.heappop(self._heap)[2]
+                        # Foto yang sedang diunggah worker lain: tunggu file_id-nya
+                        if job.photo_key is not None and job.photo_key in self._photo_uploading:
+                            heapq.heappush(self._heap, (now + 0.05, next(self._seq), job))
+                            continue
+                        if job.photo_key is not None and job.photo_key not in self._photo_ids:
+                            self._photo_uploading.add(job.photo_key)
+                        job.sent_at = now
+                        return job
+                    self._cond.wait(ready_at - now)
+                else:
+                    self._cond.wait()
+
+    def _call(self, job):
+        kwargs = dict(job.kwargs)
+        if job.method == "send_photo":
+            file_id = self._photo_id(job.photo_key) if job.photo_key is not None else None
+            if file_id:
+                kwargs["photo"] = file_id
+            elif isinstance(kwargs["photo"], (bytes, bytearray)):
+                kwargs["photo"] = io.BytesIO(kwargs["photo"])
+        self._limiter.acquire()
+        with metrics.stage("telegram_send"):
+            return getattr(self.bot, job.method)(chat_id=job.chat_id, **kwargs)
+
+    def _photo_id(self, photo_key):
+        with self._cond:
+            file_id = self._photo_ids.get(photo_key)
+            if file_id:
+                self._photo_ids.move_to_end(photo_key)
+                self._counters["photo_reused"] += 1
+            return file_id
+
+    def _finish(self, job, result=None, error=None):
+        with self._cond:
+            if job.photo_key is not None:
+                self._photo_uploading.discard(job.photo_key)
+                photos = getattr(result, "photo", None)
+                if photos and job.photo_key not in self._photo_ids:
+                    self._photo_ids[job.photo_key] = photos[-1].file_id
+                    while len(self._photo_ids) > self.photo_cache_size:
+                        self._photo_ids.popitem(last=False)
+            self._next_in_chat(job)
+            self._pending -= 1
+            self._latencies.append(time.monotonic() - job.enqueued_at)
+            self._counters["failed" if error else "sent"] += 1
+            self._cond.notify_all()
+        metrics.message(job.method, "failed" if error else "sent")
+        if error: job.future.set_exception(error)
+        else: job.future.set_result(result)
+
+    def _retry(self, job, delay: float, pause_all: bool = False):
+        with self._cond:
+            if job.photo_key is not None: self._photo_uploading.discard(job.photo_key)
+            now = time.monotonic()
+            if pause_all: self._paused_until = max(self._paused_until, now + delay)
+            self._counters["retried"] += 1
+            # Tetap kepala antrian chat: pesan berikutnya di chat ini menunggu sampai job ini selesai
+            self._push(job, now + delay)
+        metrics.message(job.method, "retried")
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None: return
+            job.attempts += 1
+            try:
+                result = self._call(job)
+            except RetryAfter as e:
+                # Telegram meminta jeda: hentikan semua worker selama retry_after detik
+                with self._cond: self._counters["retry_after"] += 1
+                if job.attempts <= self.max_retries:
+                    self._retry(job, float(e.retry_after), pause_all=True)
+                else:
+                    self._finish(job, error=e)
+            except BadRequest as e:
+                print(f"Gagal mengirim ke {job.chat_id}: {e}")
+                self._finish(job, error=e)
+            except (TimedOut, NetworkError) as e:
+                if job.attempts <= self.max_retries:
+                    self._retry(job, self.backoff * (2 ** (job.attempts - 1)))
+                else:
+                    print(f"Gagal mengirim ke {job.chat_id} setelah {job.attempts} percobaan: {e}")
+                    self._finish(job, error=e)
+            except Exception as e:
+                print(f"Gagal mengirim ke {job.chat_id}: {e}")
+                self._finish(job, error=e)
+            else:
+                self._finish(job, result=result)
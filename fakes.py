@@ -0,0 +1,296 @@
+# fakes.py
+# Pengganti lokal (stand-in) untuk menjalankan komponen bot secara offline, tanpa jaringan
+import itertools
+import threading
+import time
+
+
+class FakeClock:
+    # Jam tiruan: sleep() langsung memajukan waktu, sehingga penjadwalan daemon bisa diuji seketika
+    def __init__(self, start: float = 0.0):
+        self.now = float(start)
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.0)
+
+
+class FakePhotoSize:
+    def __init__(self, file_id: str):
+        self.file_id = file_id
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, chat_id, text=None, caption=None, photo=None):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.caption = caption
+        self.photo = photo or []
+
+
+class FakeBot:
+    # Pengganti telegram.Bot: mencatat panggilan, bisa diberi latensi dan kegagalan terjadwal.
+    # failures: {chat_id: [exception, ...]} -> dilempar berurutan pada panggilan berikutnya ke chat itu.
+    def __init__(self, latency: float = 0.0, failures: dict = None):
+        self.latency = latency
+        self.failures = {chat_id: list(errors) for chat_id, errors in (failures or {}).items()}
+        self.calls = []
+        self.uploads = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _record(self, method, chat_id, **kwargs):
+        if self.latency: time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((method, chat_id, kwargs))
+            errors = self.failures.get(chat_id)
+            if errors: raise errors.pop(0)
+            return next(self._ids)
+
+    def send_message(self, chat_id, text, **kwargs):
+        message_id = self._record("send_message", chat_id, text=text, **kwargs)
+        return FakeMessage(message_id, chat_id, text=text)
+
+    def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        if hasattr(photo, "read"):
+            photo = photo.read()
+            with self._lock: self.uploads += 1
+        message_id = self._record("send_photo", chat_id, photo=photo, caption=caption, **kwargs)
+        file_id = photo if isinstance(photo, str) else f"file-{message_id}"
+        return FakeMessage(message_id, chat_id, caption=caption, photo=[FakePhotoSize(file_id)])
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self._record("edit_message_text", chat_id, text=text, message_id=message_id, **kwargs)
+        return FakeMessage(message_id, chat_id, text=text)
+
+    def edit_message_caption(self, chat_id=None, message_id=None, caption=None, **kwargs):
+        self._record("edit_message_caption", chat_id, caption=caption, message_id=message_id, **kwargs)
+        return FakeMessage(message_id, chat_id, caption=caption)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        self._record("delete_message", chat_id, message_id=message_id)
+        return True
+
+
+def synthetic_ohlcv(seed: int, bars: int = 300, timeframe_ms: int = 4 * 3600 * 1000, end_ms: int = None, start_price: float = 100.0):
+    # Candle acak deterministik (random walk log-normal) dengan bar terakhir berakhir di end_ms
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+    volume = rng.uniform(100, 10000, bars)
+    end_ms = end_ms if end_ms is not None else (int(time.time() * 1000) // timeframe_ms + 1) * timeframe_ms
+    timestamps = end_ms - timeframe_ms * np.arange(bars, 0, -1)
+    return [[int(ts), float(o), float(h), float(l), float(c), float(v)] for ts, o, h, l, c, v in zip(timestamps, open_, high, low, close, volume)]
+
+
+class FakeExchange:
+    # Pengganti instance ccxt: fetch_ohlcv / fetch_ticker dari fixture di memori, dengan latensi buatan
+    def __init__(self, fixtures: dict = None, latency: float = 0.0, tickers: dict = None):
+        self.fixtures = fixtures or {}
+        self.tickers = tickers or {}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        if self.latency: time.sleep(self.latency)
+        with self._lock: self.calls += 1
+
+    def fetch_ohlcv(self, pair, timeframe='1m', since=None, limit=None):
+        self._call()
+        if pair not in self.fixtures: raise Exception(f"kucoin does not have market symbol {pair}")
+        ohlcv = self.fixtures[pair]
+        if since is not None: ohlcv = [candle for candle in ohlcv if candle[0] >= since]
+        return [list(candle) for candle in (ohlcv[:limit] if since is not None and limit else ohlcv[-limit:] if limit else ohlcv)]
+
+    def fetch_ticker(self, pair):
+        self._call()
+        if pair in self.tickers: return {"symbol": pair, "last": self.tickers[pair]}
+        if pair in self.fixtures: return {"symbol": pair, "last": self.fixtures[pair][-1][4]}
+        raise Exception(f"does not have market symbol {pair}")
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, json_data=None, headers: dict = None):
+        self.status_code = status_code
+        self._json = json_data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class FakeHTTP:
+    # Pengganti requests.get/post: routes = {potongan_url: handler(method, url, kwargs) -> FakeResponse}
+    def __init__(self, routes: dict, latency: float = 0.0):
+        self.routes = routes
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        if self.latency: time.sleep(self.latency)
+        with self._lock: self.calls.append((method, url))
+        for fragment, handler in self.routes.items():
+            if fragment in url: return handler(method, url, kwargs)
+        return FakeResponse(404, {"error": "not found"})
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def install(self, module):
+        # Pasang ke modul requests (atau modul lain yang punya get/post); mengembalikan fungsi untuk melepasnya
+        original = (module.get, module.post)
+        module.get, module.post = self.get, self.post
+        def uninstall(): module.get, module.post = original
+        return uninstall
+
+
+def fear_and_greed_route(value: int = 45, classification: str = "Fear"):
+    return lambda method, url, kwargs: FakeResponse(200, {"data": [{"value": str(value), "value_classification": classification}]})
+
+def gemini_route(answer: str = "YA, sentimen mendukung."):
+    return lambda method, url, kwargs: FakeResponse(200, {"candidates": [{"content": {"parts": [{"text": answer}]}}]})
+
+def news_route(per_category: int = 3):
+    # Artikel unik per kategori yang diminta (categories=BTC,ETH,...)
+    def handler(method, url, kwargs):
+        categories = (kwargs.get("params") or {}).get("categories", "")
+        articles = [{"id": f"{symbol}-{i}", "title": f"{symbol} headline {i}", "categories": symbol, "published_on": i}
+                    for symbol in categories.split(",") if symbol for i in range(per_category)]
+        return FakeResponse(200, {"Data": articles})
+    return handler
+
+
+# --- STREAM WEBSOCKET ---
+def kline_messages(pair: str, ohlcv, timeframe: str = "1h", updates_per_bar: int = 3):
+    # Pesan kline KuCoin dari candle rekaman/sintetis: beberapa update parsial per bar lalu nilai akhirnya
+    import stream
+    symbol = stream.market_id(pair)
+    topic = f"/market/candles:{symbol}_{stream.KLINE_TYPES[timeframe]}"
+    messages = []
+    for ts, open_, high, low, close, volume in ohlcv:
+        for step in range(1, updates_per_bar + 1):
+            part = step / updates_per_bar
+            price = open_ + (close - open_) * part
+            values = [str(ts // 1000), str(open_), str(price if step < updates_per_bar else close),
+                      str(max(open_, price) if step < updates_per_bar else high), str(min(open_, price) if step < updates_per_bar else low),
+                      str(volume * part), str(volume * part * price)]
+            messages.append({"type": "message", "topic": topic, "subject": "trade.candles.update",
+                             "data": {"symbol": symbol, "candles": values, "time": ts * 1000000}})
+    return messages
+
+
+class ReplayServer:
+    # Server lokal yang meniru protokol WebSocket publik KuCoin (bullet-public, welcome, subscribe/ack, ping/pong)
+    # lalu memutar ulang rekaman pesan (mis. STREAM_RECORD_PATH atau kline_messages) untuk topik yang di-subscribe.
+    # Posisi putar dibagi antar koneksi seperti pasar yang terus berjalan; drops = [N, ...] memutus koneksi
+    # ke-1, ke-2, ... setelah N pesan untuk menguji reconnect.
+    def __init__(self, messages, interval: float = 0.0, drops=(), start_delay: float = 0.2, ping_interval: int = 18000):
+        self.messages = list(messages)
+        self.interval = interval
+        self.drops = list(drops)
+        self.start_delay = start_delay
+        self.ping_interval = ping_interval
+        self.position = 0
+        self.connections = 0
+        self.subscriptions = []
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._ready = threading.Event()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        import json
+        with open(path, 'r') as f:
+            return cls([json.loads(line) for line in f if line.strip()], **kwargs)
+
+    def start(self):
+        threading.Thread(target=self._serve, name="replay-server", daemon=True).start()
+        self._ready.wait(10)
+        return self.url
+
+    def stop(self):
+        import asyncio
+        if self._loop is not None: asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+
+    def _serve(self):
+        import asyncio
+        from aiohttp import web
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post("/api/v1/bullet-public", self._bullet)
+        app.router.add_get("/endpoint", self._websocket)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _bullet(self, request):
+        from aiohttp import web
+        return web.json_response({"code": "200000", "data": {"token": "replay", "instanceServers": [
+            {"endpoint": self.url.replace("http", "ws", 1) + "/endpoint", "protocol": "websocket", "encrypt": False,
+             "pingInterval": self.ping_interval, "pingTimeout": 10000}]}})
+
+    async def _websocket(self, request):
+        import asyncio
+        import json
+        from aiohttp import web, WSMsgType
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        drop_after = self.drops[self.connections - 1] if self.connections <= len(self.drops) else None
+        topics = set()
+        await ws.send_json({"id": request.query.get("connectId"), "type": "welcome"})
+
+        async def replay():
+            await asyncio.sleep(self.start_delay)
+            sent = 0
+            while self.position < len(self.messages) and not ws.closed:
+                message = self.messages[self.position]
+                self.position += 1
+                if message.get("topic") not in topics: continue
+                await ws.send_json(message)
+                sent += 1
+                if drop_after is not None and sent >= drop_after:
+                    await ws.close()
+                    return
+                if self.interval: await asyncio.sleep(self.interval)
+
+        task = None
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT: continue
+            data = json.loads(msg.data)
+            if data.get("type") == "ping":
+                await ws.send_json({"id": data.get("id"), "type": "pong"})
+            elif data.get("type") in ("subscribe", "unsubscribe"):
+                # "/market/candles:A_1hour,B_1hour" -> satu topik per simbol, seperti topik pada pesan
+                prefix, items = data["topic"].split(':', 1)
+                expanded = {f"{prefix}:{item}" for item in items.split(',')}
+                topics = topics | expanded if data["type"] == "subscribe" else topics - expanded
+                self.subscriptions.append((self.connections, data["type"], data["topic"]))
+                await ws.send_json({"id": data.get("id"), "type": "ack"})
+                if task is None: task = asyncio.ensure_future(replay())
+        if task is not None: task.cancel()
+        return ws
@@ -0,0 +1,346 @@
+# indicator_state.py
+# State indikator inkremental O(1): di-seed dari riwayat, lalu diperbarui satu candle per langkah.
+# update() = bar sudah close (state berubah), peek() = bar yang masih terbentuk (state tidak berubah).
+# Rumus mengikuti pustaka `ta` sehingga hasilnya sama dengan menghitung ulang seluruh riwayat.
+import json
+import math
+import os
+import threading
+from collections import deque
+
+
+class EmaState:
+    def __init__(self, window: int, alpha: float = None):
+        self.window = window
+        self.alpha = alpha if alpha is not None else 2.0 / (window + 1.0)
+        self.value = None
+        self.count = 0
+
+    def _next(self, x):
+        return x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def update(self, x: float):
+        self.value = self._next(x)
+        self.count += 1
+        return self.value if self.count >= self.window else None
+
+    def peek(self, x: float):
+        return self._next(x) if self.count + 1 >= self.window else None
+
+    def params(self):
+        return [self.window, self.alpha]
+
+    def to_dict(self):
+        return {"window": self.window, "alpha": self.alpha, "value": self.value, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["window"], data["alpha"])
+        state.value, state.count = data["value"], data["count"]
+        return state
+
+
+class RsiState:
+    # RSI dengan smoothing Wilder (alpha = 1/window), bar pertama dianggap selisih 0 seperti `ta`
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_close = None
+        self.up = EmaState(window, 1.0 / window)
+        self.down = EmaState(window, 1.0 / window)
+
+    def _moves(self, x):
+        diff = 0.0 if self.prev_close is None else x - self.prev_close
+        return max(diff, 0.0), max(-diff, 0.0)
+
+    @staticmethod
+    def _rsi(up, down):
+        if up is None or down is None: return None
+        if down == 0: return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+    def update(self, x: float):
+        up, down = self._moves(x)
+        self.prev_close = x
+        return self._rsi(self.up.update(up), self.down.update(down))
+
+    def peek(self, x: float):
+        up, down = self._moves(x)
+        return self._rsi(self.up.peek(up), self.down.peek(down))
+
+    def params(self):
+        return [self.window]
+
+    def to_dict(self):
+        return {"window": self.window, "prev_close": self.prev_close, "up": self.up.to_dict(), "down": self.down.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["window"])
+        state.prev_close = data["prev_close"]
+        state.up, state.down = EmaState.from_dict(data["up"]), EmaState.from_dict(data["down"])
+        return state
+
+
+class MacdState:
+    def __init__(self, fast: int = 12, slow: int = 26, sign: int = 9):
+        self.fast, self.slow, self.sign = EmaState(fast), EmaState(slow), EmaState(sign)
+
+    @staticmethod
+    def _result(line, signal):
+        if line is None: return None, None, None
+        if signal is None: return line, None, None
+        return line, signal, line - signal
+
+    def update(self, x: float):
+        fast, slow = self.fast.update(x), self.slow.update(x)
+        if fast is None or slow is None: return None, None, None
+        line = fast - slow
+        return self._result(line, self.sign.update(line))
+
+    def peek(self, x: float):
+        fast, slow = self.fast.peek(x), self.slow.peek(x)
+        if fast is None or slow is None: return None, None, None
+        line = fast - slow
+        return self._result(line, self.sign.peek(line))
+
+    def params(self):
+        return [self.fast.window, self.slow.window, self.sign.window]
+
+    def to_dict(self):
+        return {"fast": self.fast.to_dict(), "slow": self.slow.to_dict(), "sign": self.sign.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.fast, state.slow, state.sign = (EmaState.from_dict(data[k]) for k in ("fast", "slow", "sign"))
+        return state
+
+
+class RollingState:
+    # Jendela geser dengan jumlah & jumlah kuadrat berjalan (relatif terhadap titik acuan agar presisi terjaga).
+    # Jumlah dihitung ulang dari jendela setiap `window` langkah untuk membuang akumulasi galat.
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.ref = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.steps = 0
+
+    def _stats(self, total, total_sq):
+        mean = total / self.window
+        var = max(total_sq / self.window - mean * mean, 0.0)
+        return self.ref + mean, math.sqrt(var)
+
+    def _resum(self):
+        self.ref = self.values[0] if self.values else None
+        self.total = sum(v - self.ref for v in self.values) if self.values else 0.0
+        self.total_sq = sum((v - self.ref) ** 2 for v in self.values) if self.values else 0.0
+
+    def _after(self, x):
+        total, total_sq = self.total + (x - self.ref), self.total_sq + (x - self.ref) ** 2
+        if len(self.values) == self.window:
+            old = self.values[0] - self.ref
+            total, total_sq = total - old, total_sq - old * old
+        return total, total_sq
+
+    def update(self, x: float):
+        if self.ref is None: self.ref = x
+        self.total, self.total_sq = self._after(x)
+        self.values.append(x)
+        self.steps += 1
+        if self.steps % self.window == 0: self._resum()
+        return self._stats(self.total, self.total_sq) if len(self.values) == self.window else (None, None)
+
+    def peek(self, x: float):
+        if len(self.values) + 1 < self.window: return None, None
+        ref_missing = self.ref is None
+        if ref_missing: self.ref = x
+        stats = self._stats(*self._after(x))
+        if ref_missing: self.ref = None
+        return stats
+
+    def params(self):
+        return [self.window]
+
+    def to_dict(self):
+        return {"window": self.window, "values": list(self.values), "steps": self.steps}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["window"])
+        state.values.extend(data["values"])
+        state.steps = data["steps"]
+        state._resum()
+        return state
+
+
+class SmaState(RollingState):
+    def update(self, x: float):
+        return super().update(x)[0]
+
+    def peek(self, x: float):
+        return super().peek(x)[0]
+
+
+class BollingerState(RollingState):
+    # Bollinger Bands dengan std populasi (ddof=0) seperti `ta`
+    def __init__(self, window: int = 20, window_dev: float = 2):
+        super().__init__(window)
+        self.window_dev = window_dev
+
+    def _bands(self, stats):
+        mavg, std = stats
+        if mavg is None: return None, None, None
+        return mavg, mavg + self.window_dev * std, mavg - self.window_dev * std
+
+    def update(self, x: float):
+        return self._bands(super().update(x))
+
+    def peek(self, x: float):
+        return self._bands(super().peek(x))
+
+    def params(self):
+        return [self.window, self.window_dev]
+
+    def to_dict(self):
+        return dict(super().to_dict(), window_dev=self.window_dev)
+
+    @classmethod
+    def from_dict(cls, data):
+        state = super().from_dict(data)
+        state.window_dev = data["window_dev"]
+        return state
+
+
+STATE_TYPES = {cls.__name__: cls for cls in (EmaState, RsiState, MacdState, SmaState, BollingerState)}
+FIELDS = {"open": 1, "high": 2, "low": 3, "close": 4, "volume": 5}
+
+
+class IndicatorSet:
+    # Kumpulan state bernama. specs: {nama: (state, kolom_input, nama_output)}
+    def __init__(self, specs: dict):
+        self.specs = specs
+        self.last_ts = None
+        self.last_values = None
+        self.prev_values = None
+
+    @classmethod
+    def for_chart(cls):
+        # Indikator yang dipakai generate_chart_and_caption & analyze_indicators
+        return cls({
+            "ma9": (SmaState(9), "close", ("ma9",)),
+            "ma26": (SmaState(26), "close", ("ma26",)),
+            "rsi": (RsiState(14), "close", ("rsi",)),
+            "macd": (MacdState(12, 26, 9), "close", ("macd", "macd_signal", "macd_hist")),
+            "bb": (BollingerState(20, 2), "close", ("bb_mavg", "bb_high", "bb_low")),
+            "volume_avg": (SmaState(20), "volume", ("volume_avg",)),
+        })
+
+    @classmethod
+    def for_strategy(cls, settings: dict, sensitive: bool = False):
+        # Indikator yang dipakai signal_finder (OPTIMAL_SETTINGS / SENSITIVE_SETTINGS)
+        macd = (MacdState(settings['macd_fast'], settings['macd_slow'], settings['macd_signal']), "close", ("macd", "macd_signal", "macd_hist"))
+        if sensitive:
+            return cls({"rsi": (RsiState(14), "close", ("rsi",)), "macd": macd})
+        return cls({
+            "ema_fast": (EmaState(settings['ema_fast']), "close", ("ema_fast",)),
+            "ema_slow": (EmaState(settings['ema_slow']), "close", ("ema_slow",)),
+            "rsi": (RsiState(settings['rsi_period']), "close", ("rsi",)),
+            "macd": macd,
+        })
+
+    def _apply(self, candle, method):
+        values = {"timestamp": candle[0], "close": candle[4], "volume": candle[5]}
+        for state, field, outputs in self.specs.values():
+            result = getattr(state, method)(candle[FIELDS[field]])
+            if len(outputs) == 1: result = (result,)
+            values.update(zip(outputs, result))
+        return values
+
+    def update(self, candle):
+        # candle = [timestamp, open, high, low, close, volume] yang sudah close
+        values = self._apply(candle, "update")
+        self.last_ts, self.prev_values, self.last_values = candle[0], self.last_values, values
+        return values
+
+    def peek(self, candle):
+        return self._apply(candle, "peek")
+
+    def seed(self, ohlcv):
+        values = None
+        for candle in ohlcv: values = self.update(candle)
+        return values
+
+    def signature(self):
+        # Jenis, parameter & input setiap state: state tersimpan dengan window lain (mis. setelah optimizer) tidak dipakai
+        return {name: [type(state).__name__, state.params(), field, list(outputs)] for name, (state, field, outputs) in self.specs.items()}
+
+    def to_dict(self):
+        return {
+            "last_ts": self.last_ts,
+            "last_values": self.last_values,
+            "prev_values": self.prev_values,
+            "specs": {name: [type(state).__name__, state.to_dict(), field, list(outputs)]
+                      for name, (state, field, outputs) in self.specs.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        specs = {name: (STATE_TYPES[kind].from_dict(state), field, tuple(outputs))
+                 for name, (kind, state, field, outputs) in data["specs"].items()}
+        indicator_set = cls(specs)
+        indicator_set.last_ts, indicator_set.last_values = data["last_ts"], data.get("last_values")
+        indicator_set.prev_values = data.get("prev_values")
+        return indicator_set
+
+
+class IndicatorStateStore:
+    # Menyimpan IndicatorSet per key (mis. "kucoin|BTC/USDT|4h|chart") di memori dan opsional di file JSON
+    def __init__(self, path: str = None):
+        self.path = path
+        self._sets = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._sets = {key: IndicatorSet.from_dict(data) for key, data in json.load(f).items()}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Gagal memuat state indikator dari {path}: {e}")
+
+    def advance_closed(self, key: str, closed, factory):
+        # Terapkan bar yang sudah close dan belum pernah diproses; mengembalikan IndicatorSet-nya
+        with self._lock:
+            indicator_set = self._sets.get(key)
+            fresh = factory()
+            # Ada celah (bar yang terlewat), belum ada state, atau pengaturan indikator berubah: seed ulang dari
+            # riwayat yang tersedia
+            if (indicator_set is None or indicator_set.last_ts is None or (closed and closed[0][0] > indicator_set.last_ts)
+                    or indicator_set.signature() != fresh.signature()):
+                indicator_set = fresh
+                self._sets[key] = indicator_set
+            for candle in closed:
+                if indicator_set.last_ts is None or candle[0] > indicator_set.last_ts:
+                    indicator_set.update(candle)
+            return indicator_set
+
+    def advance(self, key: str, ohlcv, factory):
+        # Seperti advance_closed, dengan bar terakhir dianggap masih terbentuk (di-peek).
+        # Mengembalikan (nilai bar terakhir yang close, nilai bar yang terbentuk).
+        if not ohlcv: return None, None
+        indicator_set = self.advance_closed(key, ohlcv[:-1], factory)
+        return indicator_set.last_values, indicator_set.peek(ohlcv[-1])
+
+    def get(self, key: str):
+        return self._sets.get(key)
+
+    def save(self):
+        if not self.path: return
+        with self._lock:
+            data = {key: indicator_set.to_dict() for key, indicator_set in self._sets.items()}
+        tmp_path = self.path + ".tmp"
+        directory = os.path.dirname(self.path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,135 @@
+# indicators.py
+# Mesin indikator tervektorisasi: satu lintasan NumPy untuk banyak simbol (simbol x bar).
+# Rumus mengikuti pustaka `ta` (EMA adjust=False, RSI Wilder, MACD) sehingga hasilnya identik.
+import numpy as np
+import pandas as pd
+
+def _per_row(param, n_rows):
+    arr = np.asarray(param, dtype=float)
+    if arr.ndim == 0: arr = np.full(n_rows, float(arr))
+    return arr
+
+def _as_matrix(values):
+    arr = np.asarray(values, dtype=float)
+    return arr.reshape(1, -1) if arr.ndim == 1 else arr
+
+def _ewm(values, alpha, min_periods):
+    # Setara pandas .ewm(alpha=..., adjust=False, min_periods=...).mean() per baris.
+    # NaN di awal baris (padding untuk simbol dengan riwayat lebih pendek) dilewati.
+    n_rows, n_bars = values.shape
+    if n_rows == 1: return _ewm_row(values[0], float(np.asarray(alpha).reshape(-1)[0]), float(np.asarray(min_periods).reshape(-1)[0]))
+    out = np.full(values.shape, np.nan)
+    state = np.full(n_rows, np.nan)
+    count = np.zeros(n_rows)
+    for t in range(n_bars):
+        x = values[:, t]
+        valid = ~np.isnan(x)
+        state = np.where(valid, np.where(np.isnan(state), x, state + alpha * (x - state)), state)
+        count += valid
+        out[:, t] = np.where(count >= min_periods, state, np.nan)
+    return out
+
+def _ewm_row(values, alpha: float, min_periods: float):
+    # Jalur satu simbol (chart, check_signal): aritmetika sama dengan _ewm, tetapi loop float biasa jauh lebih
+    # murah daripada operasi NumPy pada array berukuran 1 per bar
+    out = np.full((1, len(values)), np.nan)
+    row = out[0]
+    state, count = None, 0
+    for t, x in enumerate(values.tolist()):
+        if x == x:
+            state = x if state is None else state + alpha * (x - state)
+            count += 1
+        if count >= min_periods: row[t] = state
+    return out
+
+def ema(values, window):
+    values = _as_matrix(values)
+    window = _per_row(window, values.shape[0])
+    return _ewm(values, 2.0 / (window + 1.0), window)
+
+def rsi(values, window=14):
+    values = _as_matrix(values)
+    window = _per_row(window, values.shape[0])
+    diff = np.full(values.shape, np.nan)
+    diff[:, 1:] = values[:, 1:] - values[:, :-1]
+    # Seperti `ta`: selisih pertama (NaN) dianggap 0 selama harganya ada
+    diff = np.where(np.isnan(diff) & ~np.isnan(values), 0.0, diff)
+    up = np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+    down = np.where(diff < 0, -diff, np.where(np.isnan(diff), np.nan, 0.0))
+    alpha = 1.0 / window
+    ema_up = _ewm(up, alpha, window)
+    ema_down = _ewm(down, alpha, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(ema_down == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_down))
+    return np.where(np.isnan(ema_down), np.nan, result)
+
+def macd(values, fast=12, slow=26, sign=9):
+    values = _as_matrix(values)
+    n_rows = values.shape[0]
+    line = ema(values, _per_row(fast, n_rows)) - ema(values, _per_row(slow, n_rows))
+    sign = _per_row(sign, n_rows)
+    signal = _ewm(line, 2.0 / (sign + 1.0), sign)
+    return line, signal, line - signal
+
+def sma(values, window: int):
+    # Rata-rata bergerak sederhana per baris (jendela tetap untuk semua baris), setara ta.trend.sma_indicator
+    values = _as_matrix(values)
+    return pd.DataFrame(values.T).rolling(window, min_periods=window).mean().to_numpy().T
+
+def bollinger(values, window: int = 20, window_dev: float = 2):
+    # (mavg, high, low) dengan std populasi (ddof=0) seperti ta.volatility.BollingerBands
+    values = _as_matrix(values)
+    rolling = pd.DataFrame(values.T).rolling(window, min_periods=window)
+    mavg, std = rolling.mean().to_numpy().T, rolling.std(ddof=0).to_numpy().T
+    return mavg, mavg + window_dev * std, mavg - window_dev * std
+
+def stack_closes(series_list, column: int = 4):
+    # Daftar OHLCV (panjang berbeda) -> matriks rata kanan dengan padding NaN di kiri
+    n_bars = max((len(s) for s in series_list), default=0)
+    closes = np.full((len(series_list), n_bars), np.nan)
+    for i, series in enumerate(series_list):
+        if not series: continue
+        closes[i, n_bars - len(series):] = [row[column] for row in series]
+    return closes
+
+def compute_batch(closes, settings_list, sensitive: bool = False):
+    # Menghitung indikator strategi untuk semua simbol sekaligus; settings_list sejajar baris `closes`
+    closes = _as_matrix(closes)
+    col = lambda name: np.array([s[name] for s in settings_list], dtype=float)
+    result = {"close": closes}
+    if sensitive:
+        result["rsi"] = rsi(closes, 14)
+    else:
+        result["ema_fast"] = ema(closes, col("ema_fast"))
+        result["ema_slow"] = ema(closes, col("ema_slow"))
+        result["rsi"] = rsi(closes, col("rsi_period"))
+    result["macd"], result["macd_signal"], _ = macd(closes, col("macd_fast"), col("macd_slow"), col("macd_signal"))
+    return result
+
+def valid_bars(batch, row: int):
+    # Jumlah bar di ujung kanan yang semua indikatornya terisi (setara len(df) setelah dropna)
+    mask = np.ones(next(iter(batch.values())).shape[1], dtype=bool)
+    for values in batch.values():
+        mask &= ~np.isnan(values[row])
+    invalid = np.flatnonzero(~mask)
+    return len(mask) if len(invalid) == 0 else len(mask) - 1 - invalid[-1]
+
+def bar(batch, row: int, pos: int = -1):
+    return {name: values[row, pos] for name, values in batch.items()}
+
+def chart_series(candles):
+    # Indikator /chart & laporan terjadwal (MA 9/26, RSI 14, MACD 12/26/9, Bollinger 20/2) untuk satu CandleBuffer.
+    # Setara DataFrame + ta + dropna(): semua kolom (OHLCV = view buffer) dipotong ke bar yang indikatornya terisi.
+    close = candles.close
+    line, signal, hist = macd(close)
+    _, bb_high, bb_low = bollinger(close, 20, 2)
+    batch = {"ma9": sma(close, 9), "ma26": sma(close, 26), "rsi": rsi(close, 14),
+             "macd": line, "macd_signal": signal, "macd_hist": hist, "bb_high": bb_high, "bb_low": bb_low}
+    start = len(close) - valid_bars(batch, 0)
+    series = {name: values[0, start:] for name, values in batch.items()}
+    series.update({name: values[start:] for name, values in candles.arrays().items()})
+    return series
+
+def rolling_last_mean(values, window: int):
+    # Nilai terakhir rolling(window).mean(); NaN bila bar kurang dari window
+    return float(np.mean(values[-window:])) if len(values) >= window else float("nan")
@@ -1,42 +1,47 @@
 # main.py
 # VERSI DENGAN SISTEM WATCHLIST HIBRIDA (INTI + PRIBADI)
 import os
-import requests
-import ccxt
-import pandas as pd
-import mplfinance as mpf
-import ta
-import pytz
+import io
+import gzip
+import hashlib
 import json
+import market_data
+import analysis
+import market_context
+import ai_client
+import metrics
+from delivery import DeliveryQueue
+from user_store import UserStore
+from render_cache import RenderCache
+from indicator_state import IndicatorSet, IndicatorStateStore
+from chart_renderer import ChartRenderer, RendererBusy
+import pytz
+import time
 from datetime import datetime
 from telegram import Update, ParseMode, Bot, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import Updater, CommandHandler, CallbackContext, CallbackQueryHandler
 
 # --- Bagian untuk Web Server & API ---
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
 
 app = Flask('')
 API_SECRET_KEY = os.environ.get("API_SECRET_KEY")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
 # --- KONFIGURASI PENYIMPANAN & WATCHLIST ---
-DATA_DIR = "/app/data"
+DATA_DIR = os.environ.get("DATA_DIR", "/app/data")
 DB_FILE = os.path.join(DATA_DIR, "user_data.json")
+USER_DB_FILE = os.path.join(DATA_DIR, "user_data.sqlite3")
 CORE_WATCHLIST = ["BTC", "ETH", "SOL", "BNB", "DOGE", "AVAX", "XRP", "ADA", "DOT", "LINK"]
+# Ikut dalam ETag /api/data sehingga perubahan watchlist inti juga membatalkan cache klien
+CORE_WATCHLIST_HASH = hashlib.sha1(",".join(CORE_WATCHLIST).encode()).hexdigest()[:8]
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def load_db():
-    try:
-        with open(DB_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def save_db(data):
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+# Data pengguna di SQLite; isi user_data.json lama dimigrasikan sekali saat pertama dijalankan
+USER_STORE = UserStore(USER_DB_FILE, legacy_json=DB_FILE)
 
 @app.route('/')
 def home():
@@ -48,8 +53,81 @@ def get_user_data_api():
     if provided_key != API_SECRET_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    user_data = load_db()
-    return jsonify({"users": user_data, "core_watchlist": CORE_WATCHLIST})
+    # Versi data naik setiap ada perubahan; klien mengirim If-None-Match (304) atau since=<versi> (delta)
+    version = USER_STORE.data_version()
+    etag = f'"{version}-{CORE_WATCHLIST_HASH}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={"ETag": etag})
+
+    since = request.args.get('since', type=int)
+    if since is not None and 0 <= since <= version:
+        payload = {"users": USER_STORE.export_since(since), "core_watchlist": CORE_WATCHLIST,
+                   "version": version, "delta": True}
+        body = json.dumps(payload, separators=(',', ':')).encode()
+    else:
+        body = _full_api_body(version)
+    return _api_response(body, etag)
+
+# Body lengkap (dan versi gzip-nya) di-cache per versi data agar tidak diserialisasi ulang setiap polling
+_API_BODY_CACHE = {}
+
+def _full_api_body(version: int):
+    cached = _API_BODY_CACHE.get("full")
+    if cached and cached[0] == version: return cached[1]
+    payload = {"users": USER_STORE.export_all(), "core_watchlist": CORE_WATCHLIST, "version": version, "delta": False}
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    _API_BODY_CACHE["full"] = (version, body)
+    return body
+
+def _gzip_body(body: bytes):
+    cached = _API_BODY_CACHE.get("gzip")
+    if cached and cached[0] is body: return cached[1]
+    compressed = gzip.compress(body, compresslevel=6)
+    _API_BODY_CACHE["gzip"] = (body, compressed)
+    return compressed
+
+def _api_response(body: bytes, etag: str):
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and len(body) > 512:
+        body = _gzip_body(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/api/analysis')
+def get_analysis_api():
+    # Snapshot analisis untuk cron job yang tidak berbagi disk dengan bot: dihitung sekali di sini (cache & stream bot)
+    # lalu dikirim sebagai analysis.pack. 404 jika bot belum punya candle close yang diminta.
+    provided_key = request.args.get('secret')
+    if not API_SECRET_KEY or provided_key != API_SECRET_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    pair, timeframe = request.args.get('pair', ''), request.args.get('timeframe', '')
+    candle_ts = request.args.get('candle_ts', type=int)
+    try:
+        market_data.timeframe_ms(timeframe)
+    except Exception:
+        return jsonify({"error": "Timeframe tidak valid"}), 400
+    if '/' not in pair or candle_ts is None or candle_ts != analysis.closed_candle_ts(timeframe):
+        return jsonify({"error": "Snapshot tidak tersedia"}), 404
+    try:
+        snapshot = analysis.get_snapshot(pair, timeframe)
+    except Exception as e:
+        print(f"Gagal membuat snapshot analisis {pair} {timeframe} untuk API: {e}")
+        return jsonify({"error": "Snapshot tidak tersedia"}), 404
+    if snapshot is None or snapshot["candle_ts"] != candle_ts:
+        return jsonify({"error": "Snapshot tidak tersedia"}), 404
+    return Response(analysis.pack(snapshot), mimetype='application/octet-stream',
+                    headers={"ETag": f'"{candle_ts}"', "Cache-Control": "no-cache"})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Format teks Prometheus: durasi per tahap, error API, pesan Telegram & statistik cache proses bot ini.
+    # Rahasia sama dengan /api/data: ?secret= atau header "Authorization: Bearer <API_SECRET_KEY>" (Prometheus)
+    provided_key = request.args.get('secret')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '): provided_key = authorization[len('Bearer '):]
+    if not API_SECRET_KEY or provided_key != API_SECRET_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 def run_web_server():
   port = int(os.environ.get("PORT", 8080))
@@ -57,26 +135,55 @@ def run_web_server():
 
 # --- KONFIGURASI ---
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
+# Antrian pengiriman bersama (dibuat di main_bot), menghormati batas laju Telegram & RetryAfter
+DELIVERY = None
+# PNG + caption chart di memori, per (pair, timeframe, candle close terakhir): Refresh/tombol timeframe
+# di dalam candle yang sama tidak merender ulang
+CHART_CACHE = RenderCache()
+# Chart & indikator di caption dari candle close terakhir (di-cache per candle); baris "Live" dihitung per permintaan
+# dari candle yang masih terbentuk: state indikator chart maju per bar close dan bar berjalan hanya di-peek
+CHART_STATES = IndicatorStateStore()
+# Render mplfinance; diganti pool proses (RENDER_WORKERS) saat bot dijalankan, default render di thread pemanggil
+RENDERER = ChartRenderer(workers=0)
+# Thread untuk sumber eksternal /chart (sentimen, kurs IDR, AI) dan tenggat masing-masing (detik sejak mulai)
+CHART_IO_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("CHART_IO_WORKERS", 8)), thread_name_prefix="chart-io")
+CHART_DEADLINES = {
+    "sentiment": float(os.environ.get("CHART_SENTIMENT_DEADLINE", 6)),
+    "idr": float(os.environ.get("CHART_IDR_DEADLINE", 6)),
+    "ai": float(os.environ.get("CHART_AI_DEADLINE", 12)),
+}
+# MARKET_STREAM=1: candle semua watchlist diperbarui lewat WebSocket KuCoin (stream.py) sehingga /chart
+# membaca cache yang selalu segar tanpa polling REST; kurs USDT/IDR Indodax tetap lewat market_context
+MARKET_STREAM = os.environ.get("MARKET_STREAM", "0") == "1"
+STREAM = None
+
+# Bot adalah sumber /api/analysis: snapshot selalu dihitung sendiri, tidak pernah diambil dari dirinya lewat HTTP
+analysis.SNAPSHOTS.remote_url = None
+
+# Statistik yang dibaca saat /metrics di-scrape (RENDERER & DELIVERY diganti saat start, jadi dibaca lewat lambda)
+metrics.register_stats("ohlcv_cache", market_data.cache_stats)
+metrics.register_stats("market_context", market_context.cache_stats)
+metrics.register_stats("ai", ai_client.stats)
+metrics.register_stats("analysis", analysis.stats)
+metrics.register_stats("chart_cache", lambda: CHART_CACHE.stats())
+metrics.register_stats("renderer", lambda: RENDERER.stats())
+metrics.register_stats("delivery", lambda: DELIVERY.stats() if DELIVERY else {})
+metrics.register_stats("stream", lambda: STREAM.stats() if STREAM else {})
 
 # --- FUNGSI HELPER (Tidak berubah) ---
-def get_gemini_analysis(prompt: str):
+def get_gemini_analysis(prompt: str, key: str = None, fallback=None):
+    # key = sidik jari input (ai_client.fingerprint); jawaban dibagi antar permintaan dengan key yang sama
     if not GEMINI_API_KEY: return "Analisis AI tidak tersedia."
     try:
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        response = requests.post(api_url, json=payload, timeout=45)
-        response.raise_for_status()
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
+        return ai_client.generate(prompt, key or ai_client.fingerprint(prompt), fallback=fallback)
     except Exception as e:
         print(f"Error saat berkomunikasi dengan Gemini: {e}")
         return "Gagal mendapatkan analisis dari AI."
 
 def get_fear_and_greed_index():
     try:
-        url = "https://api.alternative.me/fng/?limit=1"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()['data'][0]
+        # Nilai di-cache bersama (market_context), diperbarui di latar belakang saat kedaluwarsa
+        data = market_context.fear_and_greed()
         value = int(data['value'])
         classification = data['value_classification']
         sentiment_score = 0
@@ -88,103 +195,38 @@ def get_fear_and_greed_index():
         print(f"Error di get_fear_and_greed_index: {e}")
         return {"status": "error", "message": "Gagal memuat F&G Index."}
 
-def analyze_indicators(df: pd.DataFrame, symbol: str):
-    last, prev = df.iloc[-1], df.iloc[-2]
-    analysis = {}
-    if last['close'] > last['ma9'] and last['ma9'] > last['ma26']: analysis['ma'] = f"🟢 Bullish ({last['ma9']:.2f} > {last['ma26']:.2f})"
-    elif last['close'] < last['ma9'] and last['ma9'] < last['ma26']: analysis['ma'] = f"🔴 Bearish ({last['ma9']:.2f} < {last['ma26']:.2f})"
-    else: analysis['ma'] = "⚪ Netral"
-    if last['rsi'] > 70: analysis['rsi'] = f"🔴 Overbought ({last['rsi']:.2f})"
-    elif last['rsi'] < 30: analysis['rsi'] = f"🟢 Oversold ({last['rsi']:.2f})"
-    else: analysis['rsi'] = f"⚪ Netral ({last['rsi']:.2f})"
-    if prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']: analysis['macd'] = "🟢 Golden Cross"
-    elif prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']: analysis['macd'] = "🔴 Death Cross"
-    else: analysis['macd'] = "⚪ Netral"
-    analysis['bb_score'] = 0
-    if last['close'] < last['bb_low']:
-        analysis['bb'] = f"🟢 Di bawah Lower Band ({last['bb_low']:.2f})"
-        analysis['bb_score'] = 1
-    elif last['close'] > last['bb_high']:
-        analysis['bb'] = f"🔴 Di atas Upper Band ({last['bb_high']:.2f})"
-        analysis['bb_score'] = -1
-    else: analysis['bb'] = "⚪ Di dalam Bands"
-    avg_volume = df['volume'].rolling(window=20).mean().iloc[-1]
-    if last['volume'] > avg_volume * 1.75: analysis['volume'] = f"🔥 Tinggi ({last['volume']:,.0f} {symbol})"
-    else: analysis['volume'] = f"⚪ Normal ({last['volume']:,.0f} {symbol})"
-    return analysis
-
-def determine_final_signal(analysis: dict, sentiment: dict):
-    score = 0
-    if "Bullish" in analysis['ma']: score += 1
-    if "Bearish" in analysis['ma']: score -= 1
-    if "Golden Cross" in analysis['macd']: score += 2
-    if "Death Cross" in analysis['macd']: score -= 2
-    if "Oversold" in analysis['rsi']: score += 1
-    if "Overbought" in analysis['rsi']: score -= 1
-    score += analysis.get('bb_score', 0)
-    if sentiment.get('status') == 'ok': score += sentiment.get('score', 0)
-    if score >= 2: return "🚨 SINYAL AKSI: BELI (BUY) 🚨"
-    elif score <= -2: return "🚨 SINYAL AKSI: JUAL (SELL) 🚨"
-    else: return "⚠️ SINYAL AKSI: TAHAN (HOLD) ⚠️"
+def fallback_summary(analysis: dict):
+    # Ringkasan tanpa AI dari hasil analysis.analyze_indicators (dipakai saat kuota Gemini per jam habis)
+    label = lambda text: text.split(' ', 1)[1] if ' ' in text else text
+    return (f"Ringkasan otomatis: MA {label(analysis['ma'])}, RSI {label(analysis['rsi'])}, MACD {label(analysis['macd'])}, "
+            f"Bollinger {label(analysis['bb'])}, volume {label(analysis['volume'])}.")
 
-# --- FUNGSI INTI ---
-def generate_chart_and_caption(pair: str, timeframe: str):
-    exchange = ccxt.kucoin()
-    ohlcv = exchange.fetch_ohlcv(pair, timeframe=timeframe, limit=200)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    df['ma9'] = ta.trend.sma_indicator(df['close'], window=9)
-    df['ma26'] = ta.trend.sma_indicator(df['close'], window=26)
-    df['rsi'] = ta.momentum.rsi(df['close'], window=14)
-    macd = ta.trend.MACD(df['close'])
-    df['macd'], df['macd_signal'], df['macd_hist'] = macd.macd(), macd.macd_signal(), macd.macd_diff()
-    bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-    df['bb_high'], df['bb_low'] = bb.bollinger_hband(), bb.bollinger_lband()
-    df.dropna(inplace=True)
-    
-    if len(df) < 2: return None, "Gagal menganalisis, data tidak cukup.", None
+def ai_fingerprint(pair: str, timeframe: str, candle_ts, analysis: dict, rsi: float):
+    # Pembacaan indikator didiskretisasi (label tanpa angka, RSI per 5 poin) agar harga yang sedikit bergeser
+    # di dalam candle yang sama tetap memakai jawaban AI yang sama
+    label = lambda text: text.split(' (')[0]
+    return ai_client.fingerprint("chart", pair, timeframe, candle_ts, label(analysis['ma']), int(rsi // 5),
+                                 label(analysis['macd']), label(analysis['bb']), label(analysis['volume']))
 
-    symbol = pair.split('/')[0]
-    indicator_analysis = analyze_indicators(df, symbol)
-    sentiment_analysis = get_fear_and_greed_index()
-    final_signal = determine_final_signal(indicator_analysis, sentiment_analysis)
-    
-    df_for_plot = df.tail(30)
-    change_pct = ((df_for_plot['close'].iloc[-1] - df_for_plot['close'].iloc[0]) / df_for_plot['close'].iloc[0]) * 100
-    change_emoji = "📈" if change_pct >= 0 else "📉"
-    change_str = f"{change_emoji} {change_pct:+.2f}%"
+# --- FUNGSI INTI ---
+def get_usdt_idr():
+    return market_context.usdt_idr()
 
-    prompt = f"Anda adalah seorang analis teknikal kripto profesional. Berikan ringkasan analisis pasar singkat (maksimal 3 kalimat) dalam bahasa Indonesia berdasarkan data ini untuk {pair} {timeframe}: MA: {indicator_analysis['ma']}, RSI: {indicator_analysis['rsi']}, MACD: {indicator_analysis['macd']}, Bollinger Bands: {indicator_analysis['bb']}, Volume: {indicator_analysis['volume']}. Fokus pada kesimpulan utama."
-    ai_summary = get_gemini_analysis(prompt)
-
-    mc = mpf.make_marketcolors(up='#41a35a', down='#d74a43', wick={'up':'#41a35a','down':'#d74a43'}, volume={'up':'#41a35a','down':'#d74a43'})
-    s = mpf.make_mpf_style(marketcolors=mc, base_mpf_style='nightclouds', gridstyle='-')
-    addplots = [
-        mpf.make_addplot(df_for_plot[['bb_high', 'bb_low']], color='gray', alpha=0.3),
-        mpf.make_addplot(df_for_plot['rsi'], panel=1, color='purple', ylabel='RSI'),
-        mpf.make_addplot(df_for_plot['macd'], panel=2, color='blue', ylabel='MACD'),
-        mpf.make_addplot(df_for_plot['macd_signal'], panel=2, color='orange'),
-        mpf.make_addplot(df_for_plot['macd_hist'].where(df_for_plot['macd_hist'] >= 0, 0), type='bar', panel=2, color='#41a35a'),
-        mpf.make_addplot(df_for_plot['macd_hist'].where(df_for_plot['macd_hist'] < 0, 0), type='bar', panel=2, color='#d74a43')
-    ]
-    
-    harga_terkini_usd = df['close'].iloc[-1]
-    harga_terkini_idr_str = "N/A"
+def _result_before(future, deadline: float, default, name: str):
+    # Hasil sumber opsional bila selesai sebelum tenggat; terlambat/gagal -> default (chart tetap dikirim)
     try:
-        ticker_idr = ccxt.indodax().fetch_ticker('USDT/IDR')
-        harga_terkini_idr = harga_terkini_usd * ticker_idr['last']
-        harga_terkini_idr_str = f"Rp {harga_terkini_idr:,.0f}"
-    except Exception as e: print(f"Gagal mengambil harga IDR: {e}")
-
-    waktu_sekarang = datetime.now(pytz.timezone('Asia/Jakarta')).strftime('%d %b %Y, %H:%M WIB')
-    filename = f'analysis_{pair.replace("/", "")}_{timeframe}.png'
-    mpf.plot(df_for_plot, type='candle', style=s, title=f'Analisis {pair} - Timeframe {timeframe}', ylabel='Harga (USDT)', volume=True, mav=(9, 26), addplot=addplots, panel_ratios=(8, 3, 3), figscale=1.5, savefig=filename)
-    
-    caption = (
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        print(f"{name} terlambat, dilewati.")
+    except Exception as e:
+        print(f"Gagal mengambil {name}: {e}")
+    return default
+
+def build_caption(pair, timeframe, change_str, harga_idr_str, harga_usd, waktu, indicator_analysis, ai_summary, sentiment_analysis, final_signal):
+    return (
         f"📊 **Analisis: {pair} | {timeframe} ({change_str})**\n"
-        f"*(Harga: **{harga_terkini_idr_str}** | **${harga_terkini_usd:,.2f}** pada {waktu_sekarang})*\n\n"
-        f"**Indikator Teknikal:**\n"
+        f"*(Harga close candle {waktu}: **{harga_idr_str}** | **${harga_usd:,.2f}**)*\n\n"
+        f"**Indikator Teknikal (candle {timeframe} close {waktu}):**\n"
         f"1. **Moving Average**: {indicator_analysis['ma']}\n"
         f"2. **RSI**: {indicator_analysis['rsi']}\n"
         f"3. **MACD**: {indicator_analysis['macd']}\n"
@@ -195,7 +237,115 @@ def generate_chart_and_caption(pair: str, timeframe: str):
         f"------------------------------------\n"
         f"**{final_signal}**"
     )
-    return filename, caption, symbol
+
+def generate_chart_and_caption(pair: str, timeframe: str):
+    # Sumber independen diambil bersamaan: sentimen & kurs IDR sejak awal, AI & render setelah indikator siap.
+    # Mengembalikan (png, caption, symbol, ai_caption, candle_ts, harga close); ai_caption = Future caption lengkap
+    # bila AI belum selesai, candle_ts & harga = candle close terakhir di snapshot (None jika gagal).
+    started = time.monotonic()
+    sentiment_future = CHART_IO_POOL.submit(get_fear_and_greed_index)
+    idr_future = CHART_IO_POOL.submit(get_usdt_idr)
+
+    # Indikator, analisis & jendela plot dari snapshot bersama (sekali hitung per candle close)
+    snapshot = analysis.get_snapshot(pair, timeframe)
+    if snapshot is None: return None, "Gagal menganalisis, data tidak cukup.", None, None, None, None
+
+    symbol = pair.split('/')[0]
+    indicator_analysis = snapshot["analysis"]
+    change_emoji = "📈" if snapshot["change_pct"] >= 0 else "📉"
+    change_str = f"{change_emoji} {snapshot['change_pct']:+.2f}%"
+
+    prompt = f"Anda adalah seorang analis teknikal kripto profesional. Berikan ringkasan analisis pasar singkat (maksimal 3 kalimat) dalam bahasa Indonesia berdasarkan data ini untuk {pair} {timeframe}: MA: {indicator_analysis['ma']}, RSI: {indicator_analysis['rsi']}, MACD: {indicator_analysis['macd']}, Bollinger Bands: {indicator_analysis['bb']}, Volume: {indicator_analysis['volume']}. Fokus pada kesimpulan utama."
+    ai_key = ai_fingerprint(pair, timeframe, snapshot["candle_ts"], indicator_analysis, snapshot["values"]["rsi"])
+    ai_future = CHART_IO_POOL.submit(get_gemini_analysis, prompt, ai_key, lambda: fallback_summary(indicator_analysis))
+
+    with metrics.stage("chart_render"):
+        png = RENDERER.render(snapshot["plot"], f'Analisis {pair} - Timeframe {timeframe}')
+
+    sentiment_analysis = _result_before(sentiment_future, started + CHART_DEADLINES["sentiment"], {"status": "error", "text": "Tidak tersedia"}, "F&G Index")
+    final_signal = analysis.final_signal(snapshot["score"], sentiment_analysis)
+
+    # Harga close candle snapshot (bukan harga live): caption di-cache sepanjang candle yang sama
+    harga_close_usd = snapshot["price"]
+    harga_close_idr_str = "N/A"
+    usdt_idr = _result_before(idr_future, started + CHART_DEADLINES["idr"], None, "harga IDR")
+    if usdt_idr: harga_close_idr_str = f"Rp {harga_close_usd * usdt_idr:,.0f}"
+
+    waktu_close = datetime.fromtimestamp(analysis.close_time_ms(snapshot) / 1000, pytz.timezone('Asia/Jakarta')).strftime('%d %b %Y, %H:%M WIB')
+    caption_for = lambda ai_summary: build_caption(pair, timeframe, change_str, harga_close_idr_str, harga_close_usd, waktu_close,
+                                                   indicator_analysis, ai_summary, sentiment_analysis, final_signal)
+    ai_summary = _result_before(ai_future, started + CHART_DEADLINES["ai"], None, "Analisis AI")
+    if ai_summary is not None: return png, caption_for(ai_summary), symbol, None, snapshot["candle_ts"], snapshot["price"]
+
+    # AI belum selesai: kirim chart sekarang, caption lengkap menyusul saat jawaban AI tiba
+    ai_caption = Future()
+    ai_future.add_done_callback(lambda f: ai_caption.set_result(caption_for(f.result() if not f.exception() else "Gagal mendapatkan analisis dari AI.")))
+    return png, caption_for("⏳ Analisis AI sedang disiapkan, caption akan diperbarui otomatis..."), symbol, ai_caption, snapshot["candle_ts"], snapshot["price"]
+
+def get_chart_and_caption(pair: str, timeframe: str):
+    # Key = timestamp candle close terakhir (dihitung dari jam, tanpa request ke bursa)
+    key = (pair, timeframe, analysis.closed_candle_ts(timeframe))
+    # Durasi "chart" termasuk cache hit (latensi yang dirasakan pengguna); "chart_generate" hanya saat membuat baru
+    def generate():
+        with metrics.stage("chart_generate"): return generate_chart_and_caption(pair, timeframe)
+    # Hanya chart lengkap untuk candle key ini yang di-cache: kegagalan atau snapshot yang belum memuat candle
+    # terakhir (bursa terlambat) dicoba lagi pada permintaan berikutnya, bukan tertahan sepanjang candle
+    complete = lambda value: value[0] is not None and value[4] == key[2]
+    with metrics.stage("chart"):
+        value = CHART_CACHE.get_or_render(key, generate, cacheable=complete)
+    png, caption, symbol, ai_caption, _, close_price = value
+    # Entri cache yang caption AI-nya sudah tiba langsung memakai caption lengkap
+    if ai_caption is not None and ai_caption.done(): caption, ai_caption = ai_caption.result(), None
+    if png is not None:
+        live = live_line(pair, timeframe, close_price)
+        caption = with_live_line(caption, live)
+        if ai_caption is not None:
+            cached_ai_caption, ai_caption = ai_caption, Future()
+            cached_ai_caption.add_done_callback(lambda f, target=ai_caption: target.set_result(with_live_line(f.result(), live)))
+    # file_id Telegram juga hanya dipakai ulang untuk chart lengkap
+    photo_key = "chart|" + "|".join(map(str, key)) if complete(value) else None
+    return png, caption, symbol, photo_key, ai_caption
+
+def live_line(pair: str, timeframe: str, close_price: float):
+    # Harga & RSI candle yang masih terbentuk (cache market_data, segar lewat stream bila aktif); None jika gagal
+    try:
+        candles = market_data.fetch_ohlcv(pair, timeframe, limit=analysis.ANALYSIS_BARS + 1)
+    except Exception as e:
+        print(f"Gagal mengambil harga live {pair}: {e}")
+        return None
+    if len(candles) < 2: return None
+    _, forming = CHART_STATES.advance(f"kucoin|{pair}|{timeframe}|chart", candles, IndicatorSet.for_chart)
+    change = (forming["close"] - close_price) / close_price * 100
+    rsi = f", RSI {forming['rsi']:.2f}" if forming.get("rsi") is not None else ""
+    waktu = datetime.now(pytz.timezone('Asia/Jakarta')).strftime('%H:%M WIB')
+    return f"*(Live {waktu}: **${forming['close']:,.2f}** ({change:+.2f}% dari close candle){rsi})*"
+
+def with_live_line(caption: str, live: str):
+    # Baris live disisipkan setelah baris harga close (caption cache tidak diubah)
+    if not live or "\n\n" not in caption: return caption
+    head, rest = caption.split("\n\n", 1)
+    return f"{head}\n{live}\n\n{rest}"
+
+def update_caption_later(ai_caption, chat_id, message_id, reply_markup):
+    # Ganti caption sementara dengan caption berisi analisis AI begitu tersedia
+    if ai_caption is None: return
+    ai_caption.add_done_callback(lambda f: DELIVERY.submit("edit_message_caption", chat_id, message_id=message_id, caption=f.result(),
+                                                           reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN))
+
+def chart_keyboard(pair: str, timeframe: str, symbol: str):
+    keyboard = [
+        [
+            InlineKeyboardButton("Refresh 🔃", callback_data=f"refresh_{pair}_{timeframe}"),
+            InlineKeyboardButton("Info Indikator ℹ️", callback_data="show_info")
+        ],
+        [
+            InlineKeyboardButton("1H", callback_data=f"chart_{pair}_1h"),
+            InlineKeyboardButton("4H", callback_data=f"chart_{pair}_4h"),
+            InlineKeyboardButton("1D", callback_data=f"chart_{pair}_1d"),
+        ],
+        [InlineKeyboardButton("Tambah ke Watchlist ❤️", callback_data=f"add_{symbol}")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 # --- HANDLER PERINTAH ---
 def start_command(update: Update, context: CallbackContext):
@@ -246,35 +396,30 @@ def chart_command(update: Update, context: CallbackContext):
     wait_message = update.message.reply_text(f"⏳ Menganalisis `{pair}` dengan AI...", parse_mode=ParseMode.MARKDOWN)
     
     try:
-        filename, caption, symbol = generate_chart_and_caption(pair, timeframe)
-        if not filename:
+        png, caption, symbol, photo_key, ai_caption = get_chart_and_caption(pair, timeframe)
+        if not png:
             context.bot.edit_message_text(chat_id=update.message.chat_id, message_id=wait_message.message_id, text=f"Gagal: {caption}", parse_mode=ParseMode.MARKDOWN)
             return
 
-        keyboard = [
-            [
-                InlineKeyboardButton("Refresh 🔃", callback_data=f"refresh_{pair}_{timeframe}"),
-                InlineKeyboardButton("Info Indikator ℹ️", callback_data="show_info")
-            ],
-            [
-                InlineKeyboardButton("1H", callback_data=f"chart_{pair}_1h"),
-                InlineKeyboardButton("4H", callback_data=f"chart_{pair}_4h"),
-                InlineKeyboardButton("1D", callback_data=f"chart_{pair}_1d"),
-            ],
-            [InlineKeyboardButton("Tambah ke Watchlist ❤️", callback_data=f"add_{symbol}")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        with open(filename, 'rb') as photo:
-            context.bot.send_photo(chat_id=update.message.chat_id, photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+        # photo_key sama untuk chart yang sama: unggah sekali, pengguna berikutnya memakai file_id
+        reply_markup = chart_keyboard(pair, timeframe, symbol)
+        sent = DELIVERY.send_photo(chat_id=update.message.chat_id, photo=png, photo_key=photo_key, caption=caption, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+        update_caption_later(ai_caption, update.message.chat_id, sent.result().message_id, reply_markup)
         
         context.bot.delete_message(chat_id=update.message.chat_id, message_id=wait_message.message_id)
-        os.remove(filename)
+    except RendererBusy:
+        context.bot.edit_message_text(chat_id=update.message.chat_id, message_id=wait_message.message_id, text="🚧 Server sedang sibuk membuat chart lain. Coba lagi dalam beberapa detik.", parse_mode=ParseMode.MARKDOWN)
     except Exception as e:
         print(f"Error di chart_command: {e}")
         context.bot.edit_message_text(chat_id=update.message.chat_id, message_id=wait_message.message_id, text=f"Terjadi kesalahan: {e}", parse_mode=ParseMode.MARKDOWN)
 
 # --- HANDLER WATCHLIST & STRATEGI ---
+def stream_pairs():
+    # Watchlist gabungan: inti + semua watchlist pribadi
+    coins = set(CORE_WATCHLIST)
+    for user in USER_STORE.export_all().values(): coins.update(user.get("watchlist", []))
+    return {f"{coin}/USDT" for coin in coins}
+
 def add_command(update: Update, context: CallbackContext):
     user_id = str(update.effective_user.id)
     if not context.args:
@@ -282,16 +427,9 @@ def add_command(update: Update, context: CallbackContext):
         return
     symbol = context.args[0].upper()
     
-    db = load_db()
-    if user_id not in db:
-        db[user_id] = {"watchlist": [], "strategies": {}}
-    if "watchlist" not in db[user_id]:
-        db[user_id]["watchlist"] = []
-    
-    if symbol not in db[user_id]["watchlist"]:
-        db[user_id]["watchlist"].append(symbol)
-        save_db(db)
+    if USER_STORE.add_symbol(user_id, symbol):
         update.message.reply_text(f"✅ `{symbol}` ditambahkan ke watchlist pribadi.", parse_mode=ParseMode.MARKDOWN)
+        if STREAM: STREAM.set_pairs(stream_pairs())
     else:
         update.message.reply_text(f"⚠️ `{symbol}` sudah ada di watchlist pribadi.", parse_mode=ParseMode.MARKDOWN)
 
@@ -302,22 +440,19 @@ def remove_command(update: Update, context: CallbackContext):
         return
     symbol = context.args[0].upper()
     
-    db = load_db()
-    if user_id in db and symbol in db[user_id].get("watchlist", []):
-        db[user_id]["watchlist"].remove(symbol)
-        save_db(db)
+    if USER_STORE.remove_symbol(user_id, symbol):
         update.message.reply_text(f"🗑️ `{symbol}` dihapus dari watchlist pribadi.", parse_mode=ParseMode.MARKDOWN)
+        if STREAM: STREAM.set_pairs(stream_pairs())
     else:
         update.message.reply_text(f"❌ `{symbol}` tidak ditemukan di watchlist pribadi.", parse_mode=ParseMode.MARKDOWN)
 
 def watchlist_command(update: Update, context: CallbackContext):
     user_id = str(update.effective_user.id)
-    db = load_db()
     
     text = f"❤️ **Watchlist Inti (Dipantau Otomatis):**\n"
     text += ", ".join([f"`{c}`" for c in CORE_WATCHLIST])
     
-    user_watchlist = db.get(user_id, {}).get("watchlist", [])
+    user_watchlist = USER_STORE.get_watchlist(user_id)
     if user_watchlist:
         text += "\n\n📋 **Watchlist Pribadi Anda:**\n"
         text += ", ".join([f"`{c}`" for c in user_watchlist])
@@ -339,14 +474,10 @@ def strategy_command(update: Update, context: CallbackContext):
         return
 
     sub_command = args[0]
-    db = load_db()
-
-    if user_id not in db:
-        db[user_id] = {"watchlist": [], "strategies": {}}
 
     if sub_command == 'list':
         text = "**Status Notifikasi Strategi Anda:**\n\n"
-        user_strategies = db.get(user_id, {}).get("strategies", {})
+        user_strategies = USER_STORE.get_strategies(user_id)
         for name, desc in AVAILABLE_STRATEGIES.items():
             prefs = user_strategies.get(name, {})
             alert_status = "✅ Aktif" if prefs.get("alert_on", False) else "❌ Nonaktif"
@@ -363,15 +494,10 @@ def strategy_command(update: Update, context: CallbackContext):
         strategy_name = args[1]
         toggle_type = "alert_on" if sub_command == 'toggle_alert' else "signal_on"
         
-        if "strategies" not in db[user_id]: db[user_id]["strategies"] = {}
-        if strategy_name not in db[user_id]["strategies"]: db[user_id]["strategies"][strategy_name] = {}
-            
-        current_status = db[user_id]["strategies"][strategy_name].get(toggle_type, False)
-        db[user_id]["strategies"][strategy_name][toggle_type] = not current_status
-        save_db(db)
+        enabled = USER_STORE.toggle_strategy(user_id, strategy_name, toggle_type)
         
         type_text = "Peringatan Dini" if toggle_type == "alert_on" else "Sinyal Eksekusi"
-        new_status = "diaktifkan" if not current_status else "dinonaktifkan"
+        new_status = "diaktifkan" if enabled else "dinonaktifkan"
         update.message.reply_text(f"{type_text} untuk `{strategy_name}` berhasil {new_status}.", parse_mode=ParseMode.MARKDOWN)
 
 def button_handler(update: Update, context: CallbackContext):
@@ -393,24 +519,15 @@ def button_handler(update: Update, context: CallbackContext):
         pair, timeframe = params.rsplit('_', 1)
         query.edit_message_caption(caption=f"⏳ Memuat ulang {pair} timeframe {timeframe}...")
         
-        filename, caption, symbol = generate_chart_and_caption(pair, timeframe)
-        if filename:
-            keyboard = [
-                [
-                    InlineKeyboardButton("Refresh 🔃", callback_data=f"refresh_{pair}_{timeframe}"),
-                    InlineKeyboardButton("Info Indikator ℹ️", callback_data="show_info")
-                ],
-                [
-                    InlineKeyboardButton("1H", callback_data=f"chart_{pair}_1h"),
-                    InlineKeyboardButton("4H", callback_data=f"chart_{pair}_4h"),
-                    InlineKeyboardButton("1D", callback_data=f"chart_{pair}_1d"),
-                ],
-                [InlineKeyboardButton("Tambah ke Watchlist ❤️", callback_data=f"add_{symbol}")],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            with open(filename, 'rb') as photo:
-                query.edit_message_media(media=InputMediaPhoto(photo, caption=caption, parse_mode=ParseMode.MARKDOWN), reply_markup=reply_markup)
-            os.remove(filename)
+        try:
+            png, caption, symbol, _, ai_caption = get_chart_and_caption(pair, timeframe)
+        except RendererBusy:
+            query.edit_message_caption(caption="🚧 Server sedang sibuk membuat chart lain. Tekan Refresh lagi dalam beberapa detik.", reply_markup=query.message.reply_markup)
+            return
+        if png:
+            reply_markup = chart_keyboard(pair, timeframe, symbol)
+            query.edit_message_media(media=InputMediaPhoto(io.BytesIO(png), caption=caption, parse_mode=ParseMode.MARKDOWN), reply_markup=reply_markup)
+            update_caption_later(ai_caption, query.message.chat_id, query.message.message_id, reply_markup)
 
     elif action == "add":
         symbol = params
@@ -421,7 +538,7 @@ def button_handler(update: Update, context: CallbackContext):
                 self.text = text
                 self.from_user = query.from_user
             def reply_text(self, text, parse_mode):
-                context.bot.send_message(chat_id=query.message.chat_id, text=text, parse_mode=parse_mode)
+                DELIVERY.send_message(chat_id=query.message.chat_id, text=text, parse_mode=parse_mode)
 
         class MockUpdate:
             def __init__(self, text):
@@ -439,8 +556,10 @@ def main_bot():
         print("Error: TELEGRAM_TOKEN tidak diset.")
         return
     
+    global DELIVERY
     updater = Updater(TELEGRAM_TOKEN)
     dispatcher = updater.dispatcher
+    DELIVERY = DeliveryQueue(updater.bot)
     
     dispatcher.add_handler(CommandHandler("start", start_command))
     dispatcher.add_handler(CommandHandler("help", help_command))
@@ -457,6 +576,13 @@ def main_bot():
     updater.idle()
 
 if __name__ == "__main__":
+    # Pool render di-fork sebelum thread web & Telegram berjalan
+    RENDERER = ChartRenderer()
+    # Instance bursa, koneksi keep-alive & metadata pasar disiapkan sebelum /chart pertama
+    Thread(target=market_data.prewarm, daemon=True).start()
+    if MARKET_STREAM:
+        import stream
+        STREAM = stream.MarketStream(stream_pairs()).start()
     web_thread = Thread(target=run_web_server)
     web_thread.start()
     main_bot()
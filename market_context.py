@@ -0,0 +1,47 @@
+# market_context.py
+# Konteks pasar yang lambat berubah (Fear & Greed Index, kurs USDT/IDR) dengan cache TTL bersama,
+# stale-while-revalidate, dan persistensi ke disk. Dipakai main.py & scheduled_run.py.
+import os
+import requests
+import market_data
+import metrics
+from ttl_cache import TTLCache
+
+# --- KONFIGURASI ---
+# F&G diperbarui sekali sehari; kurs USDT/IDR hampir tidak bergerak dalam sehari
+FNG_TTL = float(os.environ.get("FNG_TTL", 3600))
+USDT_IDR_TTL = float(os.environ.get("USDT_IDR_TTL", 300))
+# Kosongkan (MARKET_CONTEXT_PATH="") untuk menonaktifkan penyimpanan ke disk
+MARKET_CONTEXT_PATH = os.environ.get("MARKET_CONTEXT_PATH", os.path.join("candle_store", "market_context.json"))
+
+CONTEXT_CACHE = TTLCache(MARKET_CONTEXT_PATH or None)
+
+def _download_fear_and_greed():
+    try:
+        with metrics.stage("fear_greed_request"):
+            response = requests.get("https://api.alternative.me/fng/?limit=1", timeout=10)
+            response.raise_for_status()
+            data = response.json()['data'][0]
+    except Exception:
+        metrics.error("alternative_me")
+        raise
+    return {"value": int(data['value']), "value_classification": data['value_classification']}
+
+def _download_usdt_idr():
+    market_data.get_limiter("indodax").acquire()
+    try:
+        with metrics.stage("usdt_idr_request"):
+            return market_data.get_exchange("indodax").fetch_ticker('USDT/IDR')['last']
+    except Exception:
+        metrics.error("indodax")
+        raise
+
+def fear_and_greed():
+    # {"value": int, "value_classification": str}
+    return CONTEXT_CACHE.get("fng", _download_fear_and_greed, FNG_TTL)
+
+def usdt_idr():
+    return CONTEXT_CACHE.get("usdt_idr", _download_usdt_idr, USDT_IDR_TTL)
+
+def cache_stats():
+    return CONTEXT_CACHE.stats()
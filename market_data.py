@@ -0,0 +1,349 @@
+# market_data.py
+# Lapisan pengambilan candle bersama (dengan cache TTL) untuk main.py, signal_finder.py & scheduled_run.py
+import os
+import threading
+import time
+import ccxt
+import numpy as np
+import requests
+from rate_limiter import TokenBucket
+from candle_buffer import CandleBuffer
+from ttl_cache import TTLCache
+from candle_store import CandleStore, CANDLE_STORE_RETENTION
+import metrics
+
+# --- KONFIGURASI ---
+OHLCV_CACHE_TTL = float(os.environ.get("OHLCV_CACHE_TTL", 60))
+# Lokasi penyimpanan candle lokal; kosongkan (CANDLE_STORE_PATH="") untuk menonaktifkan
+CANDLE_STORE_PATH = os.environ.get("CANDLE_STORE_PATH", os.path.join("candle_store", "candles.sqlite3"))
+# Ukuran halaman maksimum saat mengejar bar yang tertinggal (KuCoin maks. 1500)
+FETCH_PAGE_LIMIT = 1500
+# Hanya timeframe dasar ini yang diunduh; timeframe kelipatannya (4h, 1d, ...) dirangkum lokal dari candle dasar
+# sehingga pindah timeframe / strategi multi-timeframe tidak menambah request. Kosongkan untuk unduh langsung.
+BASE_TIMEFRAME = os.environ.get("BASE_TIMEFRAME", "1h")
+DAY_MS = 24 * 3600 * 1000
+# Bar terbanyak yang diminta dari timeframe rangkuman (chart 1d: 200 bar); retensi store timeframe dasar dinaikkan
+# agar riwayatnya muat (1d x 250 = ~6k bar 1h) dan tidak diunduh penuh ulang setiap kali
+RESAMPLE_MAX_LIMIT = int(os.environ.get("RESAMPLE_MAX_LIMIT", 250))
+RATE_LIMITS = {
+    # Batas publik KuCoin ~2000 bobot/30 detik dan kline berbobot 3;
+    # 10 req/detik masih jauh di bawah batas.
+    "kucoin": float(os.environ.get("KUCOIN_RATE_LIMIT", 10)),
+}
+# Metadata pasar ccxt (load_markets) disimpan ke disk agar start & request pertama tidak mengunduhnya lagi;
+# kosongkan (MARKETS_CACHE_PATH="") untuk menonaktifkan
+MARKETS_CACHE_PATH = os.environ.get("MARKETS_CACHE_PATH", os.path.join("candle_store", "exchange_markets.json"))
+MARKETS_CACHE_TTL = float(os.environ.get("MARKETS_CACHE_TTL", 86400))
+# Koneksi keep-alive per bursa yang dipakai bersama semua thread (sebaiknya >= SCAN_WORKERS)
+EXCHANGE_POOL_SIZE = int(os.environ.get("EXCHANGE_POOL_SIZE", 16))
+
+_exchanges = {}
+_limiters = {}
+_registry_lock = threading.Lock()
+# set_markets menulis beberapa atribut berurutan; penyegaran latar belakang & pemuatan dari disk tidak boleh bertumpuk
+_markets_lock = threading.Lock()
+
+# (exchange_id, pair, timeframe) -> {"fetched_at", "limit", "candles": CandleBuffer berkapasitas tetap}
+_cache = {}
+# Menjaga _cache: update stream (apply_candle), penggantian entri oleh _fetch dan salinan pembaca
+_buffer_lock = threading.Lock()
+_key_locks = {}
+_stats = {"hits": 0, "misses": 0, "downloaded_bars": 0, "resampled": 0, "markets_downloaded": 0, "markets_from_disk": 0}
+_store = None
+_markets_cache = None
+
+# --- REGISTRI BURSA ---
+def _create_exchange(exchange_id: str):
+    # Throttle bawaan ccxt dimatikan: per instance & tidak aman antar thread; laju diatur TokenBucket bersama
+    exchange = getattr(ccxt, exchange_id)({"enableRateLimit": False})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=EXCHANGE_POOL_SIZE)
+    exchange.session.mount("https://", adapter)
+    exchange.session.mount("http://", adapter)
+    return exchange
+
+def _markets(exchange_id: str, exchange):
+    # Dari file bila masih dalam TTL (basi -> dipakai sambil diperbarui di latar belakang), selain itu unduh
+    global _markets_cache
+    with _registry_lock:
+        if _markets_cache is None: _markets_cache = TTLCache(MARKETS_CACHE_PATH or None)
+
+    def download():
+        # load_markets KuCoin = daftar pasar + daftar mata uang (dua request). Dimuat ke instance terpisah lalu
+        # dipasang sekaligus: penyegaran di latar belakang tidak mengosongkan/mengganti pasar instance bersama
+        # di tengah request thread lain
+        for _ in range(2): get_limiter(exchange_id, exchange).acquire()
+        fresh = _create_exchange(exchange_id)
+        try:
+            with metrics.stage("markets_request"):
+                fresh.load_markets()
+        except Exception:
+            metrics.error(exchange_id)
+            raise
+        finally:
+            fresh.session.close()
+        _count("markets_downloaded")
+        with _markets_lock:
+            exchange.set_markets(fresh.markets, fresh.currencies)
+        return {"markets": fresh.markets, "currencies": fresh.currencies}
+
+    data = _markets_cache.get(exchange_id, download, MARKETS_CACHE_TTL)
+    with _markets_lock:
+        if not exchange.markets:
+            exchange.set_markets(data["markets"], data.get("currencies"))
+            _count("markets_from_disk")
+
+def get_exchange(exchange_id: str = "kucoin"):
+    # Satu instance per bursa untuk seluruh proses: sesi HTTP keep-alive & metadata pasar dipakai bersama
+    exchange = _exchanges.get(exchange_id)
+    if exchange is not None: return exchange
+    with _key_lock(("exchange", exchange_id)):
+        if exchange_id not in _exchanges:
+            exchange = _create_exchange(exchange_id)
+            try:
+                _markets(exchange_id, exchange)
+            except Exception as e:
+                # ccxt akan memuat pasar sendiri saat request pertama
+                print(f"Gagal memuat metadata pasar {exchange_id}: {e}")
+            _exchanges[exchange_id] = exchange
+        return _exchanges[exchange_id]
+
+def prewarm(exchange_ids=("kucoin", "indodax")):
+    # Dipanggil di thread latar saat start: instance, koneksi & metadata pasar siap sebelum request pertama
+    for exchange_id in exchange_ids:
+        started = time.perf_counter()
+        get_exchange(exchange_id)
+        print(f"Bursa {exchange_id} siap dalam {time.perf_counter() - started:.2f} detik.")
+
+def _default_rate(exchange):
+    # Laju bawaan ccxt (rateLimit = jeda ms antar request) dari instance bersama, untuk bursa tanpa entri RATE_LIMITS
+    try:
+        return 1000.0 / exchange.rateLimit
+    except Exception:
+        return 5.0
+
+def get_limiter(exchange_id: str = "kucoin", exchange=None):
+    # exchange: instance yang sedang dibuat get_exchange (belum terdaftar di _exchanges)
+    limiter = _limiters.get(exchange_id)
+    if limiter is not None: return limiter
+    rate = RATE_LIMITS.get(exchange_id) or _default_rate(exchange or get_exchange(exchange_id))
+    with _registry_lock:
+        return _limiters.setdefault(exchange_id, TokenBucket(rate=rate, capacity=rate))
+
+def store_retention():
+    # 0 = tanpa batas; selain itu cukup untuk RESAMPLE_MAX_LIMIT bar 1d yang dirangkum dari BASE_TIMEFRAME
+    if not CANDLE_STORE_RETENTION or not BASE_TIMEFRAME: return CANDLE_STORE_RETENTION
+    return max(CANDLE_STORE_RETENTION, (RESAMPLE_MAX_LIMIT + 1) * (DAY_MS // timeframe_ms(BASE_TIMEFRAME)))
+
+def get_store():
+    global _store
+    if not CANDLE_STORE_PATH: return None
+    with _registry_lock:
+        if _store is None:
+            _store = CandleStore(CANDLE_STORE_PATH, retention=store_retention())
+        return _store
+
+def _store_limit(store, limit: int):
+    # Bar yang bisa disimpan store untuk limit ini: bar di luar retensi memang dibuang, bukan tanda riwayat kurang
+    return min(limit, store.retention) if store.retention else limit
+
+def _download(exchange_id, pair, timeframe, limit=None, since=None):
+    # Waktu tunggu rate limiter dan waktu respons bursa dicatat terpisah
+    with metrics.stage("rate_limit_wait"): get_limiter(exchange_id).acquire()
+    try:
+        with metrics.stage("exchange_request"):
+            ohlcv = get_exchange(exchange_id).fetch_ohlcv(pair, timeframe=timeframe, since=since, limit=limit)
+    except Exception:
+        metrics.error(exchange_id)
+        raise
+    with _registry_lock:
+        _stats["downloaded_bars"] += len(ohlcv)
+    return ohlcv
+
+def _download_latest(exchange_id, pair, timeframe, limit):
+    # Bursa membatasi bar per request: riwayat yang lebih panjang diambil per halaman mulai dari bar tertua
+    if limit <= FETCH_PAGE_LIMIT: return _download(exchange_id, pair, timeframe, limit=limit)
+    since = next_close_ms(int(time.time() * 1000), timeframe) - limit * timeframe_ms(timeframe)
+    ohlcv = []
+    while True:
+        batch = _download(exchange_id, pair, timeframe, limit=FETCH_PAGE_LIMIT, since=since)
+        ohlcv += [candle for candle in batch if not ohlcv or candle[0] > ohlcv[-1][0]]
+        if len(batch) < FETCH_PAGE_LIMIT or batch[-1][0] <= since: break
+        since = batch[-1][0]
+    return ohlcv[-limit:]
+
+def _sync_store(store, exchange_id, pair, timeframe, limit):
+    # Unduh penuh hanya saat store kosong/kurang riwayat; selain itu ambil bar sejak
+    # timestamp terakhir (bar itu sendiri ikut diambil karena mungkin masih terbentuk).
+    last_ts = store.last_timestamp(exchange_id, pair, timeframe)
+    if last_ts is None or store.count(exchange_id, pair, timeframe) < _store_limit(store, limit):
+        store.upsert(exchange_id, pair, timeframe, _download_latest(exchange_id, pair, timeframe, limit))
+        return
+    since = last_ts
+    while True:
+        batch = _download(exchange_id, pair, timeframe, limit=FETCH_PAGE_LIMIT, since=since)
+        store.upsert(exchange_id, pair, timeframe, batch)
+        if len(batch) < FETCH_PAGE_LIMIT or batch[-1][0] <= since: break
+        since = batch[-1][0]
+
+def _key_lock(key):
+    with _registry_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def _count(name):
+    with _registry_lock:
+        _stats[name] += 1
+
+def _cached(key, limit, ttl):
+    entry = _cache.get(key)
+    if entry and entry["limit"] >= limit and time.monotonic() - entry["fetched_at"] < ttl:
+        with _buffer_lock: return entry["candles"].copy(limit)
+    return None
+
+def fetch_ohlcv(pair: str, timeframe: str = '4h', limit: int = 100, exchange_id: str = "kucoin", ttl: float = None):
+    # Format list ccxt untuk pemanggil lama (pemindai inkremental, backtest); analisis chart memakai fetch_buffer
+    return fetch_buffer(pair, timeframe, limit, exchange_id, ttl).tolist()
+
+def fetch_buffer(pair: str, timeframe: str = '4h', limit: int = 100, exchange_id: str = "kucoin", ttl: float = None):
+    # CandleBuffer ringkas milik pemanggil (salinan n bar terakhir dari cache). Timeframe kelipatan BASE_TIMEFRAME
+    # dirangkum dari candle dasar (cache & store yang sama untuk semua timeframe)
+    base = base_timeframe_for(timeframe)
+    if base is None: return _fetch(pair, timeframe, limit, exchange_id, ttl)
+    ratio = timeframe_ms(timeframe) // timeframe_ms(base)
+    # +1 bar besar: bar pertama bisa terpotong (riwayat dasar mulai di tengah bar) dan dibuang resample()
+    candles = _fetch(pair, base, (limit + 1) * ratio, exchange_id, ttl)
+    _count("resampled")
+    return resample_buffer(candles, timeframe, limit)
+
+def _fetch(pair: str, timeframe: str, limit: int, exchange_id: str, ttl: float = None):
+    # Satu unduhan dengan limit besar dapat melayani semua permintaan dengan limit lebih kecil.
+    ttl = OHLCV_CACHE_TTL if ttl is None else ttl
+    key = (exchange_id, pair, timeframe)
+    candles = _cached(key, limit, ttl)
+    if candles is not None:
+        _count("hits")
+        return candles
+
+    # Kunci per key: permintaan bersamaan untuk pasangan yang sama cukup satu unduhan
+    with _key_lock(key):
+        candles = _cached(key, limit, ttl)
+        if candles is not None:
+            _count("hits")
+            return candles
+        _count("misses")
+        started = time.monotonic()
+        store = get_store()
+        if store is not None:
+            _sync_store(store, exchange_id, pair, timeframe, limit)
+            ohlcv = store.read(exchange_id, pair, timeframe, limit)
+            available = _store_limit(store, limit)
+        else:
+            ohlcv = _download_latest(exchange_id, pair, timeframe, limit)
+            available = limit
+        # Jika bursa mengembalikan lebih sedikit dari limit, seluruh riwayat sudah ada di cache
+        cached_limit = limit if len(ohlcv) >= available else float("inf")
+        candles = CandleBuffer.from_ohlcv(ohlcv, capacity=limit)
+        with _buffer_lock:
+            _merge_stream_updates(_cache.get(key), candles, started)
+            _cache[key] = {"fetched_at": time.monotonic(), "limit": cached_limit, "candles": candles}
+            return candles.copy(limit)
+
+def _merge_stream_updates(entry, candles: CandleBuffer, started: float):
+    # Update stream yang tiba selama unduhan REST tidak boleh hilang: bar yang lebih baru dari hasil unduhan
+    # disalin dari buffer lama, begitu juga bar terakhirnya bila stream memperbaruinya setelah unduhan dimulai.
+    # Dipanggil dengan _buffer_lock dipegang.
+    if entry is None or not len(entry["candles"]) or not len(candles): return
+    old, last_ts = entry["candles"], candles.last_timestamp
+    timestamps = old.timestamps()
+    tail = len(timestamps) - int(np.searchsorted(timestamps, last_ts, side="left"))
+    for candle in old.tolist(tail) if tail else []:
+        if candle[0] > last_ts or entry["fetched_at"] > started: candles.update(candle)
+
+def apply_candle(pair: str, timeframe: str, candle, exchange_id: str = "kucoin"):
+    # Update bar dari stream WebSocket: bar terakhir di cache diganti atau bar baru ditambahkan, dan umur cache
+    # disegarkan sehingga fetch_ohlcv tidak perlu REST selama stream hidup. O(1): ring buffer berkapasitas tetap,
+    # bar tertua terbuang saat penuh. Mengembalikan bar yang baru saja close, atau None.
+    key = (exchange_id, pair, timeframe)
+    # Lock yang sama dengan _fetch: entri tidak bisa diganti hasil REST di tengah update
+    with _buffer_lock:
+        entry = _cache.get(key)
+        # Belum ada riwayat dari REST: update diabaikan sampai stream selesai mengisi cache awal
+        if entry is None or not len(entry["candles"]): return None
+        candles = entry["candles"]
+        closed = candles.update(candle)
+        # Riwayat "lengkap" (limit tak hingga) tidak lagi lengkap setelah bar tertua terbuang
+        if len(candles) == candles.capacity: entry["limit"] = min(entry["limit"], candles.capacity)
+        entry["fetched_at"] = time.monotonic()
+    store = get_store()
+    if closed is not None and store is not None: store.upsert(exchange_id, pair, timeframe, [closed])
+    return closed
+
+# --- HELPER TIMEFRAME ---
+def timeframe_ms(timeframe: str):
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+def next_close_ms(now_ms: int, timeframe: str):
+    # Batas close bar berikutnya (bar bursa sejajar epoch UTC)
+    tf_ms = timeframe_ms(timeframe)
+    return (now_ms // tf_ms + 1) * tf_ms
+
+def base_timeframe_for(timeframe: str):
+    # Timeframe dasar untuk dirangkum, atau None jika harus diunduh langsung. Hanya kelipatan yang membagi
+    # satu hari (sampai 1d): batas barnya sejajar epoch UTC seperti bar bursa; 1w/1M tidak.
+    if not BASE_TIMEFRAME or timeframe == BASE_TIMEFRAME: return None
+    tf_ms, base_ms = timeframe_ms(timeframe), timeframe_ms(BASE_TIMEFRAME)
+    if tf_ms > base_ms and tf_ms % base_ms == 0 and DAY_MS % tf_ms == 0: return BASE_TIMEFRAME
+    return None
+
+def resample(ohlcv, timeframe: str):
+    # Agregasi persis: open pertama, high maks, low min, close terakhir, volume dijumlah per bar sejajar epoch UTC.
+    # Bar besar pertama dibuang bila candle dasarnya tidak dimulai dari awal bar (data tidak lengkap);
+    # bar terakhir boleh belum lengkap, sama seperti bar yang sedang terbentuk di bursa.
+    tf_ms = timeframe_ms(timeframe)
+    bars = []
+    for ts, open_, high, low, close, volume in ohlcv:
+        start = ts - ts % tf_ms
+        if bars and bars[-1][0] == start:
+            bar = bars[-1]
+            if high > bar[2]: bar[2] = high
+            if low < bar[3]: bar[3] = low
+            bar[4] = close
+            bar[5] += volume
+        else:
+            bars.append([start, open_, high, low, close, volume])
+    if bars and ohlcv[0][0] != bars[0][0]: bars.pop(0)
+    return bars
+
+def resample_buffer(candles: CandleBuffer, timeframe: str, limit: int = None):
+    # Versi vektor resample() untuk CandleBuffer: batas bar dari timestamp, lalu reduceat per kolom
+    tf_ms = timeframe_ms(timeframe)
+    ts, values = candles.timestamps(), candles.values()
+    if not len(ts): return CandleBuffer(limit or 1)
+    starts = ts - ts % tf_ms
+    first = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+    last = np.concatenate((first[1:] - 1, [len(ts) - 1]))
+    open_, high, low, close, volume = values
+    # Volume dijumlah berurutan per bar (bukan np.add.reduceat yang berpasangan) agar hasilnya sama persis
+    # dengan resample(); iterasi sebanyak bar dasar per bar besar, bukan sebanyak bar
+    lengths = last - first + 1
+    bar_volume = volume[first].copy()
+    for k in range(1, int(lengths.max())):
+        more = lengths > k
+        bar_volume[more] += volume[first[more] + k]
+    bars = np.vstack((open_[first], np.maximum.reduceat(high, first), np.minimum.reduceat(low, first), close[last], bar_volume))
+    bar_ts = starts[first]
+    if ts[0] != bar_ts[0]: bar_ts, bars = bar_ts[1:], bars[:, 1:]
+    if limit is not None: bar_ts, bars = bar_ts[-limit:], bars[:, -limit:]
+    return CandleBuffer.from_arrays(bar_ts, bars)
+
+def closed_bars(ohlcv, timeframe: str, now_ms: int):
+    tf_ms = timeframe_ms(timeframe)
+    return [candle for candle in ohlcv if candle[0] + tf_ms <= now_ms]
+
+def cache_stats():
+    # Memori candle per pasangan terbatas kapasitas buffer (limit terbesar yang pernah diminta)
+    entries = list(_cache.values())
+    return dict(_stats, buffers=len(entries), buffer_bars=sum(len(entry["candles"]) for entry in entries),
+                buffer_bytes=sum(entry["candles"].nbytes for entry in entries))
+
+def clear_cache():
+    _cache.clear()
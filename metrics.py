@@ -0,0 +1,161 @@
+# metrics.py
+# Instrumentasi ringan tanpa dependensi tambahan: counter & histogram berlabel, timer per tahap, ekspor format
+# teks Prometheus (endpoint /metrics di main.py) dan ringkasan per run untuk pemindai. Statistik yang sudah
+# dikumpulkan modul lain (cache candle, AI, berita, antrian pengiriman) ikut diekspor lewat collector.
+import threading
+import time
+from contextlib import contextmanager
+
+# --- KONFIGURASI ---
+METRICS_PREFIX = "trading_bot"
+# Batas atas bucket histogram (detik): dari hitungan indikator (ms) sampai render/AI (puluhan detik)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(names, values, extra: str = None):
+    parts = [name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ") + '"' for name, value in zip(names, values)]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock: self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self):
+        with self._lock: return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_label_text(self.labels, key)} {_number(value)}" for key, value in sorted(self.values().items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label -> [jumlah per bucket (tidak kumulatif), total detik, jumlah observasi]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def values(self):
+        with self._lock: return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+class StatsCollector:
+    # Mengekspor dict statistik milik modul lain (mis. market_data.cache_stats()) sebagai gauge saat di-scrape
+    def __init__(self, name: str, help: str, sources: dict):
+        self.name, self.help = name, help
+        self.sources = sources
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for source, func in sorted(self.sources.items()):
+            try:
+                stats = func()
+            except Exception as e:
+                print(f"Gagal membaca statistik {source}: {e}")
+                continue
+            for kind, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{self.name}{_label_text(('source', 'kind'), (source, kind))} {_number(value)}")
+        return lines
+
+
+# --- METRIK BERSAMA ---
+STAGE_SECONDS = Histogram(f"{METRICS_PREFIX}_stage_seconds", "Durasi per tahap (fetch bursa, indikator, AI, render, pengiriman, ...)", ["stage"])
+ERRORS = Counter(f"{METRICS_PREFIX}_errors_total", "Error panggilan API eksternal per sumber", ["source"])
+MESSAGES = Counter(f"{METRICS_PREFIX}_telegram_messages_total", "Pesan Telegram per metode dan status", ["method", "status"])
+STATS = StatsCollector(f"{METRICS_PREFIX}_stats", "Statistik cache & antrian dari modul lain", {})
+
+def stage(name: str):
+    # with metrics.stage("indicators"): ...
+    return STAGE_SECONDS.time(stage=name)
+
+def error(source: str):
+    ERRORS.inc(source=source)
+
+def message(method: str, status: str):
+    MESSAGES.inc(method=method, status=status)
+
+def register_stats(source: str, func):
+    STATS.sources[source] = func
+
+def render():
+    lines = []
+    for metric in (STAGE_SECONDS, ERRORS, MESSAGES, STATS):
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# --- RINGKASAN PER RUN ---
+def snapshot():
+    return {"stages": STAGE_SECONDS.values(), "errors": ERRORS.values(), "messages": MESSAGES.values()}
+
+def _p95(counts, buckets):
+    # Perkiraan dari bucket: batas atas bucket tempat persentil ke-95 jatuh
+    target, cumulative = sum(counts) * 0.95, 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        if cumulative >= target: return bound
+    return buckets[-1]
+
+def summary(since: dict = None):
+    # Ringkasan sejak snapshot `since` (mis. awal siklus daemon); tanpa since = sejak proses dimulai
+    current, since = snapshot(), since or {"stages": {}, "errors": {}, "messages": {}}
+    lines = []
+    for (stage_name,), (counts, total, count) in sorted(current["stages"].items()):
+        old_counts, old_total, old_count = since["stages"].get((stage_name,), ([0] * len(counts), 0.0, 0))
+        counts = [new - old for new, old in zip(counts, old_counts)]
+        total, count = total - old_total, count - old_count
+        if not count: continue
+        p95 = _p95(counts, STAGE_SECONDS.buckets)
+        p95_text = "> 60s" if p95 == float("inf") else f"<= {p95:g}s"
+        lines.append(f"  {stage_name:<18} {count:>5}x  total {total:8.2f}s  rata-rata {total / count * 1000:8.1f} ms  p95 {p95_text}")
+    errors = {key[0]: value - since["errors"].get(key, 0.0) for key, value in current["errors"].items()}
+    messages = {"/".join(key): value - since["messages"].get(key, 0.0) for key, value in current["messages"].items()}
+    errors = {source: value for source, value in errors.items() if value}
+    messages = {key: value for key, value in messages.items() if value}
+    text = "Metrik per tahap:\n" + ("\n".join(lines) if lines else "  (tidak ada)")
+    if errors: text += "\nError API: " + ", ".join(f"{source}={value:.0f}" for source, value in sorted(errors.items()))
+    if messages: text += "\nPesan Telegram: " + ", ".join(f"{key}={value:.0f}" for key, value in sorted(messages.items()))
+    return text
@@ -0,0 +1,147 @@
+# news.py
+# Berita CryptoCompare untuk validasi sinyal: satu request untuk banyak kategori sekaligus (ditambah paling banyak
+# satu request gabungan untuk simbol yang tertutup berita koin besar), cache per simbol dengan TTL, artikel disimpan sekali per
+# ID (tanpa duplikat antar simbol), dan penanda "berita baru sejak pemindaian terakhir" untuk prompt AI.
+import json
+import os
+import threading
+import time
+import requests
+import metrics
+
+# --- KONFIGURASI ---
+NEWS_TTL = float(os.environ.get("NEWS_TTL", 900))
+NEWS_PER_SYMBOL = int(os.environ.get("NEWS_PER_SYMBOL", 5))
+NEWS_TIMEOUT = float(os.environ.get("NEWS_TIMEOUT", 15))
+# Jumlah artikel per respons CryptoCompare; respons lebih pendek berarti tidak ada berita yang tergeser
+NEWS_PAGE_SIZE = 50
+# Kosongkan (NEWS_STATE_PATH="") untuk tidak menyimpan cache & berita yang sudah dilihat
+NEWS_STATE_PATH = os.environ.get("NEWS_STATE_PATH", os.path.join("candle_store", "news_state.json"))
+NEWS_URL = "https://min-api.cryptocompare.com/data/v2/news/"
+
+
+class NewsFeed:
+    def __init__(self, api_key: str = None, ttl: float = NEWS_TTL, path: str = NEWS_STATE_PATH):
+        self.api_key = api_key
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        # id artikel -> {"title", "published_on"}; simbol -> {"fetched_at", "ids"}; simbol -> [id yang sudah dilihat]
+        self._articles = {}
+        self._symbols = {}
+        self._seen = {}
+        self._stats = {"requests": 0, "symbol_hits": 0, "symbol_misses": 0, "errors": 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                self._articles, self._symbols, self._seen = data["articles"], data["symbols"], data["seen"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Gagal memuat state berita dari {path}: {e}")
+
+    def _stale(self, symbol: str, now: float):
+        entry = self._symbols.get(symbol)
+        return entry is None or now - entry["fetched_at"] >= self.ttl
+
+    def _download(self, symbols):
+        with self._lock: self._stats["requests"] += 1
+        params = {"lang": "EN", "categories": ",".join(symbols)}
+        if self.api_key: params["api_key"] = self.api_key
+        try:
+            with metrics.stage("news_request"):
+                response = requests.get(NEWS_URL, params=params, timeout=NEWS_TIMEOUT)
+                response.raise_for_status()
+                return response.json()['Data']
+        except Exception:
+            metrics.error("cryptocompare")
+            raise
+
+    def prefetch(self, symbols):
+        # Satu request untuk semua simbol yang cache-nya kedaluwarsa; artikel dibagi ke simbol lewat kolom categories
+        symbols = sorted({symbol.upper() for symbol in symbols})
+        with self._fetch_lock:
+            now = time.time()
+            stale = [symbol for symbol in symbols if self._stale(symbol, now)]
+            with self._lock:
+                self._stats["symbol_hits"] += len(symbols) - len(stale)
+                self._stats["symbol_misses"] += len(stale)
+            if not stale: return
+            ids = {symbol: [] for symbol in stale}
+            try:
+                articles = self._download(stale)
+                self._assign(articles, ids)
+            except Exception as e:
+                with self._lock: self._stats["errors"] += 1
+                print(f"Gagal mengambil berita untuk {stale}: {e}")
+                return
+            # Respons gabungan hanya berisi NEWS_PAGE_SIZE artikel terbaru lintas semua kategori, sehingga berita koin
+            # kecil bisa tergeser berita BTC/ETH: jika halamannya penuh, simbol yang belum mendapat kuotanya diambil
+            # lagi dalam satu request gabungan (tanpa kategori besar yang menggeser). Simbol yang tetap kurang
+            # (memang jarang diberitakan) di-cache apa adanya selama TTL.
+            short = [symbol for symbol in stale if len(ids[symbol]) < NEWS_PER_SYMBOL]
+            if len(stale) > 1 and len(articles) >= NEWS_PAGE_SIZE and short:
+                try:
+                    self._assign(self._download(short), {symbol: ids[symbol] for symbol in short})
+                except Exception as e:
+                    with self._lock: self._stats["errors"] += 1
+                    print(f"Gagal mengambil berita untuk {short}: {e}")
+            with self._lock:
+                for symbol in stale:
+                    self._symbols[symbol] = {"fetched_at": now, "ids": ids[symbol]}
+                self._prune()
+
+    def _assign(self, articles, ids: dict):
+        # Artikel terbaru dulu, maksimal NEWS_PER_SYMBOL per simbol; ids = {simbol: [id, ...]} diisi di tempat
+        with self._lock:
+            for article in sorted(articles, key=lambda a: a.get('published_on', 0), reverse=True):
+                article_id = str(article['id'])
+                categories = set(str(article.get('categories', '')).upper().split('|'))
+                for symbol, symbol_ids in ids.items():
+                    if symbol in categories and len(symbol_ids) < NEWS_PER_SYMBOL and article_id not in symbol_ids:
+                        symbol_ids.append(article_id)
+                        self._articles[article_id] = {"title": article['title'], "published_on": article.get('published_on', 0)}
+
+    def _prune(self):
+        # Simpan hanya artikel yang masih dirujuk simbol mana pun
+        referenced = {article_id for entry in self._symbols.values() for article_id in entry["ids"]}
+        self._articles = {article_id: article for article_id, article in self._articles.items() if article_id in referenced}
+        self._seen = {symbol: [article_id for article_id in ids if article_id in referenced] for symbol, ids in self._seen.items()}
+
+    def headlines(self, symbol: str):
+        symbol = symbol.upper()
+        self.prefetch([symbol])
+        with self._lock:
+            entry = self._symbols.get(symbol, {"ids": []})
+            return [self._articles[article_id]["title"] for article_id in entry["ids"] if article_id in self._articles]
+
+    def new_headlines(self, symbol: str):
+        # Judul yang belum ditandai mark_seen() untuk simbol ini. Hanya penanda: validasi tetap membaca headlines()
+        # agar sinyal berulang pada pemindaian berikutnya tidak dinilai seolah tanpa berita
+        symbol = symbol.upper()
+        self.prefetch([symbol])
+        with self._lock:
+            entry = self._symbols.get(symbol, {"ids": []})
+            seen = set(self._seen.get(symbol, []))
+            return [self._articles[article_id]["title"] for article_id in entry["ids"] if article_id not in seen and article_id in self._articles]
+
+    def mark_seen(self, symbol: str):
+        symbol = symbol.upper()
+        with self._lock:
+            entry = self._symbols.get(symbol, {"ids": []})
+            self._seen[symbol] = sorted(set(self._seen.get(symbol, [])) | set(entry["ids"]))
+
+    def save(self):
+        if not self.path: return
+        with self._lock:
+            data = {"articles": self._articles, "symbols": self._symbols, "seen": self._seen}
+        directory = os.path.dirname(self.path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, symbols=len(self._symbols), articles=len(self._articles))
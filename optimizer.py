@@ -0,0 +1,220 @@
+# optimizer.py
+# Pencarian parameter EMA/RSI/MACD per koin di atas riwayat lokal, lalu menulis file pengaturan yang dimuat
+# signal_finder saat start (menggantikan tabel OPTIMAL_SETTINGS / SENSITIVE_SETTINGS yang diketik manual).
+# Setiap indikator dihitung sekali per parameter (mis. satu EMA per window) lalu dipakai ulang oleh semua
+# kombinasi; koin dikerjakan paralel di semua core. Validasi walk-forward: parameter hanya dipakai jika hasil
+# out-of-sample-nya mengalahkan pengaturan DEFAULT pada lipatan yang sama.
+#
+# Pemakaian: python optimizer.py [KOIN ...] [--timeframe 4h] [--data candle_store/candles.sqlite3]
+#                                [--folds 4] [--workers N] [--output strategy_settings.json]
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import indicators
+import backtest
+from market_data import CANDLE_STORE_PATH
+
+# --- KONFIGURASI ---
+GRID = {
+    "ema_fast": [9, 12, 20],
+    "ema_slow": [21, 35, 50, 100],
+    "rsi_period": [9, 14, 21],
+    "rsi_os": [20, 25, 30, 35],
+    "rsi_ob": [65, 70, 75, 80],
+    "macd": [(12, 26, 9), (9, 21, 7), (5, 35, 5), (8, 17, 9)],
+}
+SENSITIVE_GRID = {
+    "rsi_os": [25, 30, 35, 40],
+    "rsi_ob": [60, 65, 70, 75],
+    "macd": [(9, 21, 7), (5, 13, 5), (8, 17, 9), (12, 26, 9)],
+}
+# Trade out-of-sample minimum agar hasil tuning dianggap bermakna
+MIN_TRADES = int(os.environ.get("OPTIMIZER_MIN_TRADES", 3))
+# Bar awal yang dilewati agar indikator terpanjang (EMA 100) sudah stabil
+WARMUP_BARS = 200
+STRATEGY_SETTINGS_PATH = os.environ.get("STRATEGY_SETTINGS_PATH", "strategy_settings.json")
+
+
+# --- CACHE INDIKATOR ---
+class IndicatorCache:
+    # Setiap indikator dihitung sekali per parameter untuk satu seri harga
+    def __init__(self, close):
+        self.close = close
+        self._cache = {}
+
+    def _get(self, key, compute):
+        if key not in self._cache: self._cache[key] = compute()
+        return self._cache[key]
+
+    def ema(self, window: int):
+        return self._get(("ema", window), lambda: indicators.ema(self.close, window)[0])
+
+    def rsi(self, window: int):
+        return self._get(("rsi", window), lambda: indicators.rsi(self.close, window)[0])
+
+    def macd(self, fast: int, slow: int, sign: int):
+        return self._get(("macd", fast, slow, sign), lambda: tuple(v[0] for v in indicators.macd(self.close, fast, slow, sign))[:2])
+
+    def first_valid(self, values):
+        valid = np.flatnonzero(~np.isnan(values))
+        return valid[0] if len(valid) else len(values)
+
+    def macd_cross(self, combo):
+        # (cross naik, cross turun, bar valid pertama) untuk satu kombinasi MACD
+        def compute():
+            line, signal = self.macd(*combo)
+            return backtest.cross_up(line, signal), backtest.cross_down(line, signal), max(self.first_valid(line), self.first_valid(signal))
+        return self._get(("macd_cross", combo), compute)
+
+
+# --- KANDIDAT ---
+def signal_candidates(cache: IndicatorCache, grid: dict = GRID):
+    # Menghasilkan (settings, buy, sell) untuk semua kombinasi; komponen mask dipakai ulang antar kombinasi
+    close = cache.close
+    bars = np.arange(len(close))
+    for ema_fast, ema_slow in itertools.product(grid["ema_fast"], grid["ema_slow"]):
+        if ema_fast >= ema_slow: continue
+        fast, slow = cache.ema(ema_fast), cache.ema(ema_slow)
+        uptrend, downtrend = (close > slow) & (fast > slow), (close < slow) & (fast < slow)
+        ema_valid = max(cache.first_valid(fast), cache.first_valid(slow))
+        for rsi_period in grid["rsi_period"]:
+            rsi = cache.rsi(rsi_period)
+            rsi_prev = backtest.previous(rsi)
+            for combo in grid["macd"]:
+                macd_up, macd_down, macd_valid = cache.macd_cross(combo)
+                # Setara syarat >= 3 bar valid di signal_rule
+                ready = bars >= max(ema_valid, cache.first_valid(rsi), macd_valid) + 2
+                long_base, short_base = ready & uptrend & macd_up, ready & downtrend & macd_down
+                for rsi_os, rsi_ob in itertools.product(grid["rsi_os"], grid["rsi_ob"]):
+                    buy = long_base & (rsi_prev < rsi_os) & (rsi > rsi_os)
+                    sell = short_base & ~buy & (rsi_prev > rsi_ob) & (rsi < rsi_ob)
+                    settings = {"ema_fast": ema_fast, "ema_slow": ema_slow, "rsi_period": rsi_period, "rsi_ob": rsi_ob, "rsi_os": rsi_os,
+                                "macd_fast": combo[0], "macd_slow": combo[1], "macd_signal": combo[2]}
+                    yield settings, buy, sell
+
+def alert_candidates(cache: IndicatorCache, grid: dict = SENSITIVE_GRID):
+    bars = np.arange(len(cache.close))
+    rsi = cache.rsi(14)
+    for combo in grid["macd"]:
+        macd_up, macd_down, macd_valid = cache.macd_cross(combo)
+        ready = bars >= max(cache.first_valid(rsi), macd_valid) + 2
+        for rsi_os, rsi_ob in itertools.product(grid["rsi_os"], grid["rsi_ob"]):
+            buy = ready & (rsi < rsi_os) & macd_up
+            sell = ready & ~buy & (rsi > rsi_ob) & macd_down
+            settings = {"rsi_ob": rsi_ob, "rsi_os": rsi_os, "macd_fast": combo[0], "macd_slow": combo[1], "macd_signal": combo[2]}
+            yield settings, buy, sell
+
+
+# --- WALK-FORWARD ---
+def folds(n_bars: int, n_folds: int):
+    # Jendela latih yang terus memanjang, masing-masing diikuti satu segmen uji
+    edges = np.linspace(WARMUP_BARS, n_bars, n_folds + 2).astype(int)
+    return [((WARMUP_BARS, edges[i + 1]), (edges[i + 1], edges[i + 2])) for i in range(n_folds)]
+
+def _window(mask, start: int, end: int):
+    windowed = np.zeros_like(mask)
+    windowed[start:end] = mask[start:end]
+    return windowed
+
+def evaluate(ohlcv, buy, sell, start: int, end: int):
+    trades = backtest.simulate(ohlcv, _window(buy, start, end), _window(sell, start, end))
+    return backtest.summarize(trades, buy[start:end], sell[start:end])
+
+def _score(summary):
+    return summary["total_return"] if summary["trades"] >= 1 else -np.inf
+
+def walk_forward(ohlcv, candidates, default, n_folds: int):
+    # candidates: list (settings, buy, sell); default: (buy, sell) pengaturan DEFAULT.
+    # Mengembalikan pilihan akhir + ringkasan out-of-sample vs DEFAULT.
+    n = len(ohlcv)
+    oos_returns, oos_trades, default_returns = [], 0, []
+    for (train_start, train_end), (test_start, test_end) in folds(n, n_folds):
+        best = max(candidates, key=lambda c: _score(evaluate(ohlcv, c[1], c[2], train_start, train_end)))
+        result = evaluate(ohlcv, best[1], best[2], test_start, test_end)
+        oos_returns.append(result["total_return"])
+        oos_trades += result["trades"]
+        default_returns.append(evaluate(ohlcv, default[0], default[1], test_start, test_end)["total_return"])
+    tuned_oos = float(np.prod([1 + r for r in oos_returns]) - 1)
+    default_oos = float(np.prod([1 + r for r in default_returns]) - 1)
+    final = max(candidates, key=lambda c: _score(evaluate(ohlcv, c[1], c[2], WARMUP_BARS, n)))
+    accepted = oos_trades >= MIN_TRADES and tuned_oos > default_oos
+    return {"settings": final[0], "accepted": bool(accepted), "tuned_oos": tuned_oos, "default_oos": default_oos, "oos_trades": oos_trades}
+
+def optimize_series(coin: str, ohlcv, default_optimal: dict, default_sensitive: dict, n_folds: int = 4):
+    ohlcv = np.asarray(ohlcv, dtype=float)
+    cache = IndicatorCache(ohlcv[:, 4])
+    started = time.perf_counter()
+    close = ohlcv[:, 4]
+    optimal = walk_forward(ohlcv, list(signal_candidates(cache)), backtest.signal_masks(close, default_optimal), n_folds)
+    sensitive = walk_forward(ohlcv, list(alert_candidates(cache)), backtest.alert_masks(close, default_sensitive), n_folds)
+    return {"coin": coin, "bars": len(ohlcv), "optimal": optimal, "sensitive": sensitive, "seconds": time.perf_counter() - started}
+
+def _optimize_job(job):
+    return optimize_series(*job)
+
+
+# --- FILE PENGATURAN ---
+def write_settings(results, timeframe: str, path: str = STRATEGY_SETTINGS_PATH):
+    data = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "timeframe": timeframe,
+        "optimal": {r["coin"]: r["optimal"]["settings"] for r in results if r["optimal"]["accepted"]},
+        "sensitive": {r["coin"]: r["sensitive"]["settings"] for r in results if r["sensitive"]["accepted"]},
+        "report": {r["coin"]: {kind: {k: r[kind][k] for k in ("accepted", "tuned_oos", "default_oos", "oos_trades")}
+                               for kind in ("optimal", "sensitive")} for r in results},
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return data
+
+def main(argv=None):
+    import signal_finder
+    parser = argparse.ArgumentParser(description="Optimasi parameter strategi per koin (walk-forward).")
+    parser.add_argument("coins", nargs="*", help="Koin (mis. BTC ETH); kosong = semua yang ada di data")
+    parser.add_argument("--timeframe", default="4h")
+    parser.add_argument("--data", default=CANDLE_STORE_PATH, help="File SQLite CandleStore atau folder CSV")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=STRATEGY_SETTINGS_PATH)
+    args = parser.parse_args(argv)
+
+    default_optimal, default_sensitive = signal_finder.OPTIMAL_SETTINGS["DEFAULT"], signal_finder.SENSITIVE_SETTINGS["DEFAULT"]
+    jobs = []
+    for coin in args.coins or backtest.available_coins(args.data, args.timeframe):
+        ohlcv = backtest.load_history(args.data, coin, args.timeframe)
+        if len(ohlcv) < WARMUP_BARS * 2:
+            print(f"Data {coin} {args.timeframe} tidak cukup ({len(ohlcv)} bar), dilewati.")
+            continue
+        jobs.append((coin, ohlcv, default_optimal, default_sensitive, args.folds))
+    if not jobs:
+        print("Tidak ada data untuk dioptimasi.")
+        return None
+
+    started = time.perf_counter()
+    workers = args.workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        results = [_optimize_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_optimize_job, jobs))
+
+    for r in results:
+        for kind in ("optimal", "sensitive"):
+            res = r[kind]
+            status = "DIPAKAI" if res["accepted"] else "ditolak (pakai DEFAULT)"
+            print(f"{r['coin']:<8} {kind:<9} OOS {res['tuned_oos'] * 100:+6.1f}% vs DEFAULT {res['default_oos'] * 100:+6.1f}% "
+                  f"({res['oos_trades']} trade) -> {status}")
+    data = write_settings(results, args.timeframe, args.output)
+    print(f"{len(data['optimal'])} pengaturan sinyal & {len(data['sensitive'])} pengaturan peringatan ditulis ke {args.output} "
+          f"({time.perf_counter() - started:.1f} detik).")
+    return data
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# rate_limiter.py
+# Token bucket global untuk membatasi laju request ke REST API bursa
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.acquired = 0
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def acquire(self, tokens: float = 1.0):
+        # Blok sampai token tersedia. Mengembalikan lama menunggu (detik).
+        waited = 0.0
+        throttled = False
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.acquired += 1
+                    if throttled: self.throttled += 1
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            throttled = True
+            time.sleep(delay)
+            waited += delay
+
+    def stats(self):
+        with self._lock:
+            return {"acquired": self.acquired, "throttled": self.throttled}
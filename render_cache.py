@@ -0,0 +1,61 @@
+# render_cache.py
+# Cache LRU berukuran tetap untuk hasil render chart (PNG + caption) di memori.
+# Permintaan bersamaan untuk key yang sama menunggu satu render yang sama (tidak dirender dua kali).
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", 64))
+
+
+class RenderCache:
+    def __init__(self, maxsize: int = CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evicted": 0, "uncached": 0}
+
+    def get_or_render(self, key, render, cacheable=None):
+        # render() hanya dipanggil oleh thread pertama; error diteruskan ke semua penunggu dan tidak di-cache.
+        # cacheable(value) False (mis. pesan gagal, data belum lengkap): hasil hanya dibagi ke penunggu saat ini
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not owner: return future.result()
+
+        try:
+            value = render()
+        except BaseException as e:
+            with self._lock: del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if cacheable is not None and not cacheable(value):
+                self._stats["uncached"] += 1
+                future.set_result(value)
+                return value
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
@@ -2,10 +2,11 @@
 # VERSI MANDIRI DENGAN SEMUA INDIKATOR TERBARU DAN DATA NUMERIK
 import os
 import requests
-import ccxt
-import pandas as pd
-import mplfinance as mpf
-import ta
+import analysis
+import market_context
+import metrics
+from delivery import DeliveryQueue
+from chart_renderer import ChartRenderer
 import pytz
 from datetime import datetime
 import telegram
@@ -22,10 +23,8 @@ CRYPTOCOMPARE_API_KEY = os.environ.get('CRYPTOCOMPARE_API_KEY')
 # --- FUNGSI HELPER (Disalin dari main.py) ---
 def get_fear_and_greed_index():
     try:
-        url = "https://api.alternative.me/fng/?limit=1"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()['data'][0]
+        # Nilai di-cache bersama (market_context), diperbarui di latar belakang saat kedaluwarsa
+        data = market_context.fear_and_greed()
         value = int(data['value'])
         classification = data['value_classification']
         sentiment_score = 0
@@ -42,118 +41,31 @@ def get_fear_and_greed_index():
         print(f"Error di get_fear_and_greed_index: {e}")
         return {"status": "error", "message": "Gagal memuat F&G Index."}
 
-def analyze_indicators(df: pd.DataFrame):
-    last = df.iloc[-1]
-    prev = df.iloc[-2]
-    analysis = {}
-    
-    ma9_val = last['ma9']
-    ma26_val = last['ma26']
-    if ma9_val > ma26_val and last['close'] > ma9_val:
-        analysis['ma'] = f"🟢 Bullish (`{ma9_val:.2f}` > `{ma26_val:.2f}`)"
-    elif ma9_val < ma26_val and last['close'] < ma9_val:
-        analysis['ma'] = f"🔴 Bearish (`{ma9_val:.2f}` < `{ma26_val:.2f}`)"
-    else:
-        analysis['ma'] = "⚪ Netral"
-    
-    analysis['rsi'] = f"({last['rsi']:.2f})"
-    if last['rsi'] > 70: analysis['rsi'] = f"🔴 Overbought {analysis['rsi']}"
-    elif last['rsi'] < 30: analysis['rsi'] = f"🟢 Oversold {analysis['rsi']}"
-    else: analysis['rsi'] = f"⚪ Netral {analysis['rsi']}"
-    
-    if prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']:
-        analysis['macd'] = "🟢 Golden Cross"
-    elif prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']:
-        analysis['macd'] = "🔴 Death Cross"
-    else:
-        analysis['macd'] = "⚪ Netral"
-    
-    analysis['bb_score'] = 0
-    if last['close'] < last['bb_low']:
-        analysis['bb'] = f"🟢 Di bawah Lower Band (`{last['bb_low']:.2f}`)"
-        analysis['bb_score'] = 1
-    elif last['close'] > last['bb_high']:
-        analysis['bb'] = f"🔴 Di atas Upper Band (`{last['bb_high']:.2f}`)"
-        analysis['bb_score'] = -1
-    else:
-        analysis['bb'] = "⚪ Di dalam Bands"
-        
-    avg_volume = df['volume'].rolling(window=20).mean().iloc[-1]
-    current_volume = last['volume']
-    if current_volume > avg_volume * 1.75:
-        analysis['volume'] = f"🔥 Tinggi (`{current_volume:,.0f}`)"
-    else:
-        analysis['volume'] = f"⚪ Normal (`{current_volume:,.0f}`)"
-    return analysis
-
-def determine_final_signal(analysis: dict, sentiment: dict):
-    score = 0
-    if "Bullish" in analysis['ma']: score += 1
-    if "Bearish" in analysis['ma']: score -= 1
-    if "Golden Cross" in analysis['macd']: score += 2
-    if "Death Cross" in analysis['macd']: score -= 2
-    if "Oversold" in analysis['rsi']: score += 1
-    if "Overbought" in analysis['rsi']: score -= 1
-    score += analysis.get('bb_score', 0)
-    if sentiment.get('status') == 'ok':
-        score += sentiment.get('score', 0)
-    if score >= 2: return "🚨 SINYAL AKSI: BELI (BUY) 🚨"
-    elif score <= -2: return "🚨 SINYAL AKSI: JUAL (SELL) 🚨"
-    else: return "⚠️ SINYAL AKSI: TAHAN (HOLD) ⚠️"
-
 def generate_chart_and_caption(pair: str, timeframe: str):
-    exchange = ccxt.kucoin()
-    ohlcv = exchange.fetch_ohlcv(pair, timeframe=timeframe, limit=200)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    df['ma9'] = ta.trend.sma_indicator(df['close'], window=9)
-    df['ma26'] = ta.trend.sma_indicator(df['close'], window=26)
-    df['rsi'] = ta.momentum.rsi(df['close'], window=14)
-    macd = ta.trend.MACD(df['close'])
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    df['macd_hist'] = macd.macd_diff()
-    bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-    df['bb_high'] = bb.bollinger_hband()
-    df['bb_low'] = bb.bollinger_lband()
-    df.dropna(inplace=True)
-    
-    if len(df) < 2:
+    # Snapshot yang sama dengan /chart di bot (diambil dari /api/analysis bila bot sudah menghitung candle ini)
+    snapshot = analysis.get_snapshot(pair, timeframe)
+    if snapshot is None:
         return None, "Gagal menganalisis, data tidak cukup setelah diproses.", None
 
-    indicator_analysis = analyze_indicators(df)
+    indicator_analysis = snapshot["analysis"]
     symbol = pair.split('/')[0]
-    sentiment_analysis = get_fear_and_greed_index()
-    final_signal = determine_final_signal(indicator_analysis, sentiment_analysis)
-    
-    df_for_plot = df.tail(30)
+    with metrics.stage("fear_greed"):
+        sentiment_analysis = get_fear_and_greed_index()
+    final_signal = analysis.final_signal(snapshot["score"], sentiment_analysis)
     
-    first_price = df_for_plot['close'].iloc[0]
-    last_price = df_for_plot['close'].iloc[-1]
-    change_pct = ((last_price - first_price) / first_price) * 100
-    change_emoji = "📈" if change_pct >= 0 else "📉"
-    change_str = f"{change_emoji} {change_pct:+.2f}%"
+    change_emoji = "📈" if snapshot["change_pct"] >= 0 else "📉"
+    change_str = f"{change_emoji} {snapshot['change_pct']:+.2f}%"
     
-    mc = mpf.make_marketcolors(up='#41a35a', down='#d74a43', wick={'up':'#41a35a','down':'#d74a43'}, volume={'up':'#41a35a','down':'#d74a43'})
-    s = mpf.make_mpf_style(marketcolors=mc, base_mpf_style='nightclouds', gridstyle='-')
-    addplots = [
-        mpf.make_addplot(df_for_plot[['bb_high', 'bb_low']], color='gray', alpha=0.3),
-        mpf.make_addplot(df_for_plot['rsi'], panel=1, color='purple', ylabel='RSI'),
-        mpf.make_addplot(df_for_plot['macd'], panel=2, color='blue', ylabel='MACD'),
-        mpf.make_addplot(df_for_plot['macd_signal'], panel=2, color='orange'),
-        mpf.make_addplot(df_for_plot['macd_hist'].where(df_for_plot['macd_hist'] >= 0, 0), type='bar', panel=2, color='#41a35a'),
-        mpf.make_addplot(df_for_plot['macd_hist'].where(df_for_plot['macd_hist'] < 0, 0), type='bar', panel=2, color='#d74a43')
-    ]
-    
-    harga_terkini = df['close'].iloc[-1]
-    waktu_sekarang = datetime.now(pytz.timezone('Asia/Jakarta')).strftime('%d %b %Y, %H:%M WIB')
-    filename = f'analysis_{pair.replace("/", "")}_{timeframe}.png'
-    mpf.plot(df_for_plot, type='candle', style=s, title=f'Analisis {pair} - Timeframe {timeframe}', ylabel='Harga (USDT)', volume=True, mav=(9, 26), addplot=addplots, panel_ratios=(8, 3, 3), figscale=1.5, savefig=filename)
+    # Harga close candle snapshot, diberi label waktu close candle tersebut (bukan waktu laporan dikirim)
+    harga_close = snapshot["price"]
+    waktu_close = datetime.fromtimestamp(analysis.close_time_ms(snapshot) / 1000, pytz.timezone('Asia/Jakarta')).strftime('%d %b %Y, %H:%M WIB')
+    # Render sekali jalan di proses ini (tanpa pool), gaya & panel sama dengan /chart di main.py
+    with metrics.stage("chart_render"):
+        png = ChartRenderer(workers=0).render(snapshot["plot"], f'Analisis {pair} - Timeframe {timeframe}')
     
     caption = (
         f"📊 **Analisis Terjadwal: {pair} | {timeframe} ({change_str})**\n"
-        f"*(Harga: `${harga_terkini:,.2f}` pada {waktu_sekarang})*\n\n"
+        f"*(Harga close candle {waktu_close}: `${harga_close:,.2f}`)*\n\n"
         f"**Indikator Teknikal:**\n"
         f"1. **Moving Average**: {indicator_analysis['ma']}\n"
         f"2. **RSI**: {indicator_analysis['rsi']}\n"
@@ -164,7 +76,7 @@ def generate_chart_and_caption(pair: str, timeframe: str):
         f"------------------------------------\n"
         f"**{final_signal}**"
     )
-    return filename, caption, symbol
+    return png, caption, symbol
 
 # --- FUNGSI UTAMA ---
 def run_scheduled_job():
@@ -173,33 +85,46 @@ def run_scheduled_job():
         return
 
     print(f"Memulai analisis terjadwal untuk {PAIR_TO_ANALYZE}...")
-    bot = Bot(token=TELEGRAM_TOKEN)
+    # TELEGRAM_CHAT_ID boleh berisi beberapa chat dipisah koma; foto diunggah sekali lalu file_id dipakai ulang
+    chat_ids = [int(chat_id) for chat_id in TELEGRAM_CHAT_ID.split(',') if chat_id.strip()]
+    queue = DeliveryQueue(Bot(token=TELEGRAM_TOKEN))
     
     try:
-        filename, caption, symbol = generate_chart_and_caption(
+        photo_bytes, caption, symbol = generate_chart_and_caption(
             pair=PAIR_TO_ANALYZE,
             timeframe=TIMEFRAME_TO_ANALYZE
         )
         
-        if not filename:
+        if not photo_bytes:
             print(f"Gagal menghasilkan chart: {caption}")
             return
 
-        with open(filename, 'rb') as photo:
-            bot.send_photo(
-                chat_id=int(TELEGRAM_CHAT_ID),
-                photo=photo,
+        photo_key = f"{PAIR_TO_ANALYZE}|{TIMEFRAME_TO_ANALYZE}"
+        futures = [
+            queue.send_photo(
+                chat_id=chat_id,
+                photo=photo_bytes,
+                photo_key=photo_key,
                 caption=caption,
                 parse_mode=ParseMode.MARKDOWN
             )
-        os.remove(filename)
+            for chat_id in chat_ids
+        ]
+        with metrics.stage("delivery_drain"):
+            for future in futures: future.result()
         print("Analisis terjadwal berhasil dikirim.")
 
     except Exception as e:
         print(f"Terjadi kesalahan saat menjalankan tugas terjadwal: {e}")
         error_message = f"Gagal menjalankan analisis terjadwal untuk {PAIR_TO_ANALYZE}.\nError: `{e}`"
-        bot.send_message(chat_id=int(TELEGRAM_CHAT_ID), text=error_message, parse_mode=ParseMode.MARKDOWN)
+        for chat_id in chat_ids:
+            queue.send_message(chat_id=chat_id, text=error_message, parse_mode=ParseMode.MARKDOWN)
+    finally:
+        queue.close()
+        print(queue.summary())
+        print(f"Cache konteks pasar: {market_context.cache_stats()}")
+        print(f"Snapshot analisis: {analysis.stats()}")
+        print(metrics.summary())
 
 if __name__ == "__main__":
-    run_scheduled_job()
-
+    run_scheduled_job()
\ No newline at end of file
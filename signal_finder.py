@@ -1,12 +1,23 @@
 # signal_finder.py
 # Mesin pemindai sinyal hibrida (Sinyal Kualitas Tinggi + Peringatan Dini)
 import os
+import sys
 import requests
-import ccxt
-import pandas as pd
-import ta
 import telegram
+from telegram.utils.request import Request
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import market_data
+import indicators
+import analysis
+import ai_client
+import metrics
+from news import NewsFeed
+from indicator_state import IndicatorSet, IndicatorStateStore
+from subscriptions import SubscriptionIndex
+from delivery import DeliveryQueue, DELIVERY_WORKERS
 
 # --- KONFIGURASI ---
 RAILWAY_URL = os.environ.get("RAILWAY_URL")
@@ -14,6 +25,30 @@ API_SECRET_KEY = os.environ.get("API_SECRET_KEY")
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 CRYPTOCOMPARE_API_KEY = os.environ.get('CRYPTOCOMPARE_API_KEY') 
+# Berita untuk validasi AI: satu request untuk semua kandidat sinyal per pemindaian
+NEWS = NewsFeed(CRYPTOCOMPARE_API_KEY)
+
+# --- KONFIGURASI PEMINDAIAN PARALEL ---
+# Jumlah thread pemindai. Set SCAN_WORKERS=1 untuk mode berurutan.
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 8))
+# Jumlah candle per koin yang dievaluasi pemindai
+SCAN_CANDLE_LIMIT = 100
+# Rate limiter KuCoin global (KUCOIN_RATE_LIMIT req/detik), dipakai bersama oleh market_data
+KUCOIN_LIMITER = market_data.get_limiter("kucoin")
+
+# --- KONFIGURASI MODE DAEMON (python signal_finder.py --daemon) ---
+SCAN_TIMEFRAMES = [tf.strip() for tf in os.environ.get("SCAN_TIMEFRAMES", "4h").split(",") if tf.strip()]
+# Jeda setelah close bar sebelum mengambil data, memberi waktu bursa menutup candle
+DAEMON_CLOSE_GRACE = float(os.environ.get("DAEMON_CLOSE_GRACE", 5))
+INDICATOR_STATE_PATH = os.environ.get("INDICATOR_STATE_PATH", os.path.join("candle_store", "indicator_state.json"))
+# Salinan lokal /api/data terakhir (versi + ETag) agar pemindaian berikutnya cukup mengambil delta
+API_SNAPSHOT_PATH = os.environ.get("API_SNAPSHOT_PATH", os.path.join("candle_store", "api_snapshot.json"))
+
+# --- KONFIGURASI MODE STREAM (python signal_finder.py --stream) ---
+# Tunggu sebentar setelah bar close pertama agar close koin lain ikut dievaluasi dalam satu batch
+STREAM_CLOSE_DEBOUNCE = float(os.environ.get("STREAM_CLOSE_DEBOUNCE", 2))
+# Interval memuat ulang /api/data untuk menyesuaikan langganan stream dengan watchlist terbaru (detik)
+STREAM_WATCHLIST_REFRESH = float(os.environ.get("STREAM_WATCHLIST_REFRESH", 300))
 
 # --- DATABASE PENGATURAN INDIKATOR ---
 OPTIMAL_SETTINGS = {
@@ -28,84 +63,134 @@ SENSITIVE_SETTINGS = {
     "SOL":  {"rsi_ob": 65, "rsi_os": 35, "macd_fast": 9, "macd_slow": 21, "macd_signal": 7},
     "DEFAULT": {"rsi_ob": 65, "rsi_os": 35, "macd_fast": 9, "macd_slow": 21, "macd_signal": 7}
 }
+# Hasil optimizer.py (walk-forward per koin) menimpa/menambah entri tabel di atas; DEFAULT tetap dari sini
+STRATEGY_SETTINGS_PATH = os.environ.get("STRATEGY_SETTINGS_PATH", "strategy_settings.json")
+
+def load_strategy_settings(path: str = STRATEGY_SETTINGS_PATH):
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"Gagal memuat pengaturan strategi dari {path}: {e}")
+        return 0
+    optimal = {coin: settings for coin, settings in data.get("optimal", {}).items() if coin != "DEFAULT"}
+    sensitive = {coin: settings for coin, settings in data.get("sensitive", {}).items() if coin != "DEFAULT"}
+    OPTIMAL_SETTINGS.update(optimal)
+    SENSITIVE_SETTINGS.update(sensitive)
+    print(f"Pengaturan strategi dimuat dari {path} ({data.get('timeframe', '?')}, {data.get('generated_at', '?')}): "
+          f"{len(optimal)} sinyal, {len(sensitive)} peringatan.")
+    return len(optimal) + len(sensitive)
+
+load_strategy_settings()
 
 # --- FUNGSI INTERAKSI DENGAN AI & API ---
-def get_gemini_analysis(prompt: str):
+def get_gemini_analysis(prompt: str, key: str = None):
+    # Jawaban di-cache per sidik jari (ai_client); kuota per jam habis -> None (sinyal tidak dibatalkan)
     if not GEMINI_API_KEY: return None
     try:
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        response = requests.post(api_url, json=payload, timeout=45)
-        response.raise_for_status()
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
+        return ai_client.generate(prompt, key or ai_client.fingerprint(prompt))
     except Exception as e:
         print(f"Error saat berkomunikasi dengan Gemini: {e}")
         return None
 
 def get_news_headlines(symbol: str):
-    url = f"https://min-api.cryptocompare.com/data/v2/news/?lang=EN&categories={symbol.upper()}&api_key={CRYPTOCOMPARE_API_KEY}"
+    # (semua judul terkini, judul yang belum ada pada pemindaian sebelumnya); cache & batch di news.NewsFeed
+    return NEWS.headlines(symbol), set(NEWS.new_headlines(symbol))
+
+def _load_api_snapshot():
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return [news['title'] for news in response.json()['Data'][:5]]
-    except Exception as e:
-        print(f"Gagal mengambil berita untuk AI: {e}")
-        return []
+        with open(API_SNAPSHOT_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_api_snapshot(snapshot: dict):
+    directory = os.path.dirname(API_SNAPSHOT_PATH)
+    if directory: os.makedirs(directory, exist_ok=True)
+    tmp_path = API_SNAPSHOT_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, API_SNAPSHOT_PATH)
 
 def get_api_data():
+    # Permintaan bersyarat: 304 jika tidak ada perubahan, delta (since=versi) jika ada, body gzip dari server
+    snapshot = _load_api_snapshot()
     try:
         base_url = RAILWAY_URL
         if not base_url.startswith(('http://', 'https://')): base_url = 'https://' + base_url
         url = f"{base_url}/api/data?secret={API_SECRET_KEY}"
-        response = requests.get(url, timeout=20)
+        headers = {"Accept-Encoding": "gzip"}
+        if snapshot:
+            url += f"&since={snapshot['version']}"
+            if snapshot.get("etag"): headers["If-None-Match"] = snapshot["etag"]
+        with metrics.stage("api_data"):
+            response = requests.get(url, headers=headers, timeout=20)
+        if response.status_code == 304 and snapshot:
+            print(f"Data pengguna tidak berubah (versi {snapshot['version']}).")
+            return {"users": snapshot["users"], "core_watchlist": snapshot["core_watchlist"], "version": snapshot["version"]}
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        users = data["users"]
+        if data.get("delta") and snapshot:
+            users = dict(snapshot["users"], **users)
+            print(f"Delta data pengguna: {len(data['users'])} pengguna berubah sejak versi {snapshot['version']}.")
+        snapshot = {"version": data.get("version", 0), "etag": response.headers.get("ETag"),
+                    "users": users, "core_watchlist": data["core_watchlist"]}
+        try: _save_api_snapshot(snapshot)
+        except OSError as e: print(f"Gagal menyimpan snapshot data pengguna: {e}")
+        return {"users": users, "core_watchlist": data["core_watchlist"], "version": snapshot["version"]}
     except Exception as e:
+        metrics.error("railway")
         print(f"Gagal mengambil data dari Railway: {e}")
+        if snapshot:
+            print(f"Memakai snapshot data pengguna terakhir (versi {snapshot['version']}).")
+            return {"users": snapshot["users"], "core_watchlist": snapshot["core_watchlist"], "version": snapshot["version"]}
         return None
 
-def calculate_indicators(df, settings, sensitive=False):
-    if sensitive:
-        df['rsi'] = ta.momentum.rsi(df['close'], window=14)
-        macd = ta.trend.MACD(df['close'], window_fast=settings['macd_fast'], window_slow=settings['macd_slow'], window_sign=settings['macd_signal'])
-    else:
-        df['ema_fast'] = ta.trend.ema_indicator(df['close'], window=settings['ema_fast'])
-        df['ema_slow'] = ta.trend.ema_indicator(df['close'], window=settings['ema_slow'])
-        df['rsi'] = ta.momentum.rsi(df['close'], window=settings['rsi_period'])
-        macd = ta.trend.MACD(df['close'], window_fast=settings['macd_fast'], window_slow=settings['macd_slow'], window_sign=settings['macd_signal'])
-    
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    df.dropna(inplace=True)
-    return df
+def calculate_indicators(candles, settings, sensitive=False):
+    # Versi satu simbol dari mesin batch (indicators.compute_batch) langsung dari view close CandleBuffer
+    return indicators.compute_batch(candles.close, [settings], sensitive=sensitive)
 
 # --- FUNGSI STRATEGI ---
-def check_signal(symbol: str, timeframe: str = '4h'):
-    try:
-        settings = OPTIMAL_SETTINGS.get(symbol, OPTIMAL_SETTINGS["DEFAULT"])
-        exchange = ccxt.kucoin()
-        ohlcv = exchange.fetch_ohlcv(f"{symbol}/USDT", timeframe, limit=100)
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df = calculate_indicators(df, settings)
-        if len(df) < 3: return None, None
+def signal_rule(last, prev, settings):
+    is_uptrend = last['close'] > last['ema_slow'] and last['ema_fast'] > last['ema_slow']
+    rsi_pullback = prev['rsi'] < settings['rsi_os'] and last['rsi'] > settings['rsi_os']
+    macd_buy_confirm = prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']
 
-        last, prev = df.iloc[-1], df.iloc[-2]
+    if is_uptrend and rsi_pullback and macd_buy_confirm:
+        return "BUY"
 
-        is_uptrend = last['close'] > last['ema_slow'] and last['ema_fast'] > last['ema_slow']
-        rsi_pullback = prev['rsi'] < settings['rsi_os'] and last['rsi'] > settings['rsi_os']
-        macd_buy_confirm = prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']
+    is_downtrend = last['close'] < last['ema_slow'] and last['ema_fast'] < last['ema_slow']
+    rsi_rally_fail = prev['rsi'] > settings['rsi_ob'] and last['rsi'] < settings['rsi_ob']
+    macd_sell_confirm = prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']
 
-        if is_uptrend and rsi_pullback and macd_buy_confirm:
-            return "BUY", df
+    if is_downtrend and rsi_rally_fail and macd_sell_confirm:
+        return "SELL"
+    return None
 
-        is_downtrend = last['close'] < last['ema_slow'] and last['ema_fast'] < last['ema_slow']
-        rsi_rally_fail = prev['rsi'] > settings['rsi_ob'] and last['rsi'] < settings['rsi_ob']
-        macd_sell_confirm = prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']
+def alert_rule(last, prev, settings):
+    rsi_buy_alert = last['rsi'] < settings['rsi_os']
+    macd_buy_alert = prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']
+    if rsi_buy_alert and macd_buy_alert:
+        return "BUY_ALERT"
 
-        if is_downtrend and rsi_rally_fail and macd_sell_confirm:
-            return "SELL", df
+    rsi_sell_alert = last['rsi'] > settings['rsi_ob']
+    macd_sell_alert = prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']
+    if rsi_sell_alert and macd_sell_alert:
+        return "SELL_ALERT"
+    return None
 
-        return None, None
+def check_signal(symbol: str, timeframe: str = '4h'):
+    try:
+        settings = OPTIMAL_SETTINGS.get(symbol, OPTIMAL_SETTINGS["DEFAULT"])
+        candles = market_data.fetch_buffer(f"{symbol}/USDT", timeframe, limit=100)
+        batch = calculate_indicators(candles, settings)
+        if indicators.valid_bars(batch, 0) < 3: return None, None
+
+        signal_type = signal_rule(indicators.bar(batch, 0, -1), indicators.bar(batch, 0, -2), settings)
+        return (signal_type, batch) if signal_type else (None, None)
     except Exception as e:
         print(f"Error saat mengecek Sinyal untuk {symbol}: {e}")
         return None, None
@@ -113,99 +198,404 @@ def check_signal(symbol: str, timeframe: str = '4h'):
 def check_alert(symbol: str, timeframe: str = '4h'):
     try:
         settings = SENSITIVE_SETTINGS.get(symbol, SENSITIVE_SETTINGS["DEFAULT"])
-        exchange = ccxt.kucoin()
-        ohlcv = exchange.fetch_ohlcv(f"{symbol}/USDT", timeframe, limit=100)
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df = calculate_indicators(df, settings, sensitive=True)
-        if len(df) < 3: return None
-
-        last, prev = df.iloc[-1], df.iloc[-2]
-
-        rsi_buy_alert = last['rsi'] < settings['rsi_os']
-        macd_buy_alert = prev['macd'] < prev['macd_signal'] and last['macd'] > last['macd_signal']
-        if rsi_buy_alert and macd_buy_alert:
-            return "BUY_ALERT"
-
-        rsi_sell_alert = last['rsi'] > settings['rsi_ob']
-        macd_sell_alert = prev['macd'] > prev['macd_signal'] and last['macd'] < last['macd_signal']
-        if rsi_sell_alert and macd_sell_alert:
-            return "SELL_ALERT"
-            
-        return None
+        candles = market_data.fetch_buffer(f"{symbol}/USDT", timeframe, limit=100)
+        batch = calculate_indicators(candles, settings, sensitive=True)
+        if indicators.valid_bars(batch, 0) < 3: return None
+        return alert_rule(indicators.bar(batch, 0, -1), indicators.bar(batch, 0, -2), settings)
     except Exception as e:
         print(f"Error saat mengecek Peringatan untuk {symbol}: {e}")
         return None
 
+def evaluate_coins(coins, candles):
+    # Semua koin dihitung dalam satu lintasan vektor, lalu aturan strategi dicek per baris
+    closes = indicators.stack_closes([candles[coin] for coin in coins])
+    optimal = [OPTIMAL_SETTINGS.get(coin, OPTIMAL_SETTINGS["DEFAULT"]) for coin in coins]
+    sensitive = [SENSITIVE_SETTINGS.get(coin, SENSITIVE_SETTINGS["DEFAULT"]) for coin in coins]
+    signal_batch = indicators.compute_batch(closes, optimal)
+    alert_batch = indicators.compute_batch(closes, sensitive, sensitive=True)
+
+    results = {}
+    for row, coin in enumerate(coins):
+        signal_type = alert_type = None
+        if indicators.valid_bars(signal_batch, row) >= 3:
+            signal_type = signal_rule(indicators.bar(signal_batch, row, -1), indicators.bar(signal_batch, row, -2), optimal[row])
+        if indicators.valid_bars(alert_batch, row) >= 3:
+            alert_type = alert_rule(indicators.bar(alert_batch, row, -1), indicators.bar(alert_batch, row, -2), sensitive[row])
+        results[coin] = {"signal": signal_type, "alert": alert_type, "price": closes[row, -1]}
+    return results
+
+# --- FUNGSI PEMINDAIAN ---
+def fetch_candles(coin: str, timeframe: str = '4h', ttl: float = None):
+    started = time.perf_counter()
+    try:
+        with metrics.stage("fetch_candles"):
+            ohlcv = market_data.fetch_ohlcv(f"{coin}/USDT", timeframe, limit=SCAN_CANDLE_LIMIT, ttl=ttl)
+    except Exception as e:
+        print(f"Gagal mengambil candle untuk {coin}: {e}")
+        ohlcv = None
+    return ohlcv, time.perf_counter() - started
+
+def validate_signal(coin: str, signal_type: str):
+    # Validasi sentimen berita lewat AI; mengembalikan (lolos, latensi)
+    started = time.perf_counter()
+    news_headlines, fresh = get_news_headlines(coin)
+    news_context = "Tidak ada berita terbaru."
+    if news_headlines: news_context = "Berita terbaru:\n- " + "\n- ".join(f"[BARU] {title}" if title in fresh else title for title in news_headlines)
+
+    prompt_sentiment = f"Saya menemukan sinyal teknikal {signal_type} untuk {coin}. {news_context}. Berdasarkan berita ini, apakah sentimen pasar mendukung sinyal ini? Jawab 'YA' atau 'TIDAK'."
+    with metrics.stage("ai_validation"):
+        validation = get_gemini_analysis(prompt_sentiment, ai_client.fingerprint("validate", coin, signal_type, sorted(news_headlines)))
+
+    NEWS.mark_seen(coin)
+    if validation and "TIDAK" in validation.upper():
+        print(f"AI membatalkan sinyal {signal_type} untuk {coin} karena sentimen berita.")
+        return False, time.perf_counter() - started
+    return True, time.perf_counter() - started
+
+class ScanStats:
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._throttled_start = limiter.throttled
+        self._started = time.perf_counter()
+        self.coin_latency = {}
+        self.indicator_time = 0.0
+        self.wall_time = None
+
+    def record(self, coin, latency):
+        self.coin_latency[coin] = latency
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._started
+        return self
+
+    @property
+    def throttled(self):
+        return self._limiter.throttled - self._throttled_start
+
+    def summary(self):
+        latencies = sorted(self.coin_latency.values())
+        text = f"Statistik scan: {len(latencies)} koin dalam {self.wall_time:.2f} detik, {self.throttled} request tertahan rate limit, indikator {self.indicator_time * 1000:.1f} ms."
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            slowest = max(self.coin_latency, key=self.coin_latency.get)
+            text += f" Latensi per koin: rata-rata {sum(latencies) / len(latencies):.2f}s, p95 {p95:.2f}s, terlama {slowest} ({self.coin_latency[slowest]:.2f}s)."
+        return text
+
+def run_parallel(func, items, workers: int = SCAN_WORKERS):
+    # Menjalankan func(item) di thread pool terbatas; hasil dikembalikan sebagai dict item -> hasil
+    if workers <= 1:
+        return {item: func(item) for item in items}
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                print(f"Error saat memindai {item}: {e}")
+    return results
+
+def scan_coins(coins, workers: int = SCAN_WORKERS):
+    stats = ScanStats(KUCOIN_LIMITER)
+
+    # 1. Ambil candle semua koin secara paralel (dibatasi rate limiter global)
+    fetched = run_parallel(fetch_candles, coins, workers)
+    candles = {}
+    for coin, (ohlcv, latency) in fetched.items():
+        stats.record(coin, latency)
+        if ohlcv: candles[coin] = ohlcv
+    coins_ok = [coin for coin in coins if coin in candles]
+
+    # 2. Hitung indikator semua koin sekaligus
+    started = time.perf_counter()
+    with metrics.stage("indicators"):
+        evaluated = evaluate_coins(coins_ok, candles) if coins_ok else {}
+    stats.indicator_time = time.perf_counter() - started
+
+    # 3. Validasi berita + AI hanya untuk kandidat sinyal, juga paralel
+    candidates = [coin for coin in coins_ok if evaluated[coin]["signal"]]
+    if candidates:
+        with metrics.stage("news"): NEWS.prefetch(candidates)
+    validated = run_parallel(lambda coin: validate_signal(coin, evaluated[coin]["signal"]), candidates, workers)
+
+    results = []
+    for coin in coins_ok:
+        res = dict(evaluated[coin], coin=coin)
+        if coin in candidates:
+            passed, latency = validated.get(coin, (False, 0.0))
+            stats.record(coin, stats.coin_latency[coin] + latency)
+            if not passed: res["signal"] = None
+        results.append(res)
+    return results, stats.finish()
+
+# --- FUNGSI PENGIRIMAN ---
+def create_bot():
+    # Pool koneksi cukup besar untuk semua worker pengiriman
+    return telegram.Bot(token=TELEGRAM_TOKEN, request=Request(con_pool_size=DELIVERY_WORKERS + 4))
+
+def collect_coins(user_data: dict, core_watchlist: list):
+    # Gabungkan semua watchlist menjadi satu set unik untuk dipindai
+    coins_to_scan = set(core_watchlist)
+    for user_id, data in user_data.items():
+        for coin in data.get("watchlist", []):
+            coins_to_scan.add(coin)
+    return coins_to_scan
+
+def _log_delivery(future, ok_text: str, fail_text: str):
+    error = future.exception()
+    print(f"{fail_text}: {error}" if error else ok_text)
+
+def technical_summary(coin: str, timeframe: str, now_ms: int = None):
+    # Baris ringkasan dari snapshot analisis bersama (sama dengan yang dipakai /chart & laporan terjadwal)
+    try:
+        snapshot = analysis.get_snapshot(f"{coin}/USDT", timeframe, now_ms)
+    except Exception as e:
+        print(f"Gagal mengambil snapshot analisis {coin} {timeframe}: {e}")
+        return ""
+    return f"\n📊 **Teknikal**: {analysis.short_summary(snapshot)}" if snapshot else ""
+
+def notify_results(queue: DeliveryQueue, results, index: SubscriptionIndex, timeframe: str = '4h', now_ms: int = None):
+    # Pesan dimasukkan ke antrian pengiriman; worker-nya yang mengatur batas laju & retry
+    for res in results:
+        coin = res["coin"]
+        signal_type = res["signal"]
+        alert_type = res["alert"]
+        signal_users = sorted(index.subscribers(coin, "pullback_buy" if signal_type == "BUY" else "breakdown_sell", "signal")) if signal_type else []
+        alert_users = sorted(index.subscribers(coin, "pullback_buy" if "BUY" in alert_type else "breakdown_sell", "alert")) if alert_type else []
+        # Snapshot dihitung sekali per koin & candle, hanya bila ada penerima
+        summary = technical_summary(coin, timeframe, now_ms) if signal_users or alert_users else ""
+        if signal_type:
+            harga_saat_ini = res["price"]
+            message_header = f"🎯 **SINYAL DITEMUKAN: Potensi {signal_type}**\n\n📈 **Aset**: `{coin}` (Timeframe: {timeframe})\n💰 **Harga**: `${harga_saat_ini:,.2f}`{summary}"
+            
+            for user_id in signal_users:
+                future = queue.send_message(chat_id=int(user_id), text=message_header, parse_mode='Markdown')
+                ok_text, fail_text = f">>> Sinyal {signal_type} terkirim ke {user_id} untuk {coin}!", f"Gagal mengirim sinyal ke {user_id}"
+                future.add_done_callback(lambda f, ok=ok_text, fail=fail_text: _log_delivery(f, ok, fail))
+
+        if alert_type:
+            direction = "BULLISH" if "BUY" in alert_type else "BEARISH"
+            message_alert = f"🔔 **PERINGATAN DINI: Potensi Pergerakan {direction}**\n\n**Aset**: `{coin}` (Timeframe: {timeframe}){summary}\n\n_Parameter sensitif mendeteksi momentum awal. Harap pantau lebih lanjut._"
+            
+            for user_id in alert_users:
+                future = queue.send_message(chat_id=int(user_id), text=message_alert, parse_mode='Markdown')
+                ok_text, fail_text = f">>> Peringatan {direction} terkirim ke {user_id} untuk {coin}!", f"Gagal mengirim peringatan ke {user_id}"
+                future.add_done_callback(lambda f, ok=ok_text, fail=fail_text: _log_delivery(f, ok, fail))
+
 # --- FUNGSI MAIN ---
 def main():
     print("Memulai pemindai sinyal hibrida...")
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
+    queue = DeliveryQueue(create_bot())
     api_data = get_api_data()
     
     if not api_data:
         print("Gagal memuat data. Keluar.")
+        queue.close()
         return
 
     user_data = api_data.get("users", {})
     core_watchlist = api_data.get("core_watchlist", [])
-
-    # Gabungkan semua watchlist menjadi satu set unik untuk dipindai
-    coins_to_scan = set(core_watchlist)
-    for user_id, data in user_data.items():
-        for coin in data.get("watchlist", []):
-            coins_to_scan.add(coin)
+    coins_to_scan = collect_coins(user_data, core_watchlist)
 
     if not coins_to_scan:
         print("Tidak ada koin untuk dipindai. Selesai.")
+        queue.close()
         return
     
-    print(f"Memindai koin: {list(coins_to_scan)}")
+    print(f"Memindai koin: {list(coins_to_scan)} ({SCAN_WORKERS} worker)")
+    with metrics.stage("scan"):
+        results, stats = scan_coins(sorted(coins_to_scan))
+    index = SubscriptionIndex()
+    index.sync(user_data, core_watchlist)
+    notify_results(queue, results, index)
+    with metrics.stage("delivery_drain"): queue.close()
 
-    for coin in coins_to_scan:
-        # 1. Cek Sinyal Kualitas Tinggi
-        signal_type, df = check_signal(coin)
-        if signal_type:
-            news_headlines = get_news_headlines(coin)
-            news_context = "Tidak ada berita signifikan."
-            if news_headlines: news_context = "Berita terbaru:\n- " + "\n- ".join(news_headlines)
-            
-            prompt_sentiment = f"Saya menemukan sinyal teknikal {signal_type} untuk {coin}. {news_context}. Berdasarkan berita ini, apakah sentimen pasar mendukung sinyal ini? Jawab 'YA' atau 'TIDAK'."
-            validation = get_gemini_analysis(prompt_sentiment)
+    print(stats.summary())
+    print(queue.summary())
+    print(f"Cache candle: {market_data.cache_stats()}")
+    print(f"Cache AI: {ai_client.stats()}")
+    print(f"Snapshot analisis: {analysis.stats()}")
+    print(f"Berita: {NEWS.stats()}")
+    print(metrics.summary())
+    NEWS.save()
+    print("Pemindai sinyal selesai.")
 
-            if validation and "TIDAK" in validation.upper():
-                print(f"AI membatalkan sinyal {signal_type} untuk {coin} karena sentimen berita.")
-                continue
+# --- MODE DAEMON ---
+class SystemClock:
+    def time(self):
+        return time.time()
 
-            harga_saat_ini = df['close'].iloc[-1]
-            message_header = f"🎯 **SINYAL DITEMUKAN: Potensi {signal_type}**\n\n📈 **Aset**: `{coin}` (Timeframe: 4h)\n💰 **Harga**: `${harga_saat_ini:,.2f}`"
-            
-            for user_id, data in user_data.items():
-                is_in_watchlist = coin in data.get("watchlist", []) or coin in core_watchlist
-                strategy_name = "pullback_buy" if signal_type == "BUY" else "breakdown_sell"
-                if is_in_watchlist and data.get("strategies", {}).get(strategy_name, {}).get("signal_on", False):
-                    try:
-                        bot.send_message(chat_id=int(user_id), text=message_header, parse_mode='Markdown')
-                        print(f">>> Sinyal {signal_type} terkirim ke {user_id} untuk {coin}!")
-                    except Exception as e:
-                        print(f"Gagal mengirim sinyal ke {user_id}: {e}")
-
-        # 2. Cek Peringatan Dini
-        alert_type = check_alert(coin)
-        if alert_type:
-            direction = "BULLISH" if "BUY" in alert_type else "BEARISH"
-            message_alert = f"🔔 **PERINGATAN DINI: Potensi Pergerakan {direction}**\n\n**Aset**: `{coin}` (Timeframe: 4h)\n\n_Parameter sensitif mendeteksi momentum awal. Harap pantau lebih lanjut._"
-            
-            for user_id, data in user_data.items():
-                is_in_watchlist = coin in data.get("watchlist", []) or coin in core_watchlist
-                strategy_name = "pullback_buy" if "BUY" in alert_type else "breakdown_sell"
-                if is_in_watchlist and data.get("strategies", {}).get(strategy_name, {}).get("alert_on", False):
-                    try:
-                        bot.send_message(chat_id=int(user_id), text=message_alert, parse_mode='Markdown')
-                        print(f">>> Peringatan {direction} terkirim ke {user_id} untuk {coin}!")
-                    except Exception as e:
-                        print(f"Gagal mengirim peringatan ke {user_id}: {e}")
+    def sleep(self, seconds: float):
+        if seconds > 0: time.sleep(seconds)
 
-    print("Pemindai sinyal selesai.")
+def evaluate_closed(store: IndicatorStateStore, coin: str, timeframe: str, ohlcv, now_ms: int):
+    # Evaluasi strategi hanya pada bar yang sudah close; None jika bar close terakhir belum berubah
+    closed = market_data.closed_bars(ohlcv, timeframe, now_ms)
+    if not closed: return None
+    optimal = OPTIMAL_SETTINGS.get(coin, OPTIMAL_SETTINGS["DEFAULT"])
+    sensitive = SENSITIVE_SETTINGS.get(coin, SENSITIVE_SETTINGS["DEFAULT"])
+    key = f"kucoin|{coin}/USDT|{timeframe}"
+    signal_state = store.get(f"{key}|signal")
+    if signal_state is not None and signal_state.last_ts == closed[-1][0]:
+        return None
+
+    signal_state = store.advance_closed(f"{key}|signal", closed, lambda: IndicatorSet.for_strategy(optimal))
+    alert_state = store.advance_closed(f"{key}|alert", closed, lambda: IndicatorSet.for_strategy(sensitive, sensitive=True))
+    ready = lambda state: all(values and None not in values.values() for values in (state.prev_values, state.last_values))
+    signal_type = signal_rule(signal_state.last_values, signal_state.prev_values, optimal) if ready(signal_state) else None
+    alert_type = alert_rule(alert_state.last_values, alert_state.prev_values, sensitive) if ready(alert_state) else None
+    return {"coin": coin, "signal": signal_type, "alert": alert_type, "price": closed[-1][4]}
+
+def evaluate_timeframe(queue: DeliveryQueue, store: IndicatorStateStore, index: SubscriptionIndex, timeframe: str, coins, now_ms: int,
+                       ttl: float = None, notify: bool = True, label: str = "Daemon"):
+    # Evaluasi bar close baru untuk koin-koin ini, validasi kandidat sinyal, lalu antrekan notifikasinya
+    started = time.perf_counter()
+    fetched = run_parallel(lambda coin: fetch_candles(coin, timeframe, ttl=ttl), coins)
+    results = []
+    for coin in coins:
+        ohlcv, _ = fetched.get(coin, (None, 0.0))
+        if not ohlcv: continue
+        with metrics.stage("indicators"):
+            res = evaluate_closed(store, coin, timeframe, ohlcv, now_ms)
+        if res: results.append(res)
+
+    candidates = [res for res in results if res["signal"]]
+    if notify and candidates:
+        pending = {res["coin"]: res["signal"] for res in candidates}
+        with metrics.stage("news"): NEWS.prefetch(pending)
+        validated = run_parallel(lambda coin: validate_signal(coin, pending[coin]), list(pending))
+        for res in candidates:
+            if not validated.get(res["coin"], (False, 0.0))[0]: res["signal"] = None
+    if notify:
+        notify_results(queue, results, index, timeframe, now_ms)
+    print(f"{label} {timeframe}: {len(results)}/{len(coins)} koin punya bar close baru, {time.perf_counter() - started:.2f} detik.")
+    return results
+
+def run_daemon_cycle(queue: DeliveryQueue, store: IndicatorStateStore, index: SubscriptionIndex, timeframes, clock, notify: bool = True):
+    cycle_metrics = metrics.snapshot()
+    api_data = get_api_data()
+    if not api_data:
+        print("Gagal memuat data. Siklus dilewati.")
+        return
+    user_data = api_data.get("users", {})
+    core_watchlist = api_data.get("core_watchlist", [])
+    coins = sorted(collect_coins(user_data, core_watchlist))
+    changed = index.sync(user_data, core_watchlist)
+    if changed: print(f"Indeks langganan diperbarui untuk {changed} pengguna.")
+    now_ms = int(clock.time() * 1000)
+
+    # Timeframe terbesar dulu: candle dasar diperbarui sekali per siklus dengan riwayat terpanjang,
+    # timeframe berikutnya dirangkum dari cache yang sama tanpa request tambahan
+    for i, timeframe in enumerate(sorted(timeframes, key=market_data.timeframe_ms, reverse=True)):
+        evaluate_timeframe(queue, store, index, timeframe, coins, now_ms, ttl=0 if i == 0 else None, notify=notify)
+    store.save()
+    NEWS.save()
+    with metrics.stage("delivery_drain"): queue.join()
+    if notify: print(queue.summary())
+    print(metrics.summary(since=cycle_metrics))
+
+def run_daemon(timeframes=None, clock=None, max_cycles: int = None, bot=None):
+    # Tetap berjalan: bangun tepat setelah close bar tiap timeframe dan hanya mengevaluasi koin yang barnya berubah
+    timeframes = timeframes or SCAN_TIMEFRAMES
+    clock = clock or SystemClock()
+    queue = DeliveryQueue(bot or create_bot())
+    store = IndicatorStateStore(INDICATOR_STATE_PATH)
+    index = SubscriptionIndex()
+    print(f"Daemon pemindai berjalan untuk timeframe {timeframes}...")
+
+    # Siklus pertama hanya memanaskan state agar sinyal bar lama tidak dikirim ulang
+    due_timeframes, notify, cycles = list(timeframes), False, 0
+    while max_cycles is None or cycles < max_cycles:
+        try:
+            run_daemon_cycle(queue, store, index, due_timeframes, clock, notify=notify)
+        except Exception as e:
+            print(f"Error di siklus daemon: {e}")
+        cycles += 1
+        notify = True
+
+        now_ms = int(clock.time() * 1000)
+        closes = {tf: market_data.next_close_ms(now_ms, tf) for tf in timeframes}
+        wake_ms = min(closes.values())
+        clock.sleep((wake_ms - now_ms) / 1000 + DAEMON_CLOSE_GRACE)
+        due_timeframes = [tf for tf, close_ms in closes.items() if close_ms == wake_ms]
+
+def run_stream(timeframes=None, bot=None, api_url: str = None, max_batches: int = None):
+    # Seperti daemon, tetapi bar close datang dari WebSocket KuCoin (stream.py), bukan dari jadwal + polling REST
+    import stream
+    timeframes = timeframes or SCAN_TIMEFRAMES
+    queue = DeliveryQueue(bot or create_bot())
+    store = IndicatorStateStore(INDICATOR_STATE_PATH)
+    index = SubscriptionIndex()
+    api_data = get_api_data()
+    if not api_data:
+        print("Gagal memuat data. Mode stream dibatalkan.")
+        return
+    user_data, core_watchlist = api_data.get("users", {}), api_data.get("core_watchlist", [])
+    coins = sorted(collect_coins(user_data, core_watchlist))
+    index.sync(user_data, core_watchlist)
+
+    pending, lock, wake = {}, threading.Lock(), threading.Event()
+    def on_close(pair: str, timeframe: str, bar_start_ms: int):
+        if timeframe not in timeframes: return
+        with lock: pending.setdefault(timeframe, set()).add(pair.split('/')[0])
+        wake.set()
+
+    # Riwayat dasar yang cukup untuk merangkum SCAN_CANDLE_LIMIT bar di timeframe terbesar
+    base = market_data.BASE_TIMEFRAME or min(timeframes, key=market_data.timeframe_ms)
+    seed_bars = max((SCAN_CANDLE_LIMIT + 1) * market_data.timeframe_ms(tf) // market_data.timeframe_ms(base) for tf in timeframes)
+    feed = stream.MarketStream([f"{coin}/USDT" for coin in coins], timeframes, on_close=on_close, base_timeframe=base,
+                               seed_bars=max(seed_bars, stream.STREAM_SEED_BARS), api_url=api_url or stream.KUCOIN_API_URL).start()
+    metrics.register_stats("stream", feed.stats)
+    print(f"Mode stream berjalan untuk timeframe {timeframes}, {len(coins)} koin...")
+    if not feed.wait_ready(120): print("Riwayat awal stream belum lengkap, pemanasan memakai REST.")
+
+    # Pemanasan tanpa notifikasi agar sinyal bar lama tidak dikirim ulang
+    now_ms = int(time.time() * 1000)
+    for timeframe in sorted(timeframes, key=market_data.timeframe_ms, reverse=True):
+        evaluate_timeframe(queue, store, index, timeframe, coins, now_ms, notify=False, label="Stream")
+    store.save()
+
+    batches, refreshed_at = 0, time.monotonic()
+    try:
+        while max_batches is None or batches < max_batches:
+            if wake.wait(STREAM_WATCHLIST_REFRESH):
+                time.sleep(STREAM_CLOSE_DEBOUNCE)
+                with lock:
+                    due = {tf: sorted(due_coins) for tf, due_coins in pending.items()}
+                    pending.clear()
+                    wake.clear()
+                if due:
+                    batch_metrics = metrics.snapshot()
+                    now_ms = int(time.time() * 1000)
+                    for timeframe in sorted(due, key=market_data.timeframe_ms, reverse=True):
+                        try:
+                            evaluate_timeframe(queue, store, index, timeframe, due[timeframe], now_ms, label="Stream")
+                        except Exception as e:
+                            print(f"Error evaluasi stream {timeframe}: {e}")
+                    store.save()
+                    NEWS.save()
+                    with metrics.stage("delivery_drain"): queue.join()
+                    print(queue.summary())
+                    print(metrics.summary(since=batch_metrics))
+                    batches += 1
+            if time.monotonic() - refreshed_at >= STREAM_WATCHLIST_REFRESH:
+                refreshed_at = time.monotonic()
+                api_data = get_api_data()
+                if not api_data: continue
+                user_data, core_watchlist = api_data.get("users", {}), api_data.get("core_watchlist", [])
+                changed = index.sync(user_data, core_watchlist)
+                if changed: print(f"Indeks langganan diperbarui untuk {changed} pengguna.")
+                feed.set_pairs(f"{coin}/USDT" for coin in collect_coins(user_data, core_watchlist))
+    finally:
+        feed.stop()
+        store.save()
+        NEWS.save()
 
 if __name__ == "__main__":
-    main()
+    if "--daemon" in sys.argv:
+        run_daemon()
+    elif "--stream" in sys.argv:
+        run_stream()
+    else:
+        main()
@@ -0,0 +1,239 @@
+# stream.py
+# Ingesti WebSocket publik KuCoin: kline timeframe dasar + ticker untuk semua simbol watchlist gabungan.
+# Setiap update langsung memperbarui cache candle di market_data (fetch_ohlcv tidak perlu polling REST selama
+# stream hidup) dan bar close memicu callback evaluasi strategi, termasuk timeframe besar yang dirangkum dari
+# timeframe dasar. Koneksi putus -> sambung ulang dengan backoff, subscribe ulang, dan gap ditambal lewat REST.
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+import aiohttp
+import market_data
+import metrics
+
+# --- KONFIGURASI ---
+# Ganti ke URL server replay lokal (fakes.ReplayServer) untuk pengujian tanpa jaringan
+KUCOIN_API_URL = os.environ.get("KUCOIN_API_URL", "https://api.kucoin.com")
+# KuCoin: maks. 100 simbol per pesan subscribe
+STREAM_SYMBOLS_PER_SUBSCRIBE = 100
+STREAM_RECONNECT_MAX = float(os.environ.get("STREAM_RECONNECT_MAX", 60))
+# Bar dasar yang diisi lewat REST saat (re)connect, sebelum update stream diterapkan
+STREAM_SEED_BARS = int(os.environ.get("STREAM_SEED_BARS", 500))
+# Simpan pesan mentah (JSON per baris) untuk diputar ulang fakes.ReplayServer; kosong = tidak merekam
+STREAM_RECORD_PATH = os.environ.get("STREAM_RECORD_PATH", "")
+KLINE_TYPES = {"1m": "1min", "3m": "3min", "5m": "5min", "15m": "15min", "30m": "30min", "1h": "1hour", "2h": "2hour",
+               "4h": "4hour", "6h": "6hour", "8h": "8hour", "12h": "12hour", "1d": "1day", "1w": "1week"}
+
+
+def market_id(pair: str):
+    return pair.replace('/', '-')
+
+def parse_kline(values):
+    # KuCoin: [waktu mulai (detik), open, close, high, low, volume, turnover] -> format ccxt [ms, o, h, l, c, v]
+    start, open_, close, high, low, volume = values[:6]
+    return [int(start) * 1000, float(open_), float(high), float(low), float(close), float(volume)]
+
+
+class MarketStream:
+    # on_close(pair, timeframe, bar_start_ms) dipanggil dari thread stream untuk setiap bar yang close di
+    # base_timeframe dan di setiap timeframe pada `timeframes` yang batasnya ikut tertutup.
+    def __init__(self, pairs, timeframes=(), on_close=None, on_ticker=None, base_timeframe: str = None,
+                 seed_bars: int = STREAM_SEED_BARS, api_url: str = KUCOIN_API_URL, record_path: str = STREAM_RECORD_PATH):
+        self.base_timeframe = base_timeframe or market_data.BASE_TIMEFRAME or min(timeframes, key=market_data.timeframe_ms)
+        if self.base_timeframe not in KLINE_TYPES: raise ValueError(f"Timeframe stream tidak didukung: {self.base_timeframe}")
+        self.timeframes = [tf for tf in timeframes if tf != self.base_timeframe]
+        self.on_close = on_close
+        self.on_ticker = on_ticker
+        self.seed_bars = seed_bars
+        self.api_url = api_url.rstrip('/')
+        self.record_path = record_path
+        self.pairs = set(pairs)
+        self.prices = {}
+        self._ids = itertools.count(1)
+        self._loop = None
+        self._ws = None
+        self._thread = None
+        self._stopping = False
+        self._connected = threading.Event()
+        # Diset setelah riwayat awal semua pasangan terisi lewat REST (aman untuk mulai evaluasi)
+        self._ready = threading.Event()
+        self._last_pong = 0.0
+        self._backoff = 1.0
+        self._stats = {"connects": 0, "reconnects": 0, "messages": 0, "klines": 0, "tickers": 0, "bar_closes": 0, "errors": 0}
+
+    # --- API PUBLIK ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run_loop, name="market-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10):
+        self._stopping = True
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+        if self._thread is not None: self._thread.join(timeout)
+
+    def wait_connected(self, timeout: float = None):
+        return self._connected.wait(timeout)
+
+    def wait_ready(self, timeout: float = None):
+        return self._ready.wait(timeout)
+
+    def set_pairs(self, pairs):
+        # Dipanggil dari thread mana pun saat watchlist berubah; selisihnya di-subscribe/unsubscribe
+        pairs = set(pairs)
+        if self._loop is None:
+            self.pairs = pairs
+            return
+        asyncio.run_coroutine_threadsafe(self._update_pairs(pairs), self._loop)
+
+    def stats(self):
+        return dict(self._stats, pairs=len(self.pairs), connected=int(self._connected.is_set()))
+
+    # --- KONEKSI ---
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+
+    async def _run(self):
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    await self._connect(session)
+                except Exception as e:
+                    self._stats["errors"] += 1
+                    metrics.error("kucoin_ws")
+                    print(f"Stream KuCoin terputus: {e}")
+                self._connected.clear()
+                if self._stopping: break
+                self._stats["reconnects"] += 1
+                print(f"Menyambung ulang stream KuCoin dalam {self._backoff:.0f} detik...")
+                await asyncio.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, STREAM_RECONNECT_MAX)
+
+    async def _connect(self, session):
+        # Token publik + endpoint dari bullet-public, lalu welcome -> subscribe -> isi cache via REST -> baca pesan
+        async with session.post(f"{self.api_url}/api/v1/bullet-public") as response:
+            response.raise_for_status()
+            bullet = (await response.json())["data"]
+        server = bullet["instanceServers"][0]
+        url = f"{server['endpoint']}?token={bullet['token']}&connectId={uuid.uuid4().hex}"
+        async with session.ws_connect(url) as ws:
+            welcome = await ws.receive_json(timeout=10)
+            if welcome.get("type") != "welcome": raise RuntimeError(f"Pesan pembuka tidak dikenal: {welcome}")
+            self._ws, self._last_pong, self._backoff = ws, time.monotonic(), 1.0
+            self._stats["connects"] += 1
+            await self._subscribe(ws, sorted(self.pairs))
+            self._connected.set()
+            print(f"Stream KuCoin tersambung: {len(self.pairs)} pasangan, kline {self.base_timeframe}.")
+            seed = asyncio.ensure_future(self._seed_all(sorted(self.pairs)))
+            ping = asyncio.ensure_future(self._ping(ws, server.get("pingInterval", 18000) / 1000, server.get("pingTimeout", 10000) / 1000))
+            try:
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.TEXT:
+                        self._handle(json.loads(message.data))
+                    elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+            finally:
+                ping.cancel()
+                self._ws = None
+                await asyncio.gather(seed, return_exceptions=True)
+        if not self._stopping: print("Stream KuCoin ditutup oleh server.")
+
+    async def _ping(self, ws, interval: float, timeout: float):
+        # Tanpa pong dalam interval + timeout -> koneksi dianggap mati dan ditutup (memicu reconnect)
+        while not ws.closed:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_pong > interval + timeout:
+                print("Stream KuCoin tidak membalas ping, koneksi ditutup.")
+                await ws.close()
+                return
+            await ws.send_json({"id": str(next(self._ids)), "type": "ping"})
+
+    def _topics(self, pairs):
+        kline_type = KLINE_TYPES[self.base_timeframe]
+        for i in range(0, len(pairs), STREAM_SYMBOLS_PER_SUBSCRIBE):
+            chunk = [market_id(pair) for pair in pairs[i:i + STREAM_SYMBOLS_PER_SUBSCRIBE]]
+            yield "/market/candles:" + ",".join(f"{symbol}_{kline_type}" for symbol in chunk)
+            yield "/market/ticker:" + ",".join(chunk)
+
+    async def _subscribe(self, ws, pairs, action: str = "subscribe"):
+        for topic in self._topics(pairs):
+            await ws.send_json({"id": str(next(self._ids)), "type": action, "topic": topic, "privateChannel": False, "response": True})
+
+    async def _update_pairs(self, pairs):
+        added, removed = sorted(pairs - self.pairs), sorted(self.pairs - pairs)
+        self.pairs = pairs
+        if self._ws is None or self._ws.closed: return
+        if removed: await self._subscribe(self._ws, removed, "unsubscribe")
+        if added:
+            await self._subscribe(self._ws, added)
+            await asyncio.to_thread(self._seed, added)
+        if added or removed: print(f"Stream: +{len(added)} / -{len(removed)} pasangan.")
+
+    async def _seed_all(self, pairs):
+        await asyncio.to_thread(self._seed, pairs)
+        if not self._stopping: self._ready.set()
+
+    def _seed(self, pairs):
+        # Riwayat (dan bar yang terlewat selama terputus) diambil lewat REST; update berikutnya dari stream
+        for pair in pairs:
+            if self._stopping: return
+            try:
+                market_data.fetch_ohlcv(pair, self.base_timeframe, limit=self.seed_bars, ttl=0)
+            except Exception as e:
+                print(f"Gagal mengisi riwayat {pair} untuk stream: {e}")
+
+    # --- PESAN ---
+    def _record(self, message: dict):
+        try:
+            with open(self.record_path, 'a') as f:
+                f.write(json.dumps(message, separators=(',', ':')) + "\n")
+        except OSError as e:
+            print(f"Gagal merekam pesan stream ke {self.record_path}: {e}")
+
+    def _handle(self, message: dict):
+        kind = message.get("type")
+        if kind == "pong":
+            self._last_pong = time.monotonic()
+            return
+        if kind == "error":
+            self._stats["errors"] += 1
+            print(f"Error dari stream KuCoin: {message}")
+            return
+        if kind != "message": return
+        self._stats["messages"] += 1
+        if self.record_path: self._record(message)
+        topic, data = message.get("topic", ""), message.get("data", {})
+        try:
+            if topic.startswith("/market/candles:"):
+                self._on_kline(data["symbol"].replace('-', '/'), parse_kline(data["candles"]))
+            elif topic.startswith("/market/ticker:"):
+                pair = topic.split(':', 1)[1].replace('-', '/')
+                self.prices[pair] = float(data["price"])
+                self._stats["tickers"] += 1
+                if self.on_ticker: self.on_ticker(pair, self.prices[pair])
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Gagal memproses pesan stream {topic}: {e}")
+
+    def _on_kline(self, pair: str, candle):
+        self._stats["klines"] += 1
+        closed = market_data.apply_candle(pair, self.base_timeframe, candle)
+        if closed is None: return
+        self._stats["bar_closes"] += 1
+        base_ms = market_data.timeframe_ms(self.base_timeframe)
+        close_ms = closed[0] + base_ms
+        # Jeda antara close bar dan update pertama bar berikutnya (batas bawah latensi sinyal)
+        metrics.STAGE_SECONDS.observe(max(time.time() - close_ms / 1000, 0.0), stage="stream_close_lag")
+        if not self.on_close: return
+        self.on_close(pair, self.base_timeframe, closed[0])
+        for timeframe in self.timeframes:
+            tf_ms = market_data.timeframe_ms(timeframe)
+            if close_ms % tf_ms == 0: self.on_close(pair, timeframe, close_ms - tf_ms)
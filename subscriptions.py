@@ -0,0 +1,68 @@
+# subscriptions.py
+# Indeks terbalik koin -> pelanggan untuk fan-out sinyal/peringatan
+import copy
+from collections import defaultdict
+
+# Jenis notifikasi -> flag preferensi di user_data["strategies"][nama]
+KINDS = {"signal": "signal_on", "alert": "alert_on"}
+
+
+class SubscriptionIndex:
+    def __init__(self, core_watchlist=()):
+        self.core_watchlist = set(core_watchlist)
+        # (coin, strategi, jenis) -> {user_id} untuk watchlist pribadi
+        self._by_coin = defaultdict(set)
+        # (strategi, jenis) -> {user_id}; berlaku untuk semua koin inti, jadi cukup diselesaikan sekali
+        self._core = defaultdict(set)
+        self._users = {}
+
+    @staticmethod
+    def _entries(data: dict):
+        flags = [(name, kind) for name, prefs in data.get("strategies", {}).items()
+                 for kind, flag in KINDS.items() if prefs.get(flag, False)]
+        return set(data.get("watchlist", [])), flags
+
+    def _add(self, user_id: str, data: dict):
+        coins, flags = self._entries(data)
+        for name, kind in flags:
+            self._core[(name, kind)].add(user_id)
+            for coin in coins:
+                self._by_coin[(coin, name, kind)].add(user_id)
+
+    def _discard(self, user_id: str, data: dict):
+        coins, flags = self._entries(data)
+        for name, kind in flags:
+            self._core[(name, kind)].discard(user_id)
+            for coin in coins:
+                key = (coin, name, kind)
+                self._by_coin[key].discard(user_id)
+                if not self._by_coin[key]: del self._by_coin[key]
+
+    def update_user(self, user_id: str, data: dict):
+        old = self._users.get(user_id)
+        if old == data: return False
+        if old is not None: self._discard(user_id, old)
+        self._users[user_id] = copy.deepcopy(data)
+        self._add(user_id, data)
+        return True
+
+    def remove_user(self, user_id: str):
+        old = self._users.pop(user_id, None)
+        if old is not None: self._discard(user_id, old)
+
+    def sync(self, user_data: dict, core_watchlist=None):
+        # Hanya pengguna yang datanya berubah (atau hilang) yang diindeks ulang
+        if core_watchlist is not None: self.core_watchlist = set(core_watchlist)
+        changed = 0
+        for user_id in set(self._users) - set(user_data):
+            self.remove_user(user_id)
+            changed += 1
+        for user_id, data in user_data.items():
+            changed += self.update_user(user_id, data)
+        return changed
+
+    def subscribers(self, coin: str, strategy: str, kind: str):
+        private = self._by_coin.get((coin, strategy, kind), set())
+        if coin in self.core_watchlist:
+            return private | self._core.get((strategy, kind), set())
+        return set(private)
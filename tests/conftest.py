@@ -0,0 +1,33 @@
+# tests/conftest.py
+# Modul bot membaca konfigurasi dari environment saat diimpor: semua penyimpanan lokal dimatikan/diarahkan ke folder
+# sementara dan batas laju dibuka sebelum modul mana pun diimpor. Bursa, HTTP & Telegram memakai stand-in fakes.py.
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORKDIR = tempfile.mkdtemp(prefix="trading-bot-tests-")
+os.environ.update({
+    "CANDLE_STORE_PATH": "", "MARKETS_CACHE_PATH": "", "ANALYSIS_STORE_PATH": "", "AI_CACHE_PATH": "", "NEWS_STATE_PATH": "",
+    "MARKET_CONTEXT_PATH": "", "INDICATOR_STATE_PATH": "", "ANALYSIS_API_URL": "",
+    "API_SNAPSHOT_PATH": os.path.join(WORKDIR, "api_snapshot.json"),
+    "STRATEGY_SETTINGS_PATH": os.path.join(WORKDIR, "strategy_settings.json"),
+    "DATA_DIR": os.path.join(WORKDIR, "data"),
+    "RAILWAY_URL": "tests.invalid", "API_SECRET_KEY": "tests", "TELEGRAM_TOKEN": "tests",
+    "KUCOIN_RATE_LIMIT": "1000000", "TELEGRAM_GLOBAL_RATE": "1000000", "TELEGRAM_CHAT_INTERVAL": "0",
+})
+
+
+@pytest.fixture
+def exchange():
+    # FakeExchange sebagai instance KuCoin bersama market_data; fixture candle diisi oleh test
+    import market_data
+    from fakes import FakeExchange
+    fake = FakeExchange()
+    market_data.clear_cache()
+    market_data._exchanges["kucoin"] = fake
+    yield fake
+    market_data._exchanges.pop("kucoin", None)
+    market_data.clear_cache()
@@ -0,0 +1,69 @@
+# tests/test_analysis_api.py
+# Cron job mengambil snapshot yang sudah dihitung bot lewat /api/analysis (tidak ada disk bersama); candle yang
+# berbeda/bot tidak punya -> hitung sendiri
+import time
+import numpy as np
+import pytest
+import requests
+import analysis
+import main
+import market_data
+from fakes import FakeHTTP, FakeResponse, synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+
+
+@pytest.fixture
+def bot(exchange, monkeypatch):
+    now_ms = int(time.time() * 1000)
+    exchange.fixtures["BTC/USDT"] = synthetic_ohlcv(4, 300, HOUR_MS, end_ms=market_data.next_close_ms(now_ms, "1h"))
+    monkeypatch.setattr(main.analysis, "SNAPSHOTS", analysis.SnapshotStore(None, remote_url=None))
+    client = main.app.test_client()
+    def handler(method, url, kwargs):
+        served = client.get("/api/analysis", query_string=kwargs["params"])
+        response = FakeResponse(served.status_code)
+        response.content = served.data
+        return response
+    http = FakeHTTP({"/api/analysis": handler})
+    uninstall = http.install(requests)
+    yield client, http
+    uninstall()
+
+
+def test_cron_reuses_bot_snapshot(bot, exchange):
+    client, http = bot
+    served = main.analysis.SNAPSHOTS.get("BTC/USDT", "1h")
+    calls = exchange.calls
+    cron = analysis.SnapshotStore(None, remote_url="bot.tests.invalid")
+    snapshot = cron.get("BTC/USDT", "1h")
+    assert http.calls and http.calls[0][1] == "https://bot.tests.invalid/api/analysis"
+    # Tidak ada candle yang diunduh ulang oleh cron
+    assert exchange.calls == calls
+    assert cron.stats()["remote_hits"] == 1 and cron.stats()["computed"] == 0
+    assert {key: snapshot[key] for key in ("candle_ts", "price", "values", "analysis", "score")} == \
+           {key: served[key] for key in ("candle_ts", "price", "values", "analysis", "score")}
+    assert all(np.array_equal(snapshot["plot"][name], served["plot"][name]) for name in analysis.PLOT_FIELDS)
+
+
+def test_unknown_candle_falls_back_to_compute(bot, monkeypatch):
+    client, http = bot
+    key_ts = analysis.closed_candle_ts("1h")
+    assert client.get("/api/analysis", query_string={"secret": "tests", "pair": "BTC/USDT", "timeframe": "1h",
+                                                     "candle_ts": key_ts - HOUR_MS}).status_code == 404
+    assert client.get("/api/analysis", query_string={"secret": "salah", "pair": "BTC/USDT", "timeframe": "1h",
+                                                     "candle_ts": key_ts}).status_code == 401
+    # Bursa di sisi bot belum punya candle close terakhir: bot menjawab 404, cron menghitung sendiri
+    lagging = dict(analysis.compute("BTC/USDT", "1h", key_ts - HOUR_MS))
+    monkeypatch.setattr(main.analysis, "get_snapshot", lambda pair, timeframe: lagging)
+    cron = analysis.SnapshotStore(None, remote_url="bot.tests.invalid")
+    snapshot = cron.get("BTC/USDT", "1h")
+    assert snapshot["candle_ts"] == key_ts
+    assert cron.stats()["remote_misses"] == 1 and cron.stats()["computed"] == 1
+
+
+def test_caption_price_labelled_with_candle_close(bot):
+    snapshot = main.analysis.SNAPSHOTS.get("BTC/USDT", "1h")
+    assert analysis.close_time_ms(snapshot) == snapshot["candle_ts"] + HOUR_MS
+    caption = main.build_caption("BTC/USDT", "1h", "📈 +1.00%", "N/A", snapshot["price"], "01 Jan 2026, 07:00 WIB",
+                                 snapshot["analysis"], "-", {"text": "-"}, "-")
+    assert f"Harga close candle 01 Jan 2026, 07:00 WIB: **N/A** | **${snapshot['price']:,.2f}**" in caption
@@ -0,0 +1,62 @@
+# tests/test_backtest.py
+# Store yang diisi lewat market_data hanya berisi BASE_TIMEFRAME (1h): backtest & optimizer dengan argumen default
+# (4h) harus merangkumnya sendiri, persis seperti market_data
+import json
+import time
+import pytest
+import backtest
+import market_data
+import optimizer
+from candle_store import CandleStore
+from fakes import synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+
+
+@pytest.fixture
+def store_path(tmp_path, exchange, monkeypatch):
+    path = str(tmp_path / "candles.sqlite3")
+    monkeypatch.setattr(market_data, "CANDLE_STORE_PATH", path)
+    monkeypatch.setattr(market_data, "_store", None)
+    exchange.fixtures["BTC/USDT"] = synthetic_ohlcv(9, 2000, HOUR_MS)
+    market_data.fetch_ohlcv("BTC/USDT", "4h", limit=450)
+    yield path
+    market_data._store = None
+
+
+def test_store_holds_only_base_timeframe(store_path):
+    assert [(pair, tf) for _, pair, tf, _ in CandleStore(store_path).series()] == [("BTC/USDT", "1h")]
+
+
+def test_load_history_resamples_base_timeframe(store_path, exchange):
+    now_ms = int(time.time() * 1000)
+    history = backtest.load_history(store_path, "BTC", "4h", now_ms=now_ms)
+    resampled = market_data.resample(exchange.fixtures["BTC/USDT"], "4h")
+    assert history == resampled[-len(history) - 1:-1]
+    # Bar 4h terakhir masih terbentuk: tidak disimulasikan seperti bar close (sama dengan mode daemon)
+    assert resampled[-1][0] + 4 * HOUR_MS > now_ms >= history[-1][0] + 4 * HOUR_MS
+    assert backtest.available_coins(store_path, "4h") == ["BTC"]
+
+
+def test_backtest_main_with_defaults(store_path):
+    results = backtest.main(["--data", store_path, "--workers", "1"])
+    assert results and {r["timeframe"] for r in results} == {"4h"}
+    assert all(r["bars"] >= 450 for r in results)
+
+
+def test_optimizer_main_with_defaults(store_path, tmp_path):
+    output = str(tmp_path / "settings.json")
+    data = optimizer.main(["--data", store_path, "--workers", "1", "--output", output])
+    assert data is not None and data["timeframe"] == "4h"
+    with open(output) as f:
+        assert json.load(f)["timeframe"] == "4h"
+
+
+def test_csv_folder_with_direct_timeframe_still_works(tmp_path, exchange):
+    ohlcv = market_data.resample(synthetic_ohlcv(10, 800, HOUR_MS), "4h")
+    with open(tmp_path / "ETH_4h.csv", "w") as f:
+        f.write("timestamp,open,high,low,close,volume\n")
+        for candle in ohlcv: f.write(",".join(map(str, candle)) + "\n")
+    assert backtest.available_coins(str(tmp_path), "4h") == ["ETH"]
+    assert backtest.load_history(str(tmp_path), "ETH", "4h") == ohlcv[:-1]
+    assert backtest.load_history(str(tmp_path), "ETH", "4h", now_ms=ohlcv[-1][0] + 4 * HOUR_MS) == ohlcv
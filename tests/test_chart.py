@@ -0,0 +1,50 @@
+# tests/test_chart.py
+# /chart: chart & indikator dari candle close terakhir (di-cache per candle), ditambah baris live dari candle yang
+# masih terbentuk yang dihitung ulang di setiap permintaan
+import json
+import pytest
+import analysis
+import main
+import market_data
+from render_cache import RenderCache
+from indicator_state import IndicatorStateStore
+from fakes import synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+
+
+@pytest.fixture
+def chart(exchange, monkeypatch):
+    exchange.fixtures["BTC/USDT"] = synthetic_ohlcv(11, 1200, HOUR_MS)
+    monkeypatch.setattr(main, "CHART_CACHE", RenderCache())
+    monkeypatch.setattr(main, "CHART_STATES", IndicatorStateStore())
+    monkeypatch.setattr(main.analysis, "SNAPSHOTS", analysis.SnapshotStore(None, remote_url=None))
+    monkeypatch.setattr(main.RENDERER, "render", lambda plot, title: b"png")
+    monkeypatch.setattr(main, "get_fear_and_greed_index", lambda: {"status": "ok", "score": 0, "text": "Netral"})
+    monkeypatch.setattr(main, "get_usdt_idr", lambda: 16000.0)
+    monkeypatch.setattr(main, "get_gemini_analysis", lambda prompt, key=None, fallback=None: "Ringkasan AI.")
+    return exchange
+
+
+def test_caption_has_closed_candle_label_and_live_line(chart):
+    png, caption, _, photo_key, _ = main.get_chart_and_caption("BTC/USDT", "4h")
+    snapshot = analysis.get_snapshot("BTC/USDT", "4h")
+    live_price = chart.fixtures["BTC/USDT"][-1][4]
+    assert png == b"png" and photo_key is not None
+    assert "**Indikator Teknikal (candle 4h close " in caption
+    assert "Live " in caption and f"**${live_price:,.2f}**" in caption
+    change = (live_price - snapshot["price"]) / snapshot["price"] * 100
+    assert f"({change:+.2f}% dari close candle" in caption
+
+
+def test_live_line_follows_market_while_chart_is_cached(chart):
+    main.get_chart_and_caption("BTC/USDT", "4h")
+    state = json.dumps(main.CHART_STATES.get("kucoin|BTC/USDT|4h|chart").to_dict())
+    # Update stream di candle yang sama: chart tetap dari cache, baris live ikut harga baru
+    last = list(chart.fixtures["BTC/USDT"][-1])
+    market_data.apply_candle("BTC/USDT", "1h", last[:4] + [last[4] * 1.1, last[5]])
+    png, caption, _, _, _ = main.get_chart_and_caption("BTC/USDT", "4h")
+    assert png == b"png" and main.CHART_CACHE.stats()["hits"] == 1
+    assert f"**${last[4] * 1.1:,.2f}**" in caption
+    # Bar yang masih terbentuk hanya di-peek: state chart tidak berubah
+    assert json.dumps(main.CHART_STATES.get("kucoin|BTC/USDT|4h|chart").to_dict()) == state
@@ -0,0 +1,31 @@
+# tests/test_chart_renderer.py
+# Render yang melewati timeout tetap memakai worker: slotnya baru dilepas saat worker selesai
+import time
+from concurrent.futures import TimeoutError
+import pytest
+import chart_renderer
+
+
+def slow_render(arrays, title):
+    time.sleep(1.0)
+    return b"png", 1.0
+
+
+def test_timed_out_render_keeps_its_slot(monkeypatch):
+    # Pool memakai fork, jadi worker mewarisi _render yang diganti
+    monkeypatch.setattr(chart_renderer, "_render", slow_render)
+    renderer = chart_renderer.ChartRenderer(workers=1, queue_limit=0, timeout=0.2)
+    try:
+        with pytest.raises(TimeoutError):
+            renderer.render({}, "lambat")
+        assert renderer.stats()["pending"] == 1
+        with pytest.raises(chart_renderer.RendererBusy):
+            renderer.render({}, "berikutnya")
+        deadline = time.monotonic() + 5
+        while renderer.stats()["pending"] and time.monotonic() < deadline: time.sleep(0.05)
+        assert renderer.stats()["pending"] == 0
+        # Slot kembali tersedia: render berikutnya diterima (lalu habis waktu lagi), bukan ditolak
+        with pytest.raises(TimeoutError):
+            renderer.render({}, "setelah selesai")
+    finally:
+        renderer.close()
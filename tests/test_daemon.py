@@ -0,0 +1,72 @@
+# tests/test_daemon.py
+# run_daemon di bawah FakeClock: bangun tepat setelah close bar, siklus pertama hanya pemanasan, dan setiap siklus
+# berikutnya mengevaluasi tepat satu bar 4h baru (dirangkum dari candle 1h) lalu mengirim notifikasinya
+import requests
+import signal_finder
+from fakes import FakeBot, FakeClock, FakeExchange, FakeHTTP, FakeResponse, news_route, synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+START_MS = 1_700_006_400_000  # batas bar 4h (UTC)
+USERS = {"1": {"watchlist": ["BTC"], "strategies": {"pullback_buy": {"signal_on": True, "alert_on": False}}}}
+
+
+class ClockedExchange(FakeExchange):
+    # Hanya bar yang sudah dimulai pada waktu jam tiruan yang terlihat, termasuk bar yang sedang terbentuk
+    def __init__(self, fixtures, clock):
+        super().__init__(fixtures)
+        self.clock = clock
+
+    def fetch_ohlcv(self, pair, timeframe='1m', since=None, limit=None):
+        now_ms = self.clock.time() * 1000
+        visible = [candle for candle in super().fetch_ohlcv(pair, timeframe, since) if candle[0] <= now_ms]
+        return visible[:limit] if since is not None and limit else visible[-limit:] if limit else visible
+
+
+def test_daemon_wakes_after_each_close_and_evaluates_new_bars(exchange, monkeypatch, capsys):
+    import market_data
+    clock = FakeClock(START_MS / 1000 + 600)
+    ohlcv = synthetic_ohlcv(7, 1000, HOUR_MS, end_ms=START_MS + 24 * HOUR_MS)
+    market_data._exchanges["kucoin"] = ClockedExchange({"BTC/USDT": ohlcv}, clock)
+    uninstall = FakeHTTP({
+        "/api/data": lambda method, url, kwargs: FakeResponse(200, {"users": USERS, "core_watchlist": [], "version": 1}),
+        "cryptocompare": news_route(),
+    }).install(requests)
+    # Setiap bar dianggap memicu BUY agar pengiriman per siklus bisa diamati
+    evaluated = []
+    def always_buy(last, prev, settings):
+        evaluated.append(last["close"])
+        return "BUY"
+    monkeypatch.setattr(signal_finder, "signal_rule", always_buy)
+    bot = FakeBot()
+    try:
+        signal_finder.run_daemon(timeframes=["4h"], clock=clock, max_cycles=3, bot=bot)
+    finally:
+        uninstall()
+
+    grace = signal_finder.DAEMON_CLOSE_GRACE
+    assert clock.sleeps == [4 * 3600 - 600 + grace, 4 * 3600, 4 * 3600]
+    # Pemanasan mengevaluasi bar 4h terakhir yang close; siklus berikutnya masing-masing satu bar baru
+    last_closed = [candle[0] for candle in ohlcv].index(START_MS - HOUR_MS)
+    assert evaluated == [ohlcv[last_closed][4], ohlcv[last_closed + 4][4], ohlcv[last_closed + 8][4]]
+    # Siklus pertama tanpa notifikasi; dua siklus berikutnya satu sinyal masing-masing
+    messages = [kwargs["text"] for method, chat_id, kwargs in bot.calls if method == "send_message"]
+    assert len(messages) == 2
+    assert f"${ohlcv[last_closed + 4][4]:,.2f}" in messages[0] and f"${ohlcv[last_closed + 8][4]:,.2f}" in messages[1]
+    assert capsys.readouterr().out.count("Daemon 4h: 1/1 koin punya bar close baru") == 3
+
+
+def test_daemon_skips_cycle_without_new_close(exchange, monkeypatch):
+    clock = FakeClock(START_MS / 1000 + 600)
+    exchange.fixtures["BTC/USDT"] = synthetic_ohlcv(8, 1000, HOUR_MS, end_ms=START_MS)
+    monkeypatch.setattr(signal_finder, "get_api_data", lambda: {"users": USERS, "core_watchlist": []})
+    store = signal_finder.IndicatorStateStore()
+    index = signal_finder.SubscriptionIndex()
+    queue = signal_finder.DeliveryQueue(FakeBot())
+    try:
+        now_ms = int(clock.time() * 1000)
+        first = signal_finder.evaluate_timeframe(queue, store, index, "4h", ["BTC"], now_ms, notify=False)
+        # Data bursa tidak bertambah: bar close terakhir sama -> tidak ada yang dievaluasi ulang
+        second = signal_finder.evaluate_timeframe(queue, store, index, "4h", ["BTC"], now_ms + 4 * HOUR_MS, ttl=0, notify=False)
+    finally:
+        queue.close()
+    assert len(first) == 1 and second == []
@@ -0,0 +1,94 @@
+# tests/test_delivery.py
+# DeliveryQueue dengan FakeBot: RetryAfter menjeda lalu mengirim ulang, error jaringan di-retry dengan backoff,
+# BadRequest tidak di-retry, foto diunggah sekali per photo_key dan file_id-nya diingat secara LRU
+import time
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from delivery import DeliveryQueue
+from fakes import FakeBot
+
+
+def make_queue(bot, **kwargs):
+    return DeliveryQueue(bot, workers=2, global_rate=1000, chat_interval=0, backoff=0.01, **kwargs)
+
+
+def test_retry_after_pauses_and_resends():
+    bot = FakeBot(failures={1: [RetryAfter(0.2)]})
+    queue = make_queue(bot)
+    future = queue.send_message(1, "halo")
+    queue.close()
+    assert future.result().text == "halo"
+    assert [chat_id for _, chat_id, _ in bot.calls] == [1, 1]
+    stats = queue.stats()
+    assert stats["sent"] == 1 and stats["retry_after"] == 1 and stats["retried"] == 1
+
+
+def test_network_errors_retry_until_limit():
+    bot = FakeBot(failures={1: [NetworkError("putus")] * 2, 2: [NetworkError("putus")] * 5})
+    queue = make_queue(bot, max_retries=3)
+    ok, failed = queue.send_message(1, "a"), queue.send_message(2, "b")
+    queue.close()
+    assert ok.result().text == "a"
+    with pytest.raises(NetworkError):
+        failed.result()
+    # 2 gagal + 1 berhasil untuk chat 1; 1 percobaan + 3 retry untuk chat 2
+    assert sum(1 for _, chat_id, _ in bot.calls if chat_id == 1) == 3
+    assert sum(1 for _, chat_id, _ in bot.calls if chat_id == 2) == 4
+
+
+def test_bad_request_is_not_retried():
+    bot = FakeBot(failures={1: [BadRequest("chat not found")]})
+    queue = make_queue(bot)
+    future = queue.send_message(1, "x")
+    queue.close()
+    with pytest.raises(BadRequest):
+        future.result()
+    assert len(bot.calls) == 1 and queue.stats()["failed"] == 1
+
+
+def test_photo_uploaded_once_per_key():
+    bot = FakeBot()
+    queue = make_queue(bot)
+    futures = [queue.send_photo(chat_id, b"png", photo_key="BTC|4h|1") for chat_id in range(5)]
+    queue.close()
+    assert all(future.result() for future in futures)
+    photos = [kwargs["photo"] for method, _, kwargs in bot.calls if method == "send_photo"]
+    assert sum(1 for photo in photos if isinstance(photo, bytes)) == 1
+    assert queue.stats()["photo_reused"] == 4
+
+
+def test_photo_ids_are_bounded_lru():
+    bot = FakeBot()
+    queue = make_queue(bot, photo_cache_size=2)
+    for key in ("a", "b"):
+        queue.send_photo(1, b"png", photo_key=key).result()
+    queue.send_photo(2, b"png", photo_key="a").result()  # "a" dipakai -> paling baru
+    queue.send_photo(1, b"png", photo_key="c").result()  # "b" terbuang
+    queue.send_photo(3, b"png", photo_key="a").result()
+    queue.send_photo(3, b"png", photo_key="b").result()
+    queue.close()
+    uploads = [kwargs["photo"] for method, _, kwargs in bot.calls if method == "send_photo" and isinstance(kwargs["photo"], bytes)]
+    assert len(uploads) == 4  # a, b, c, lalu b lagi
+    assert list(queue._photo_ids) == ["a", "b"]
+
+
+def test_retry_keeps_per_chat_order():
+    # Foto gagal sementara: caption edit & pesan berikutnya untuk chat yang sama tidak boleh menyalip
+    bot = FakeBot(failures={1: [NetworkError("putus")]})
+    queue = DeliveryQueue(bot, workers=4, global_rate=1000, chat_interval=0, backoff=0.05)
+    futures = [queue.send_photo(1, b"png", caption="chart"), queue.submit("edit_message_caption", 1, caption="ai"),
+               queue.send_message(1, "lanjutan"), queue.send_message(2, "lain")]
+    queue.close()
+    assert all(future.result() for future in futures)
+    assert [method for method, chat_id, _ in bot.calls if chat_id == 1] == ["send_photo", "send_photo", "edit_message_caption", "send_message"]
+
+
+def test_chat_schedule_is_pruned():
+    bot = FakeBot()
+    queue = DeliveryQueue(bot, workers=2, global_rate=1000, chat_interval=0.05)
+    for chat_id in range(20): queue.send_message(chat_id, "x")
+    queue.join()
+    time.sleep(0.1)
+    queue.send_message(99, "y")
+    queue.close()
+    assert set(queue._chat_next) <= {99} and queue._chat_queues == {}
@@ -0,0 +1,47 @@
+# tests/test_exchange_registry.py
+# Metadata pasar dimuat ke instance terpisah lalu dipasang ke instance bersama; laju bawaan dibaca dari instance itu
+import ccxt
+import pytest
+import market_data
+from ttl_cache import TTLCache
+
+
+def _market(base):
+    return {"id": f"{base}-USDT", "symbol": f"{base}/USDT", "base": base, "quote": "USDT", "baseId": base,
+            "quoteId": "USDT", "type": "spot", "spot": True, "active": True, "precision": {}, "limits": {}}
+
+
+def _offline(bases, loads):
+    exchange = ccxt.kucoin({"enableRateLimit": False})
+    exchange.fetch_currencies = lambda params={}: {}
+    def fetch_markets(params={}):
+        loads.append(exchange)
+        return [_market(base) for base in bases]
+    exchange.fetch_markets = fetch_markets
+    return exchange
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(market_data, "_markets_cache", TTLCache(None))
+    monkeypatch.setattr(market_data, "_limiters", {})
+    monkeypatch.setattr(market_data, "RATE_LIMITS", {})
+
+
+def test_refresh_loads_into_separate_instance(registry, monkeypatch):
+    loads = []
+    shared = _offline(["BTC"], loads)
+    shared.load_markets()
+    shared.load_markets = lambda *args, **kwargs: pytest.fail("instance bersama tidak boleh memuat ulang pasar")
+    monkeypatch.setattr(market_data, "_create_exchange", lambda exchange_id: _offline(["BTC", "ETH"], loads))
+    market_data._markets("kucoin", shared)
+    assert loads[-1] is not shared
+    assert sorted(shared.markets) == ["BTC/USDT", "ETH/USDT"] and shared.markets_by_id["ETH-USDT"]
+
+
+def test_default_rate_reads_pooled_instance(registry, monkeypatch):
+    shared = _offline(["BTC"], [])
+    monkeypatch.setitem(market_data._exchanges, "kucoin", shared)
+    # Tanpa instance ccxt sekali pakai: modul ccxt sama sekali tidak disentuh
+    monkeypatch.setattr(market_data, "ccxt", None)
+    assert market_data.get_limiter("kucoin").rate == pytest.approx(1000.0 / shared.rateLimit)
@@ -0,0 +1,113 @@
+# tests/test_indicator_state.py
+# State inkremental harus sama dengan menghitung ulang seluruh riwayat (indicators.compute_batch / chart_series)
+import json
+import numpy as np
+import pytest
+import indicators
+from candle_buffer import CandleBuffer
+from fakes import synthetic_ohlcv
+from indicator_state import IndicatorSet, IndicatorStateStore, SmaState, BollingerState
+
+OPTIMAL = {"ema_fast": 9, "ema_slow": 21, "rsi_period": 14, "rsi_ob": 80, "rsi_os": 20, "macd_fast": 5, "macd_slow": 35, "macd_signal": 5}
+SENSITIVE = {"rsi_ob": 65, "rsi_os": 35, "macd_fast": 9, "macd_slow": 21, "macd_signal": 7}
+
+
+def incremental(indicator_set, ohlcv):
+    rows = [indicator_set.update(candle) for candle in ohlcv]
+    return {name: np.array([np.nan if row[name] is None else row[name] for row in rows]) for name in rows[0] if name != "timestamp"}
+
+
+def assert_same(actual, expected):
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual[~np.isnan(actual)], expected[~np.isnan(expected)], rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("sensitive, settings", [(False, OPTIMAL), (True, SENSITIVE)])
+def test_strategy_state_matches_batch(sensitive, settings):
+    ohlcv = synthetic_ohlcv(3, 400)
+    close = np.array([candle[4] for candle in ohlcv])
+    batch = indicators.compute_batch(close, [settings], sensitive=sensitive)
+    values = incremental(IndicatorSet.for_strategy(settings, sensitive=sensitive), ohlcv)
+    for name, expected in batch.items():
+        assert_same(values[name], expected[0])
+
+
+def test_rolling_states_match_chart_series():
+    ohlcv = synthetic_ohlcv(4, 300)
+    series = indicators.chart_series(CandleBuffer.from_ohlcv(ohlcv))
+    indicator_set = IndicatorSet({"ma9": (SmaState(9), "close", ("ma9",)), "bb": (BollingerState(20, 2), "close", ("bb_mavg", "bb_high", "bb_low"))})
+    values = incremental(indicator_set, ohlcv)
+    # chart_series hanya menyisakan ekor yang semua indikatornya valid
+    n = len(series["close"])
+    for name in ("ma9", "bb_high", "bb_low"):
+        assert_same(values[name][-n:], series[name])
+
+
+def test_store_resumes_from_saved_state(tmp_path):
+    ohlcv = synthetic_ohlcv(5, 300)
+    factory = lambda: IndicatorSet.for_strategy(OPTIMAL)
+    path = str(tmp_path / "state.json")
+    store = IndicatorStateStore(path)
+    store.advance_closed("k", ohlcv[:200], factory)
+    store.save()
+
+    resumed = IndicatorStateStore(path).advance_closed("k", ohlcv[150:], factory)
+    fresh = IndicatorStateStore().advance_closed("k", ohlcv, factory)
+    assert resumed.last_ts == ohlcv[-1][0]
+    assert json.dumps(resumed.last_values) == json.dumps(fresh.last_values)
+
+
+def test_store_reseeds_after_gap():
+    ohlcv = synthetic_ohlcv(6, 300)
+    store = IndicatorStateStore()
+    store.advance_closed("k", ohlcv[:100], lambda: IndicatorSet.for_strategy(OPTIMAL))
+    # Bar 100..149 terlewat: state di-seed ulang dari riwayat yang tersedia, bukan melompati celah
+    reseeded = store.advance_closed("k", ohlcv[150:], lambda: IndicatorSet.for_strategy(OPTIMAL))
+    expected = IndicatorStateStore().advance_closed("k", ohlcv[150:], lambda: IndicatorSet.for_strategy(OPTIMAL))
+    assert reseeded.last_values == expected.last_values
+
+
+@pytest.mark.parametrize("sensitive, settings", [(False, OPTIMAL), (True, SENSITIVE)])
+def test_peek_matches_batch_on_forming_bar(sensitive, settings):
+    ohlcv = synthetic_ohlcv(7, 400)
+    close = np.array([candle[4] for candle in ohlcv])
+    batch = indicators.compute_batch(close, [settings], sensitive=sensitive)
+    store = IndicatorStateStore()
+    closed, forming = store.advance("k", ohlcv, lambda: IndicatorSet.for_strategy(settings, sensitive=sensitive))
+    before = json.dumps(store.get("k").to_dict())
+    assert store.get("k").peek(ohlcv[-1]) == forming
+    # peek tidak mengubah state: bar yang masih terbentuk boleh di-peek berkali-kali
+    assert json.dumps(store.get("k").to_dict()) == before and store.get("k").last_ts == ohlcv[-2][0]
+    for name, expected in batch.items():
+        assert forming[name] == pytest.approx(expected[0][-1], rel=1e-9)
+        assert closed[name] == pytest.approx(expected[0][-2], rel=1e-9)
+
+
+def test_chart_set_peek_matches_chart_series():
+    ohlcv = synthetic_ohlcv(8, 300)
+    series = indicators.chart_series(CandleBuffer.from_ohlcv(ohlcv))
+    indicator_set = IndicatorSet.for_chart()
+    indicator_set.seed(ohlcv[:-1])
+    before = json.dumps(indicator_set.to_dict())
+    forming = indicator_set.peek(ohlcv[-1])
+    assert json.dumps(indicator_set.to_dict()) == before
+    for name in ("ma9", "ma26", "rsi", "macd", "macd_signal", "bb_high", "bb_low"):
+        assert forming[name] == pytest.approx(series[name][-1], rel=1e-9)
+    # SMA volume 20 bar (dipakai analyze_indicators untuk label volume tinggi)
+    volume = np.array([candle[5] for candle in ohlcv])
+    assert forming["volume_avg"] == pytest.approx(indicators.rolling_last_mean(volume, 20), rel=1e-9)
+    assert indicator_set.update(ohlcv[-1]) == forming
+
+
+def test_store_reseeds_when_settings_change(tmp_path):
+    ohlcv = synthetic_ohlcv(9, 300)
+    path = str(tmp_path / "state.json")
+    store = IndicatorStateStore(path)
+    store.advance_closed("k", ohlcv[:-1], lambda: IndicatorSet.for_strategy(OPTIMAL))
+    store.save()
+    # Optimizer menulis window baru: state tersimpan (window lama) tidak boleh dilanjutkan
+    tuned = dict(OPTIMAL, ema_fast=12, macd_fast=8)
+    resumed = IndicatorStateStore(path).advance_closed("k", ohlcv, lambda: IndicatorSet.for_strategy(tuned))
+    expected = IndicatorStateStore().advance_closed("k", ohlcv, lambda: IndicatorSet.for_strategy(tuned))
+    assert resumed.signature() == expected.signature()
+    assert json.dumps(resumed.last_values) == json.dumps(expected.last_values)
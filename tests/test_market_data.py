@@ -0,0 +1,25 @@
+# tests/test_market_data.py
+# Retensi CandleStore vs limit: bar yang dibuang retensi tidak boleh memicu unduh penuh ulang di setiap fetch
+import market_data
+from candle_store import CandleStore
+from fakes import synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+
+
+def test_store_retention_fits_resampled_daily_limit(monkeypatch):
+    monkeypatch.setattr(market_data, "CANDLE_STORE_RETENTION", 5000)
+    assert market_data.store_retention() >= (market_data.RESAMPLE_MAX_LIMIT + 1) * 24
+    monkeypatch.setattr(market_data, "CANDLE_STORE_RETENTION", 0)
+    assert market_data.store_retention() == 0
+
+
+def test_limit_above_retention_fetches_incrementally(tmp_path, exchange, monkeypatch):
+    monkeypatch.setattr(market_data, "CANDLE_STORE_PATH", str(tmp_path / "candles.sqlite3"))
+    monkeypatch.setattr(market_data, "_store", CandleStore(str(tmp_path / "candles.sqlite3"), retention=1000))
+    exchange.fixtures["BTC/USDT"] = synthetic_ohlcv(3, 2000, HOUR_MS)
+    first = market_data.fetch_ohlcv("BTC/USDT", "1h", limit=1800, ttl=0)
+    assert len(first) == 1000 and exchange.calls == 2
+    second = market_data.fetch_ohlcv("BTC/USDT", "1h", limit=1800, ttl=0)
+    # Satu request sejak bar terakhir, bukan dua halaman unduh penuh
+    assert second == first and exchange.calls == 3
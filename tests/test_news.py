@@ -0,0 +1,64 @@
+# tests/test_news.py
+# NewsFeed: berita koin kecil tidak tergeser berita BTC/ETH di respons gabungan, dan penanda "sudah dilihat"
+# tidak mengosongkan berita yang dibaca validasi pada pemindaian berikutnya
+import requests
+import pytest
+import news
+from fakes import FakeHTTP, FakeResponse
+
+
+@pytest.fixture
+def crowded_api():
+    # Seperti CryptoCompare: 50 artikel terbaru lintas kategori yang diminta. BTC/ETH punya banyak artikel yang lebih
+    # baru sehingga menggeser semua berita koin kecil; koin kecil masing-masing hanya punya 3 artikel
+    def handler(method, url, kwargs):
+        articles = []
+        for category in kwargs["params"]["categories"].split(","):
+            if category in ("BTC", "ETH"):
+                articles += [{"id": f"{category}-{i}", "title": f"{category} {i}", "categories": category, "published_on": 1000 + i} for i in range(60)]
+            else:
+                articles += [{"id": f"{category}-{i}", "title": f"{category} {i}", "categories": category, "published_on": i} for i in range(3)]
+        articles.sort(key=lambda a: a["published_on"], reverse=True)
+        return FakeResponse(200, {"Data": articles[:news.NEWS_PAGE_SIZE]})
+    http = FakeHTTP({"cryptocompare": handler})
+    uninstall = http.install(requests)
+    yield http
+    uninstall()
+
+
+def test_low_cap_symbols_are_paged_in_one_extra_call(crowded_api):
+    feed = news.NewsFeed(path="")
+    feed.prefetch(["BTC", "ETH", "PEPE", "FLOKI", "BONK"])
+    # Satu request gabungan + satu request untuk semua koin kecil yang tergeser, bukan satu per koin
+    assert len(crowded_api.calls) == 2
+    assert feed.headlines("PEPE") == ["PEPE 2", "PEPE 1", "PEPE 0"]
+    assert feed.headlines("BONK") == ["BONK 2", "BONK 1", "BONK 0"]
+    assert len(feed.headlines("BTC")) == news.NEWS_PER_SYMBOL
+    # Dalam TTL: koin yang memang kurang berita tetap dari cache
+    feed.prefetch(["BTC", "ETH", "PEPE", "FLOKI", "BONK"])
+    assert len(crowded_api.calls) == 2
+
+
+def test_no_extra_call_when_page_is_not_full(crowded_api):
+    feed = news.NewsFeed(path="")
+    feed.prefetch(["PEPE", "FLOKI"])
+    assert len(crowded_api.calls) == 1
+    assert feed.headlines("FLOKI") == ["FLOKI 2", "FLOKI 1", "FLOKI 0"]
+
+
+def test_seen_marker_does_not_hide_headlines(crowded_api):
+    feed = news.NewsFeed(path="")
+    assert feed.new_headlines("PEPE") == ["PEPE 2", "PEPE 1", "PEPE 0"]
+    feed.mark_seen("PEPE")
+    assert feed.new_headlines("PEPE") == []
+    assert feed.headlines("PEPE") == ["PEPE 2", "PEPE 1", "PEPE 0"]
+
+
+def test_repeat_signal_is_validated_with_news(crowded_api, monkeypatch):
+    import signal_finder
+    monkeypatch.setattr(signal_finder, "NEWS", news.NewsFeed(path=""))
+    prompts = []
+    monkeypatch.setattr(signal_finder, "get_gemini_analysis", lambda prompt, key=None: prompts.append(prompt) or "YA")
+    for _ in range(2): signal_finder.validate_signal("PEPE", "BUY")
+    assert "[BARU] PEPE 2" in prompts[0]
+    assert "PEPE 2" in prompts[1] and "[BARU]" not in prompts[1]
@@ -0,0 +1,50 @@
+# tests/test_render_cache.py
+# Chart di-cache per candle close: hanya hasil lengkap yang disimpan, kegagalan/snapshot terlambat dicoba ulang
+import threading
+import time
+import analysis
+import main
+from render_cache import RenderCache
+
+
+def test_uncacheable_result_is_shared_but_not_stored():
+    cache = RenderCache()
+    started, release, calls = threading.Event(), threading.Event(), []
+    def render():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return None
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_render("k", render, cacheable=lambda v: v is not None)))
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_render("k", render, cacheable=lambda v: v is not None)))
+    waiter.start()
+    while cache.stats()["coalesced"] < 1: time.sleep(0.01)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    # Penunggu yang bersamaan ikut memakai hasil render yang sama; permintaan berikutnya merender ulang
+    assert results == [None, None] and len(calls) == 1
+    assert cache.get_or_render("k", lambda: "png", cacheable=lambda v: v is not None) == "png"
+    assert cache.get_or_render("k", lambda: "lain") == "png"
+    assert cache.stats()["uncached"] == 1 and cache.stats()["size"] == 1
+
+
+def test_chart_cache_skips_failures_and_incomplete_snapshots(monkeypatch):
+    monkeypatch.setattr(main, "CHART_CACHE", RenderCache())
+    key_ts = analysis.closed_candle_ts("4h")
+    results = iter([(None, "Gagal menganalisis, data tidak cukup.", None, None, None, None),
+                    (b"png-lama", "caption", "BTC", None, key_ts - 4 * 3600 * 1000, 100.0),
+                    (b"png", "caption", "BTC", None, key_ts, 101.0)])
+    monkeypatch.setattr(main, "live_line", lambda pair, timeframe, close_price: None)
+    calls = []
+    monkeypatch.setattr(main, "generate_chart_and_caption", lambda pair, timeframe: calls.append(1) or next(results))
+    assert main.get_chart_and_caption("BTC/USDT", "4h")[0] is None
+    png, _, _, photo_key, _ = main.get_chart_and_caption("BTC/USDT", "4h")
+    # Bursa belum punya candle terakhir: chart dikirim, tapi tidak di-cache dan file_id-nya tidak dipakai ulang
+    assert png == b"png-lama" and photo_key is None
+    png, _, _, photo_key, _ = main.get_chart_and_caption("BTC/USDT", "4h")
+    assert png == b"png" and photo_key == f"chart|BTC/USDT|4h|{key_ts}"
+    assert main.get_chart_and_caption("BTC/USDT", "4h")[0] == b"png" and len(calls) == 3
@@ -0,0 +1,60 @@
+# tests/test_stream.py
+# MarketStream terhadap fakes.ReplayServer: koneksi diputus di tengah rekaman, stream harus menyambung ulang,
+# subscribe ulang dan tetap memicu setiap bar close tepat sekali dengan cache yang sama dengan rekaman
+import threading
+import time
+import numpy as np
+import pytest
+import market_data
+import stream
+from fakes import ReplayServer, kline_messages, synthetic_ohlcv
+
+HOUR_MS = 3600 * 1000
+END_MS = 1_700_006_400_000 + 40 * HOUR_MS
+SEEDED = 460
+
+
+def _wait(condition, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition(): return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def history(exchange):
+    ohlcv = synthetic_ohlcv(5, 500, HOUR_MS, end_ms=END_MS)
+    # REST hanya tahu riwayat sampai bar SEEDED-1; sisanya datang lewat stream
+    exchange.fixtures["BTC/USDT"] = ohlcv[:SEEDED]
+    return ohlcv
+
+
+def test_reconnect_after_dropped_connection(history):
+    messages = kline_messages("BTC/USDT", history[SEEDED:], "1h", updates_per_bar=3)
+    server = ReplayServer(messages, interval=0.002, drops=[30])
+    url = server.start()
+    closes, lock = [], threading.Lock()
+    def on_close(pair, timeframe, bar_start):
+        with lock: closes.append((pair, timeframe, bar_start))
+    market_stream = stream.MarketStream(["BTC/USDT"], timeframes=("4h",), on_close=on_close, base_timeframe="1h",
+                                        seed_bars=SEEDED, api_url=url, record_path="").start()
+    try:
+        assert market_stream.wait_ready(10)
+        assert _wait(lambda: market_stream.stats()["klines"] == len(messages))
+        assert _wait(lambda: market_stream.stats()["bar_closes"] == len(history) - SEEDED)
+    finally:
+        market_stream.stop()
+        server.stop()
+    stats = market_stream.stats()
+    assert server.connections >= 2 and stats["reconnects"] >= 1 and stats["connects"] >= 2
+    # Setiap koneksi baru subscribe ulang kline
+    resubscribed = {connection for connection, kind, topic in server.subscriptions if kind == "subscribe" and topic == "/market/candles:BTC-USDT_1hour"}
+    assert resubscribed == set(range(1, server.connections + 1))
+    # Bar terakhir REST + semua bar stream kecuali yang masih terbentuk: close tepat sekali, berurutan
+    hourly = [bar_start for pair, timeframe, bar_start in closes if timeframe == "1h"]
+    assert hourly == [candle[0] for candle in history[SEEDED - 1:-1]]
+    four_hour = [bar_start for pair, timeframe, bar_start in closes if timeframe == "4h"]
+    assert four_hour == [ts + HOUR_MS - 4 * HOUR_MS for ts in hourly if (ts + HOUR_MS) % (4 * HOUR_MS) == 0]
+    cached = market_data._cache[("kucoin", "BTC/USDT", "1h")]["candles"].tolist()
+    assert np.allclose(cached[-len(history) + SEEDED:], history[SEEDED:])
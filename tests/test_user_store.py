@@ -0,0 +1,64 @@
+# tests/test_user_store.py
+# UserStore: migrasi JSON lama (sekali, hanya jika berhasil), versi data untuk delta /api/data, toggle strategi
+import json
+import pytest
+from user_store import UserStore
+
+LEGACY = {
+    "1": {"watchlist": ["BTC", "ETH"], "strategies": {"rsi": {"alert_on": True, "signal_on": False}}},
+    "2": {"watchlist": ["SOL"], "strategies": {}},
+}
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = tmp_path / "user_data.json"
+    legacy.write_text(json.dumps(LEGACY))
+    store = UserStore(str(tmp_path / "users.sqlite3"), legacy_json=str(legacy))
+    assert store.export_all() == LEGACY
+    assert not legacy.exists() and (tmp_path / "user_data.json.migrated").exists()
+    # File JSON baru setelah migrasi tidak diimpor lagi
+    legacy.write_text(json.dumps({"3": {"watchlist": ["DOGE"], "strategies": {}}}))
+    assert UserStore(str(tmp_path / "users.sqlite3"), legacy_json=str(legacy)).export_all() == LEGACY
+
+
+def test_truncated_json_is_retried_not_discarded(tmp_path):
+    legacy = tmp_path / "user_data.json"
+    legacy.write_text(json.dumps(LEGACY)[:40])
+    store = UserStore(str(tmp_path / "users.sqlite3"), legacy_json=str(legacy))
+    assert store.export_all() == {} and legacy.exists()
+    # File diperbaiki: start berikutnya tetap memigrasikannya
+    legacy.write_text(json.dumps(LEGACY))
+    assert UserStore(str(tmp_path / "users.sqlite3"), legacy_json=str(legacy)).export_all() == LEGACY
+
+
+def test_versions_and_export_since(tmp_path):
+    store = UserStore(str(tmp_path / "users.sqlite3"))
+    assert store.data_version() == 0
+    assert store.add_symbol("1", "BTC") is True
+    v1 = store.data_version()
+    assert store.add_symbol("2", "ETH") is True
+    # Tulisan tanpa perubahan tidak menaikkan versi
+    assert store.add_symbol("2", "ETH") is False and store.remove_symbol("1", "XRP") is False
+    v2 = store.data_version()
+    assert v2 == v1 + 1
+    assert store.export_since(v1) == {"2": {"watchlist": ["ETH"], "strategies": {}}}
+    assert store.export_since(v2) == {}
+    assert set(store.export_since(0)) == {"1", "2"}
+    assert store.remove_symbol("1", "BTC") is True
+    assert store.export_since(v2) == {"1": {"watchlist": [], "strategies": {}}}
+    # Versi bertahan setelah buka ulang
+    assert UserStore(str(tmp_path / "users.sqlite3")).data_version() == store.data_version()
+
+
+def test_toggle_strategy(tmp_path):
+    store = UserStore(str(tmp_path / "users.sqlite3"))
+    assert store.toggle_strategy("1", "rsi", "alert_on") is True
+    assert store.get_strategies("1") == {"rsi": {"alert_on": True, "signal_on": False}}
+    assert store.toggle_strategy("1", "rsi", "signal_on") is True
+    assert store.toggle_strategy("1", "rsi", "alert_on") is False
+    assert store.get_strategies("1") == {"rsi": {"alert_on": False, "signal_on": True}}
+    # Hasil baca yang dikembalikan adalah salinan: mengubahnya tidak mengubah cache
+    store.get_user("1")["strategies"]["rsi"]["alert_on"] = True
+    assert store.get_strategies("1")["rsi"]["alert_on"] is False
+    with pytest.raises(ValueError):
+        store.toggle_strategy("1", "rsi", "unknown")
@@ -0,0 +1,13 @@
+# tests/test_web.py
+# Endpoint web bot di Railway bersifat publik: data internal hanya untuk pemegang API_SECRET_KEY
+import main
+
+
+def test_metrics_requires_secret():
+    client = main.app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics?secret=salah").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer salah"}).status_code == 401
+    assert client.get("/metrics?secret=tests").status_code == 200
+    response = client.get("/metrics", headers={"Authorization": "Bearer tests"})
+    assert response.status_code == 200 and response.mimetype == "text/plain"
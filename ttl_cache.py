@@ -0,0 +1,103 @@
+# ttl_cache.py
+# Cache TTL per key dengan stale-while-revalidate: nilai kedaluwarsa tetap dikembalikan (selama belum melewati
+# max_stale) sementara satu thread latar belakang memperbaruinya. Opsional disimpan ke file JSON agar
+# proses yang baru start langsung punya nilai.
+import json
+import os
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(self, path: str = None, max_stale: float = 86400):
+        self.path = path
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._key_locks = {}
+        self._refreshing = set()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "upstream_calls": 0, "errors": 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = {key: (entry["value"], entry["fetched_at"], entry.get("ttl", 0)) for key, entry in json.load(f).items()}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Gagal memuat cache dari {path}: {e}")
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load(self, key, loader, ttl):
+        self._count("upstream_calls")
+        try:
+            value = loader()
+        except Exception:
+            self._count("errors")
+            raise
+        # Waktu dinding (bukan monotonic) agar umur nilai tetap benar setelah dimuat ulang dari file
+        with self._lock:
+            self._entries[key] = (value, time.time(), ttl)
+        self._save()
+        return value
+
+    def _refresh(self, key, loader, ttl):
+        try:
+            with self._key_lock(key): self._load(key, loader, ttl)
+        except Exception as e:
+            print(f"Gagal memperbarui cache '{key}' di latar belakang: {e}")
+        finally:
+            with self._lock: self._refreshing.discard(key)
+
+    def get(self, key: str, loader, ttl: float):
+        # Segar -> langsung; basi (<= ttl + max_stale) -> nilai lama + refresh latar belakang; selain itu muat sinkron
+        entry = self._entries.get(key)
+        age = time.time() - entry[1] if entry else None
+        if entry and age < ttl:
+            self._count("hits")
+            return entry[0]
+        if entry and age < ttl + self.max_stale:
+            self._count("stale_hits")
+            with self._lock:
+                start = key not in self._refreshing
+                self._refreshing.add(key)
+            if start: threading.Thread(target=self._refresh, args=(key, loader, ttl), daemon=True).start()
+            return entry[0]
+
+        with self._key_lock(key):
+            # Thread lain mungkin sudah memuatnya selagi menunggu kunci
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] < ttl:
+                self._count("hits")
+                return entry[0]
+            self._count("misses")
+            return self._load(key, loader, ttl)
+
+    def _save(self):
+        if not self.path: return
+        with self._lock:
+            # Entri yang sudah lewat ttl + max_stale tidak akan dipakai lagi: dibuang agar file tidak terus membesar
+            now = time.time()
+            for key in [key for key, (_, fetched_at, ttl) in self._entries.items() if now - fetched_at >= ttl + self.max_stale]:
+                del self._entries[key]
+            data = {key: {"value": value, "fetched_at": fetched_at, "ttl": ttl} for key, (value, fetched_at, ttl) in self._entries.items()}
+        directory = os.path.dirname(self.path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Gagal menyimpan cache ke {self.path}: {e}")
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
@@ -0,0 +1,228 @@
+# user_store.py
+# Penyimpanan data pengguna (watchlist & preferensi strategi) berbasis SQLite (WAL).
+# Baca/tulis per pengguna, update atomik, cache baca di memori yang dibuang saat ada tulisan,
+# dan migrasi satu kali dari file JSON lama.
+# Setiap tulisan yang benar-benar mengubah data menaikkan versi data global dan versi pengguna terkait,
+# sehingga /api/data bisa mengirim delta (hanya pengguna yang berubah sejak versi tertentu).
+import copy
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    UNIQUE (user_id, symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_symbol ON watchlist (symbol);
+CREATE TABLE IF NOT EXISTS strategies (
+    user_id TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    alert_on INTEGER NOT NULL DEFAULT 0,
+    signal_on INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, strategy)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+STRATEGY_FLAGS = ("alert_on", "signal_on")
+
+
+class UserStore:
+    def __init__(self, path: str, legacy_json: str = None):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._cache = {}
+        self._snapshot = None
+        # Naik setiap tulis; pembaca hanya mengisi cache bila tidak ada tulisan selama ia membaca
+        self._generation = 0
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._upgrade_schema()
+        self._data_version = self._read(self._load_version)
+        if legacy_json: self._migrate_json(legacy_json)
+
+    def _conn(self):
+        # Satu koneksi per thread (thread Flask & thread polling Telegram); WAL agar baca tidak diblok tulis
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _upgrade_schema(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Database dari versi sebelumnya belum punya kolom users.version
+        if "version" not in [row[1] for row in conn.execute("PRAGMA table_info(users)")]:
+            conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_version ON users (version)")
+
+    @staticmethod
+    def _load_version(conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _write(self, user_id, func):
+        # Transaksi tulis atomik; cache pengguna terkait dibuang setelah commit.
+        # user_id None berarti tulisan massal (migrasi): semua pengguna ikut naik versi.
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                changes_before = conn.total_changes
+                result = func(conn)
+                if conn.total_changes != changes_before:
+                    version = self._load_version(conn) + 1
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES ('data_version', ?)", (str(version),))
+                    if user_id is None:
+                        conn.execute("UPDATE users SET version = ?", (version,))
+                    else:
+                        conn.execute("UPDATE users SET version = ? WHERE user_id = ?", (version, user_id))
+                    self._data_version = version
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._generation += 1
+            self._cache.pop(user_id, None)
+            self._snapshot = None
+            return result
+
+    def _read(self, func):
+        # Baca dalam satu transaksi agar snapshot konsisten
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            return func(conn)
+        finally:
+            conn.execute("COMMIT")
+
+    # --- MIGRASI ---
+    def _migrate_json(self, legacy_json: str):
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone(): return
+        try:
+            with open(legacy_json, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            # File rusak/terpotong: jangan ditandai selesai agar start berikutnya mencoba lagi setelah file diperbaiki
+            print(f"Gagal membaca {legacy_json} untuk migrasi, dicoba lagi saat start berikutnya: {e}")
+            return
+        if not isinstance(data, dict):
+            print(f"Format {legacy_json} tidak dikenal, migrasi dicoba lagi saat start berikutnya.")
+            return
+
+        def migrate(conn):
+            for user_id, user in data.items():
+                self._insert_user(conn, str(user_id), user)
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('migrated_json', ?)", (legacy_json,))
+
+        self._write(None, migrate)
+        if data:
+            os.replace(legacy_json, legacy_json + ".migrated")
+            print(f"Migrasi {len(data)} pengguna dari {legacy_json} ke {self.path} selesai.")
+
+    @staticmethod
+    def _insert_user(conn, user_id: str, user: dict):
+        conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+        conn.executemany("INSERT OR IGNORE INTO watchlist (user_id, symbol) VALUES (?, ?)",
+                         [(user_id, symbol) for symbol in user.get("watchlist", [])])
+        conn.executemany("INSERT OR REPLACE INTO strategies VALUES (?, ?, ?, ?)",
+                         [(user_id, name, int(bool(prefs.get("alert_on", False))), int(bool(prefs.get("signal_on", False))))
+                          for name, prefs in user.get("strategies", {}).items()])
+
+    # --- BACA ---
+    @staticmethod
+    def _strategy_prefs(alert_on, signal_on):
+        return {"alert_on": bool(alert_on), "signal_on": bool(signal_on)}
+
+    def get_user(self, user_id: str):
+        user_id = str(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None: return copy.deepcopy(cached)
+        generation = self._generation
+
+        def read(conn):
+            if not conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone(): return None
+            return {
+                "watchlist": [row[0] for row in conn.execute("SELECT symbol FROM watchlist WHERE user_id = ? ORDER BY rowid", (user_id,))],
+                "strategies": {name: self._strategy_prefs(alert_on, signal_on) for name, alert_on, signal_on in
+                               conn.execute("SELECT strategy, alert_on, signal_on FROM strategies WHERE user_id = ?", (user_id,))},
+            }
+
+        user = self._read(read)
+        if user is None: return None
+        if generation == self._generation: self._cache[user_id] = user
+        return copy.deepcopy(user)
+
+    def get_watchlist(self, user_id: str):
+        return list((self.get_user(user_id) or {}).get("watchlist", []))
+
+    def get_strategies(self, user_id: str):
+        return dict((self.get_user(user_id) or {}).get("strategies", {}))
+
+    def export_all(self):
+        # Snapshot semua pengguna (format sama dengan user_data.json lama) untuk /api/data; jangan diubah pemanggil
+        snapshot = self._snapshot
+        if snapshot is not None: return snapshot
+        generation = self._generation
+
+        def read(conn):
+            users = {user_id: {"watchlist": [], "strategies": {}} for (user_id,) in conn.execute("SELECT user_id FROM users")}
+            for user_id, symbol in conn.execute("SELECT user_id, symbol FROM watchlist ORDER BY rowid"):
+                users.setdefault(user_id, {"watchlist": [], "strategies": {}})["watchlist"].append(symbol)
+            for user_id, name, alert_on, signal_on in conn.execute("SELECT user_id, strategy, alert_on, signal_on FROM strategies"):
+                users.setdefault(user_id, {"watchlist": [], "strategies": {}})["strategies"][name] = self._strategy_prefs(alert_on, signal_on)
+            return users
+
+        users = self._read(read)
+        if generation == self._generation: self._snapshot = users
+        return users
+
+    def data_version(self):
+        return self._data_version
+
+    def export_since(self, since: int):
+        # Hanya pengguna yang berubah setelah versi `since` (format sama dengan export_all)
+        user_ids = self._read(lambda conn: [row[0] for row in conn.execute("SELECT user_id FROM users WHERE version > ?", (since,))])
+        return {user_id: self.get_user(user_id) for user_id in user_ids}
+
+    # --- TULIS ---
+    def add_symbol(self, user_id: str, symbol: str):
+        # True jika simbol baru ditambahkan, False jika sudah ada
+        user_id = str(user_id)
+        def add(conn):
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            return conn.execute("INSERT OR IGNORE INTO watchlist (user_id, symbol) VALUES (?, ?)", (user_id, symbol)).rowcount > 0
+        return self._write(user_id, add)
+
+    def remove_symbol(self, user_id: str, symbol: str):
+        user_id = str(user_id)
+        return self._write(user_id, lambda conn: conn.execute(
+            "DELETE FROM watchlist WHERE user_id = ? AND symbol = ?", (user_id, symbol)).rowcount > 0)
+
+    def toggle_strategy(self, user_id: str, strategy: str, flag: str):
+        # Membalik alert_on/signal_on secara atomik dan mengembalikan status barunya
+        if flag not in STRATEGY_FLAGS: raise ValueError(f"Flag strategi tidak dikenal: {flag}")
+        user_id = str(user_id)
+        def toggle(conn):
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            conn.execute("INSERT OR IGNORE INTO strategies (user_id, strategy) VALUES (?, ?)", (user_id, strategy))
+            conn.execute(f"UPDATE strategies SET {flag} = 1 - {flag} WHERE user_id = ? AND strategy = ?", (user_id, strategy))
+            return bool(conn.execute(f"SELECT {flag} FROM strategies WHERE user_id = ? AND strategy = ?", (user_id, strategy)).fetchone()[0])
+        return self._write(user_id, toggle)